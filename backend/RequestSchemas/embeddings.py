@@ -0,0 +1,5 @@
+from pydantic import BaseModel
+
+
+class EmbeddingVersionRequest(BaseModel):
+    embedding_model: str #sentence-transformers model name, e.g. BAAI/bge-small-en-v1.5
@@ -10,4 +10,11 @@ class IngestRequest(BaseModel):
     quarter: int = Field(ge=1, le=4)
 
 class ListRequest(BaseModel):
-    company_name_query: str = Field(min_length=1)
\ No newline at end of file
+    company_name_query: str = Field(min_length=1)
+
+class RechunkRequest(BaseModel):
+    company_name_query: str = Field(min_length=1)
+    security_type: str = Field(default="Common Stock")
+    exchange_code: str = Field(default="US")
+    year: Optional[int] = Field(default=None, ge=2006, le=2026) #all years when left out
+    quarter: Optional[int] = Field(default=None, ge=1, le=4) #all quarters when left out
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+from uuid import UUID
+
+class OrgTrendRequest(BaseModel):
+    org_name: str #any spelling, resolved to the canonical org (e.g. "Apple Inc." -> apple)
+    company_id: Optional[UUID] = None #only calls of this company, all companies when empty
+    fiscal_year_from: Optional[int] = None
+    fiscal_year_to: Optional[int] = None
+
+
+class TopOrgsRequest(BaseModel):
+    fiscal_year: int
+    fiscal_quarter: int
+    limit: int = Field(default=20, ge=1, le=100)
+
+
+class OrgMentionsRequest(BaseModel):
+    org_name: str #any spelling, resolved to the canonical org
+    limit: int = Field(default=20, ge=1, le=100)
+    cursor: Optional[str] = None #next_cursor of the previous page
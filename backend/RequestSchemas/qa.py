@@ -1,6 +1,6 @@
 
 
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 class IngestRequest(BaseModel):
@@ -12,4 +12,12 @@ class IngestRequest(BaseModel):
 
 class RAGRequest(BaseModel):
     question: str
-    company : Optional[IngestRequest] = None
\ No newline at end of file
+    company : Optional[IngestRequest] = None
+
+class CompareRequest(BaseModel):
+    question: str #e.g. "how did guidance change from Q1 to Q4 2024"
+    slices: List[IngestRequest] = Field(min_length=2) #one company and/or period per slice
+    top_k_per_slice: Optional[int] = Field(ge=1, default=None) #defaults to TOP_K
+
+class BatchQnARequest(BaseModel):
+    questions: List[RAGRequest] = Field(min_length=1) #answered concurrently, results stream back as they finish
@@ -8,4 +8,16 @@ class QueryRequest(BaseModel):
     fiscal_year: Optional[int] | None  = None
     fiscal_quarter: Optional[int] |None = None
     limit: int = 20 #return atmost 20 hits
-    offset: int = 0 #start from the top, or skip no rows before returning the results
\ No newline at end of file
+    offset: int = 0 #start from the top, or skip no rows before returning the results
+    cursor: Optional[str] = None #next_cursor of the previous page, takes precedence over offset
+
+
+class ParagraphQueryRequest(BaseModel):
+    query: str
+    speaker: Optional[str] = None #case-insensitive exact speaker name
+    company_id: Optional[UUID] = None
+    fiscal_year: Optional[int] = None
+    fiscal_quarter: Optional[int] = None
+    limit: int = 20
+    offset: int = 0
+    cursor: Optional[str] = None
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Any, List, Optional
+from pydantic import BaseModel
+
+
+class SlowQuery(BaseModel):
+    statement: str
+    duration_ms: float
+    endpoint: Optional[str] = None #request path that ran it, None outside requests
+    captured_at: datetime
+
+class QueryPlanSample(BaseModel):
+    statement: str
+    duration_ms: float
+    endpoint: Optional[str] = None
+    captured_at: datetime
+    indexes: List[str] = [] #every index the plan used, e.g. ix_chunks_embedding_hnsw
+    seq_scans: List[str] = [] #tables read sequentially
+    plan: Optional[Any] = None #EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) output
+    error: Optional[str] = None
+
+class QueryStats(BaseModel):
+    statement: str
+    calls: int
+    total_ms: float
+    max_ms: float
+
+class QueryProfileResponse(BaseModel):
+    slow: List[SlowQuery]
+    plans: List[QueryPlanSample]
+    top: List[QueryStats] #statements with the most total time
@@ -0,0 +1,12 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class EmbeddingVersionResponse(BaseModel):
+    embedding_model: str
+    dim: Optional[int] = None #None for the legacy transcript_chunks.embedding column
+    status: str #building, ready, active or retired
+    processed: int = 0 #chunks embedded by the backfill so far
+    total_chunks: Optional[int] = None
+    activated_at: Optional[datetime] = None
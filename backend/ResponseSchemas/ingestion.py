@@ -19,6 +19,11 @@ class IngestionResponse(BaseModel):
     transcript_id: UUID #uuid of transcript
     fiscal_year: int
     fiscal_quarter: int
+    already_ingested: bool = False #same content was stored before, nothing was written
+
+class RechunkResponse(BaseModel):
+    transcript_count: int #transcripts that were (re-)chunked, already current ones are skipped
+    chunk_count: int
 
 class ListTranscriptResponse(BaseModel):
     company_id: UUID
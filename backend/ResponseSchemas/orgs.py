@@ -0,0 +1,39 @@
+from typing import List, Optional
+from uuid import UUID
+from pydantic import BaseModel
+
+class OrgTrendPoint(BaseModel):
+    fiscal_year: int
+    fiscal_quarter: int
+    mention_count: int #mentions across the calls of this period
+    transcript_count: int #calls that mention the org
+
+class OrgTrendResponse(BaseModel):
+    org_name: str
+    company_id: Optional[UUID] = None
+    total_mentions: int
+    points: List[OrgTrendPoint] #ordered by fiscal period
+
+class OrgPeriodCount(BaseModel):
+    org_name: str
+    mention_count: int
+    transcript_count: int
+
+class TopOrgsResponse(BaseModel):
+    fiscal_year: int
+    fiscal_quarter: int
+    orgs: List[OrgPeriodCount]
+
+class OrgMentionHit(BaseModel):
+    transcript_id: UUID
+    company_id: UUID
+    company_name: str
+    ticker: str
+    fiscal_year: int
+    fiscal_quarter: int
+    mention_count: int
+
+class OrgMentionsResponse(BaseModel):
+    org_name: str
+    hits: List[OrgMentionHit] #most mentions first, then most recent period
+    next_cursor: Optional[str] = None
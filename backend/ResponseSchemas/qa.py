@@ -1,6 +1,6 @@
 
 
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 
@@ -12,7 +12,21 @@ class Sources(BaseModel):
     paragraph_num: Optional[int]
     score: float
     snippet: str
+    slice_label: Optional[str] = None #comparative questions: which company/period slice it came from
 
 class RAGResponse(BaseModel):
     answer: str
     sources: List[Sources]
+
+class BatchQnAResult(BaseModel):
+    index: int #position of the question in the request
+    question: str
+    answer: Optional[str] = None
+    sources: List[Sources] = []
+    error: Optional[str] = None #set instead of answer when this question failed, the batch goes on
+    timings_ms: Dict[str, float] = {} #retrieve, generate
+
+class BatchQnASummary(BaseModel):
+    questions: int
+    failed: int
+    timings_ms: Dict[str, float] #embed, resolve, retrieve, generate and total wall time of the batch
@@ -13,4 +13,19 @@ class TranscriptHit(BaseModel):
 class QueryResponse(BaseModel):
     total: int
     hits: List[TranscriptHit]
+    next_cursor: Optional[str] = None #opaque token for the next page, None on the last page
 
+class ParagraphHit(BaseModel):
+    transcript_id: UUID
+    company_id: UUID
+    fiscal_year: Optional[int] = None
+    fiscal_quarter: Optional[int] = None
+    paragraph_number: Optional[int] = None
+    speaker: Optional[str] = None
+    rank: float
+    snippet: str
+
+class ParagraphQueryResponse(BaseModel):
+    total: int
+    hits: List[ParagraphHit]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,49 @@
+"""transcript paragraphs
+
+Revision ID: 5b2e8c71d4a0
+Revises: d31410f9a0c3
+Create Date: 2026-10-19 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e8c71d4a0'
+down_revision: Union[str, Sequence[str], None] = 'd31410f9a0c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('transcript_paragraphs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('transcript_id', sa.UUID(), nullable=False),
+    sa.Column('paragraph_number', sa.Integer(), nullable=True),
+    sa.Column('speaker', sa.Text(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('content_fts', postgresql.TSVECTOR(), sa.Computed("to_tsvector('english', coalesce(content, ''))", persisted=True), nullable=True),
+    sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_paragraph_transcript', 'transcript_paragraphs', ['transcript_id', 'paragraph_number'], unique=False)
+    op.create_index('ix_paragraphs_fts', 'transcript_paragraphs', ['content_fts'], unique=False, postgresql_using='gin')
+
+    #backfill from the paragraph json already stored on every transcript
+    op.execute("""
+        INSERT INTO transcript_paragraphs (id, transcript_id, paragraph_number, speaker, content)
+        SELECT gen_random_uuid(), t.id, (p->>'paragraph_number')::int, p->>'speaker', coalesce(p->>'content', '')
+        FROM transcripts t, jsonb_array_elements(t.para_structured_text) AS p
+        WHERE jsonb_typeof(t.para_structured_text) = 'array'
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_paragraphs_fts', table_name='transcript_paragraphs', postgresql_using='gin')
+    op.drop_index('ix_paragraph_transcript', table_name='transcript_paragraphs')
+    op.drop_table('transcript_paragraphs')
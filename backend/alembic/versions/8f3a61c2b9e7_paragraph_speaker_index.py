@@ -0,0 +1,27 @@
+"""paragraph speaker index
+
+Revision ID: 8f3a61c2b9e7
+Revises: 5b2e8c71d4a0
+Create Date: 2026-10-19 11:02:17.884310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '8f3a61c2b9e7'
+down_revision: Union[str, Sequence[str], None] = '5b2e8c71d4a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_paragraphs_speaker', 'transcript_paragraphs', [sa.text('lower(speaker)')], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_paragraphs_speaker', table_name='transcript_paragraphs')
@@ -0,0 +1,109 @@
+"""fold org names
+
+Revision ID: a7e3d2c94f18
+Revises: f4c81b2d6e90
+Create Date: 2026-10-19 20:15:37.902644
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3d2c94f18'
+down_revision: Union[str, Sequence[str], None] = 'f4c81b2d6e90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+#frozen copies of normalize_org_name's suffix list and of ORG_FUZZY_THRESHOLD as they were at this revision
+_SUFFIXES = "inc|corp|corporation|ltd|limited|llc|plc|co|company|holdings|group"
+_FUZZY_THRESHOLD = 0.7
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    #org rows ingested before canonicalization are re-keyed by their canonical names, then the trend
+    #aggregates are recomputed; plain SQL, so later changes to the services can't change this revision
+
+    #every distinct stored name with its normalized form (lowercase, & -> and, no punctuation, single
+    #spaces, trailing corporate suffixes dropped but never the first word)
+    op.execute(f"""
+        CREATE TEMP TABLE org_fold ON COMMIT DROP AS
+        SELECT org_name, regexp_replace(x, '( ({_SUFFIXES}))+$', '') AS norm
+        FROM (
+            SELECT DISTINCT org_name,
+                   btrim(regexp_replace(regexp_replace(replace(lower(org_name), '&', ' and '), '[^\\w\\s]', ' ', 'g'), '\\s+', ' ', 'g')) AS x
+            FROM orgs_in_transcripts
+        ) n
+        WHERE x <> ''
+    """)
+    #unknown names close enough to an existing canonical name become its aliases
+    op.execute(f"""
+        INSERT INTO org_aliases (alias, canonical_name, match_type, created_at)
+        SELECT n.norm, c.canonical_name, 'fuzzy', now()
+        FROM (SELECT DISTINCT norm FROM org_fold f
+              WHERE NOT EXISTS (SELECT 1 FROM org_aliases a WHERE a.alias = f.norm)) n
+        CROSS JOIN LATERAL (
+            SELECT canonical_name
+            FROM org_canonical_names
+            WHERE canonical_name % n.norm
+              AND similarity(canonical_name, n.norm) >= {_FUZZY_THRESHOLD}
+            ORDER BY similarity(canonical_name, n.norm) DESC, canonical_name
+            LIMIT 1
+        ) c
+        ON CONFLICT DO NOTHING
+    """)
+    #the rest are new canonical names, each its own alias
+    op.execute("""
+        INSERT INTO org_canonical_names (canonical_name, created_at)
+        SELECT DISTINCT norm, now() FROM org_fold f
+        WHERE NOT EXISTS (SELECT 1 FROM org_aliases a WHERE a.alias = f.norm)
+        ON CONFLICT DO NOTHING
+    """)
+    op.execute("""
+        INSERT INTO org_aliases (alias, canonical_name, match_type, created_at)
+        SELECT DISTINCT norm, norm, 'exact', now() FROM org_fold f
+        WHERE NOT EXISTS (SELECT 1 FROM org_aliases a WHERE a.alias = f.norm)
+        ON CONFLICT DO NOTHING
+    """)
+
+    #variants of an org within a transcript are summed into the canonical row, then dropped
+    op.execute("""
+        INSERT INTO orgs_in_transcripts (id, transcript_id, org_name, mention_count, created_at)
+        SELECT gen_random_uuid(), o.transcript_id, a.canonical_name, SUM(o.mention_count), MIN(o.created_at)
+        FROM orgs_in_transcripts o
+        JOIN org_fold f ON f.org_name = o.org_name
+        JOIN org_aliases a ON a.alias = f.norm
+        WHERE a.canonical_name <> o.org_name
+        GROUP BY o.transcript_id, a.canonical_name
+        ON CONFLICT (transcript_id, org_name) DO UPDATE
+        SET mention_count = orgs_in_transcripts.mention_count + EXCLUDED.mention_count
+    """)
+    op.execute("""
+        DELETE FROM orgs_in_transcripts o
+        USING org_fold f, org_aliases a
+        WHERE f.org_name = o.org_name AND a.alias = f.norm AND a.canonical_name <> o.org_name
+    """)
+
+    #same backfill as b6e3c8a41f52, over the folded rows
+    op.execute("DELETE FROM org_mention_period_totals")
+    op.execute("DELETE FROM org_mention_trends")
+    op.execute("""
+        INSERT INTO org_mention_trends (org_name, fiscal_year, fiscal_quarter, company_id, transcript_id, mention_count)
+        SELECT o.org_name, t.fiscal_year, t.fiscal_quarter, t.company_id, t.id, o.mention_count
+        FROM orgs_in_transcripts o JOIN transcripts t ON t.id = o.transcript_id
+        WHERE t.fiscal_year IS NOT NULL AND t.fiscal_quarter IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO org_mention_period_totals (org_name, fiscal_year, fiscal_quarter, mention_count, transcript_count)
+        SELECT org_name, fiscal_year, fiscal_quarter, SUM(mention_count), COUNT(*)
+        FROM org_mention_trends
+        GROUP BY org_name, fiscal_year, fiscal_quarter
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    #the original spellings are not kept, the fold can't be undone
+    pass
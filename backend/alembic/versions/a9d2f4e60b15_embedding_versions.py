@@ -0,0 +1,51 @@
+"""embedding versions
+
+Revision ID: a9d2f4e60b15
+Revises: e1b95a3f7c28
+Create Date: 2026-10-19 15:08:33.249051
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import pgvector.sqlalchemy
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d2f4e60b15'
+down_revision: Union[str, Sequence[str], None] = 'e1b95a3f7c28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('embedding_versions',
+    sa.Column('embedding_model', sa.Text(), nullable=False),
+    sa.Column('dim', sa.Integer(), nullable=False),
+    sa.Column('status', sa.Text(), nullable=False),
+    sa.Column('checkpoint', sa.UUID(), nullable=True),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('activated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('embedding_model')
+    )
+    op.create_index('ix_one_active_embedding_version', 'embedding_versions', ['status'], unique=True, postgresql_where=sa.text("status = 'active'"))
+    op.create_table('chunk_embeddings',
+    sa.Column('chunk_row_id', sa.UUID(), nullable=False),
+    sa.Column('embedding_model', sa.Text(), nullable=False),
+    sa.Column('embedding', pgvector.sqlalchemy.vector.VECTOR(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['chunk_row_id'], ['transcript_chunks.id'], ),
+    sa.ForeignKeyConstraint(['embedding_model'], ['embedding_versions.embedding_model'], ),
+    sa.PrimaryKeyConstraint('chunk_row_id', 'embedding_model')
+    )
+    #per-model hnsw indexes are built concurrently by the backfill job in backend/services/reembed.py
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chunk_embeddings')
+    op.drop_index('ix_one_active_embedding_version', table_name='embedding_versions', postgresql_where=sa.text("status = 'active'"))
+    op.drop_table('embedding_versions')
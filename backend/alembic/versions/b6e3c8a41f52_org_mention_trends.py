@@ -0,0 +1,64 @@
+"""org mention trends
+
+Revision ID: b6e3c8a41f52
+Revises: a9d2f4e60b15
+Create Date: 2026-10-19 16:02:47.118530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e3c8a41f52'
+down_revision: Union[str, Sequence[str], None] = 'a9d2f4e60b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('org_mention_trends',
+    sa.Column('org_name', sa.Text(), nullable=False),
+    sa.Column('fiscal_year', sa.Integer(), nullable=False),
+    sa.Column('fiscal_quarter', sa.Integer(), nullable=False),
+    sa.Column('company_id', sa.UUID(), nullable=False),
+    sa.Column('transcript_id', sa.UUID(), nullable=False),
+    sa.Column('mention_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ),
+    sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+    sa.PrimaryKeyConstraint('org_name', 'fiscal_year', 'fiscal_quarter', 'company_id')
+    )
+    op.create_index('ix_org_trend_company', 'org_mention_trends', ['company_id', 'org_name', 'fiscal_year', 'fiscal_quarter'], unique=False)
+    op.create_table('org_mention_period_totals',
+    sa.Column('org_name', sa.Text(), nullable=False),
+    sa.Column('fiscal_year', sa.Integer(), nullable=False),
+    sa.Column('fiscal_quarter', sa.Integer(), nullable=False),
+    sa.Column('mention_count', sa.Integer(), nullable=False),
+    sa.Column('transcript_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('org_name', 'fiscal_year', 'fiscal_quarter')
+    )
+    op.create_index('ix_org_totals_period', 'org_mention_period_totals', ['fiscal_year', 'fiscal_quarter', 'mention_count'], unique=False)
+
+    #backfill from the transcripts ingested so far, new ones are added incrementally on ingest
+    op.execute("""
+        INSERT INTO org_mention_trends (org_name, fiscal_year, fiscal_quarter, company_id, transcript_id, mention_count)
+        SELECT o.org_name, t.fiscal_year, t.fiscal_quarter, t.company_id, t.id, o.mention_count
+        FROM orgs_in_transcripts o JOIN transcripts t ON t.id = o.transcript_id
+        WHERE t.fiscal_year IS NOT NULL AND t.fiscal_quarter IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO org_mention_period_totals (org_name, fiscal_year, fiscal_quarter, mention_count, transcript_count)
+        SELECT org_name, fiscal_year, fiscal_quarter, SUM(mention_count), COUNT(*)
+        FROM org_mention_trends
+        GROUP BY org_name, fiscal_year, fiscal_quarter
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_org_totals_period', table_name='org_mention_period_totals')
+    op.drop_table('org_mention_period_totals')
+    op.drop_index('ix_org_trend_company', table_name='org_mention_trends')
+    op.drop_table('org_mention_trends')
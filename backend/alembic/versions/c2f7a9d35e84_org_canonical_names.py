@@ -0,0 +1,46 @@
+"""org canonical names
+
+Revision ID: c2f7a9d35e84
+Revises: b6e3c8a41f52
+Create Date: 2026-10-19 16:48:12.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f7a9d35e84'
+down_revision: Union[str, Sequence[str], None] = 'b6e3c8a41f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_table('org_canonical_names',
+    sa.Column('canonical_name', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('canonical_name')
+    )
+    op.create_index('ix_org_canonical_trgm', 'org_canonical_names', ['canonical_name'], unique=False, postgresql_using='gin', postgresql_ops={'canonical_name': 'gin_trgm_ops'})
+    op.create_table('org_aliases',
+    sa.Column('alias', sa.Text(), nullable=False),
+    sa.Column('canonical_name', sa.Text(), nullable=False),
+    sa.Column('match_type', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['canonical_name'], ['org_canonical_names.canonical_name'], ),
+    sa.PrimaryKeyConstraint('alias')
+    )
+    op.create_index('ix_org_alias_canonical', 'org_aliases', ['canonical_name'], unique=False)
+    #existing org rows are folded into canonical names by the a7e3d2c94f18 migration
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_org_alias_canonical', table_name='org_aliases')
+    op.drop_table('org_aliases')
+    op.drop_index('ix_org_canonical_trgm', table_name='org_canonical_names', postgresql_using='gin', postgresql_ops={'canonical_name': 'gin_trgm_ops'})
+    op.drop_table('org_canonical_names')
@@ -0,0 +1,37 @@
+"""transcript chunking status
+
+Revision ID: c47d09e5a1f3
+Revises: 8f3a61c2b9e7
+Create Date: 2026-10-19 12:20:05.117462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47d09e5a1f3'
+down_revision: Union[str, Sequence[str], None] = '8f3a61c2b9e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('transcript_chunking_status',
+    sa.Column('transcript_id', sa.UUID(), nullable=False),
+    sa.Column('chunk_strategy', sa.Text(), nullable=False),
+    sa.Column('chunk_size', sa.Integer(), nullable=True),
+    sa.Column('embedding_model', sa.Text(), nullable=False),
+    sa.Column('chunker_version', sa.Integer(), nullable=False),
+    sa.Column('chunk_count', sa.Integer(), nullable=False),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['transcript_id'], ['transcripts.id'], ),
+    sa.PrimaryKeyConstraint('transcript_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('transcript_chunking_status')
@@ -0,0 +1,27 @@
+"""org mentions covering index
+
+Revision ID: d8a1e5b07c36
+Revises: c2f7a9d35e84
+Create Date: 2026-10-19 17:20:05.771204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8a1e5b07c36'
+down_revision: Union[str, Sequence[str], None] = 'c2f7a9d35e84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_org_trend_mentions', 'org_mention_trends', ['org_name', 'mention_count', 'fiscal_year', 'fiscal_quarter', 'transcript_id'], unique=False, postgresql_include=['company_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_org_trend_mentions', table_name='org_mention_trends', postgresql_include=['company_id'])
@@ -0,0 +1,27 @@
+"""chunking status overlap
+
+Revision ID: e1b95a3f7c28
+Revises: c47d09e5a1f3
+Create Date: 2026-10-19 13:41:52.603974
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1b95a3f7c28'
+down_revision: Union[str, Sequence[str], None] = 'c47d09e5a1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('transcript_chunking_status', sa.Column('chunk_overlap', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('transcript_chunking_status', 'chunk_overlap')
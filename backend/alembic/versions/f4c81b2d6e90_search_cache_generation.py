@@ -0,0 +1,32 @@
+"""search cache generation
+
+Revision ID: f4c81b2d6e90
+Revises: d8a1e5b07c36
+Create Date: 2026-10-19 19:42:11.318540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c81b2d6e90'
+down_revision: Union[str, Sequence[str], None] = 'd8a1e5b07c36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('search_cache_generation',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('generation', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.execute("INSERT INTO search_cache_generation (id, generation) VALUES (1, 0)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('search_cache_generation')
@@ -41,14 +41,61 @@ class Settings(BaseSettings):
     USE_HYBRID_FTS: bool
     FTS_CANDIDATE_LIMIT: int
 
+    SEARCH_CACHE_ENABLED: bool = True
+    SEARCH_CACHE_URL: Optional[str] = None #e.g. redis://localhost:6379/0 to share pages across workers
+    SEARCH_CACHE_SIZE: int = 2048
+    SEARCH_CACHE_TTL_SEC: int = 3600
+    SEARCH_CACHE_GENERATION_TTL_SEC: int = 2 #in-memory caches re-read the shared ingestion generation this often
+
     TOP_K: int
     MIN_SCORE: float
     MAX_CONTEXT_CHARS: int
+    MAX_CONTEXT_TOKENS: Optional[int] = None #prompt context budget, defaults to MAX_CONTEXT_CHARS / 4
+    CONTEXT_TOKENIZER: str = "estimate" #options: 'estimate' (len/4), 'tiktoken:<encoding>', or a huggingface tokenizer name
     CHUNK_SIZE: int
     SEMENTIC_THRESH: float
+    CHUNK_MAX_TOKENS: Optional[int] = None #token strategy, defaults to the embedding model's max_seq_length
+    CHUNK_OVERLAP_TOKENS: int = 32
+    CHUNK_TOKEN_COUNTS: str = "estimate" #options: 'estimate' (len/4), 'tokenizer' (embedding model tokenizer)
+    CHUNK_WORKERS: int = 1 #processes for bulk re-chunking, 1 chunks in the api process
+    EMBED_BATCH_SIZE: int = 256 #chunks encoded and written per commit while streaming
+
+    ORG_FUZZY_THRESHOLD: float = 0.7 #pg_trgm similarity above which an unseen org name joins an existing org
+
+    REEMBED_BATCH_SIZE: int = 512 #chunks re-embedded and committed per checkpoint
+    REEMBED_THROTTLE_SEC: float = 0.5 #pause between re-embedding batches to leave room for queries
+    EMBEDDING_VERSION_TTL_SEC: int = 30 #how long a worker caches the active embedding version
+
+    BATCH_QNA_MAX_QUESTIONS: int = 1000
+    BATCH_QNA_GENERATION_WORKERS: int = 4 #answers generated at once per batch
+    COMPARE_MAX_SLICES: int = 8 #company/period slices per comparative question
+    RETRIEVAL_WORKERS: int = 8 #concurrent retrievals per process for /qna/compare and /qna/batch together, keep within the db connection pool
+
+    USE_RERANKER: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 50 #wider cosine pool handed to the cross-encoder
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_TIME_BUDGET_MS: int = 250 #stop scoring new batches once this is spent
+    RERANK_CACHE_SIZE: int = 10000
+
+    METRICS_ENABLED: bool = True #serves the stage and route latency histograms on /metrics
+    METRICS_MULTIPROC_DIR: Optional[str] = None #directory shared by the api workers, /metrics then sums all of them
+    METRICS_FLUSH_SEC: float = 1.0 #how often a worker writes its snapshot to METRICS_MULTIPROC_DIR
+    TIMING_HEADERS_ENABLED: bool = True #per-stage durations of each request in a Server-Timing header
+    QUERY_PROFILING_ENABLED: bool = False #times every sql statement and serves slow ones and plans on /debug/queries
+    SLOW_QUERY_MS: float = 200 #statements at least this slow are captured
+    SLOW_QUERY_BUFFER: int = 200 #most recent slow statements kept
+    EXPLAIN_ENDPOINTS: str = "/qna/ask,/search/query,/search/paragraphs" #comma separated request paths whose SELECTs are sampled
+    EXPLAIN_SAMPLE_RATE: float = 0.0 #fraction of those SELECTs re-run under EXPLAIN (ANALYZE, BUFFERS), each sample runs the query twice
+    EXPLAIN_BUFFER: int = 50 #most recent plans kept
 
     REQUEST_TIMEOUT_SEC: int
     LLM_PROVIDER: str
+    LLM_FALLBACK_PROVIDER: Optional[str] = None #used when LLM_PROVIDER is busy, times out or fails
+    LLM_QUEUE_TIMEOUT_SEC: float = 30 #longest wait for a free provider slot
+    OLLAMA_MAX_CONCURRENCY: int = 1 #generations sent to ollama at once, the rest queue
+    OPENAI_MAX_CONCURRENCY: int = 8
+    LLM_MOCK_LATENCY_SEC: float = 0.0 #simulated generation time of the mock provider
     OLLAMA_BASE_URL: str
     OLLAMA_MODEL: str
     OPENAI_BASE_URL: str
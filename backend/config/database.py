@@ -13,6 +13,10 @@ engine = create_engine(
     max_overflow=0,
 )
 
+if settings.QUERY_PROFILING_ENABLED:
+    from backend.services.query_profiler import install_query_profiler
+    install_query_profiler(engine)
+
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False)
 Base = declarative_base()
 
@@ -1,7 +1,7 @@
 from functools import lru_cache
 
 import torch
-from sentence_transformers import SentenceTransformer
+from sentence_transformers import CrossEncoder, SentenceTransformer
 
 from backend.config.config import get_settings
 
@@ -13,9 +13,21 @@ def _resolve_device() -> str:
 @lru_cache(maxsize=1)
 def get_embedding_model() -> SentenceTransformer:
     settings = get_settings()
-    return SentenceTransformer(settings.EMBEDDING_MODEL, device=_resolve_device())
+    return get_embedding_model_by_name(settings.EMBEDDING_MODEL)
+
+
+@lru_cache(maxsize=2)
+def get_embedding_model_by_name(model_name: str) -> SentenceTransformer:
+    #the configured model plus, during a re-embedding migration, the target model
+    return SentenceTransformer(model_name, device=_resolve_device())
 
 
 @lru_cache(maxsize=1)
 def get_semantic_model() -> SentenceTransformer:
     return SentenceTransformer("all-MiniLM-L6-v2", device=_resolve_device())
+
+
+@lru_cache(maxsize=1)
+def get_rerank_model() -> CrossEncoder:
+    settings = get_settings()
+    return CrossEncoder(settings.RERANK_MODEL, device="cpu") #small model, keep the gpu for the encoder
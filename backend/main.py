@@ -1,9 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import json
+import time
 
 from backend.config.config import get_settings
-from backend.routes import ingest, quesans, search
+from backend.routes import debug, embeddings, ingest, metrics, orgs, quesans, search
+from backend.services.metrics import end_request_timings, observe, server_timing_header, start_request_timings
+from backend.services.query_profiler import reset_current_endpoint, set_current_endpoint
 
 
 settings = get_settings()
@@ -40,9 +43,37 @@ def create_application():
         expose_headers=["*"],
     )
 
+    @application.middleware("http")
+    async def record_timings(request: Request, call_next):
+        #spans in the request's handler add up into its timings, the route latency goes to /metrics
+        token = start_request_timings()
+        #sql statements are attributed to it: the raw path for EXPLAIN_ENDPOINTS, the route template for /metrics
+        endpoint_token = set_current_endpoint(request.url.path, request.scope)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            timings = end_request_timings(token)
+            reset_current_endpoint(endpoint_token)
+        elapsed = time.perf_counter() - start
+        #the route template, not the raw path, keeps one series per endpoint
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        observe("trendtracker_http_request_duration_seconds", elapsed,
+                method=request.method, route=route, status=str(response.status_code))
+        if settings.TIMING_HEADERS_ENABLED:
+            timings["total"] = elapsed
+            response.headers["Server-Timing"] = server_timing_header(timings)
+        return response
+
     application.include_router(ingest.ingest_router)
     application.include_router(search.search_router)
     application.include_router(quesans.qna_router)
+    application.include_router(embeddings.embeddings_router)
+    application.include_router(orgs.orgs_router)
+    if settings.METRICS_ENABLED:
+        application.include_router(metrics.metrics_router)
+    if settings.QUERY_PROFILING_ENABLED:
+        application.include_router(debug.debug_router)
     return application
 
 
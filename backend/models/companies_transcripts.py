@@ -1,7 +1,7 @@
 import uuid
-from sqlalchemy import Column, Text, Integer, ForeignKey, DateTime, UniqueConstraint, Index, Computed
+from sqlalchemy import BigInteger, Column, Text, Integer, ForeignKey, DateTime, UniqueConstraint, Index, Computed, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from backend.config.database import Base
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.sql import func
@@ -36,17 +36,21 @@ class EarningCallTranscript(Base):
     fetched_at = Column(DateTime(timezone=True), nullable=False)
     preprocessed_at = Column(DateTime(timezone=True), nullable=False)
     updated_at = Column(DateTime(timezone=True), nullable=False)
-    raw_text = Column(Text, nullable=False)
-    para_structured_text =  Column(JSONB, nullable=False, default=dict) #<- Fix this : it is a list of dicts 
-    org_data = Column(JSONB, nullable=False, default=dict)
+    #large columns are deferred: listing and existence checks only need ids and periods,
+    #callers that need the body ask for it with options(undefer(...))
+    raw_text = deferred(Column(Text, nullable=False))
+    para_structured_text =  deferred(Column(JSONB, nullable=False, default=dict)) #<- Fix this : it is a list of dicts 
+    org_data = deferred(Column(JSONB, nullable=False, default=dict))
     document_meta_data = Column(JSONB, nullable=False, default=dict)
     content_hash = Column(Text, nullable=False)
     # spacy_doc = 
-    raw_text_fts = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(raw_text, ''))", persisted=True))  # fill on db side
+    raw_text_fts = deferred(Column(TSVECTOR, Computed("to_tsvector('english', coalesce(raw_text, ''))", persisted=True)))  # fill on db side
     
     parent_company = relationship("Company", back_populates="transcripts") #many transcripts can have 1 company
     org_entities = relationship("TranscriptOrgEntity", back_populates="transcript_org")
     chunks = relationship("TranscriptChunk", back_populates="parent_transcript")
+    paragraphs = relationship("TranscriptParagraph", back_populates="parent_transcript")
+    chunking_status = relationship("TranscriptChunkingStatus", back_populates="parent_transcript", uselist=False)
 
     __table_args__ = (
       UniqueConstraint("company_id", "fiscal_year", "fiscal_quarter", name="uq_transcripts_period"), #one transcript per company for 1 fiscal year and 1 fiscal quarter
@@ -55,6 +59,25 @@ class EarningCallTranscript(Base):
       Index("ix_transcripts_fts", "raw_text_fts", postgresql_using="gin"),
     )
 
+class TranscriptParagraph(Base):
+    __tablename__ = "transcript_paragraphs"
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    transcript_id = Column(UUID(as_uuid=True), ForeignKey("transcripts.id"), nullable=False)
+    paragraph_number = Column(Integer, nullable=True)
+    speaker = Column(Text, nullable=True)
+    content = Column(Text, nullable=False)
+    content_fts = Column(TSVECTOR, Computed("to_tsvector('english', coalesce(content, ''))", persisted=True))  # fill on db side
+
+    parent_transcript = relationship("EarningCallTranscript", back_populates="paragraphs")
+
+    __table_args__ = (
+        Index("ix_paragraph_transcript", "transcript_id", "paragraph_number"), #snippets for a page of transcript hits
+        Index("ix_paragraphs_fts", "content_fts", postgresql_using="gin"),
+    )
+
+#functional index needs the mapped column, so it is declared outside the class body
+Index("ix_paragraphs_speaker", func.lower(TranscriptParagraph.speaker)) #speaker filter on paragraph search
+
 class TranscriptOrgEntity(Base):
     __tablename__ = "orgs_in_transcripts"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -93,4 +116,105 @@ class TranscriptChunk(Base):
             postgresql_with={"m": 16, "ef_construction": 64},
             postgresql_ops={"embedding": "vector_cosine_ops"}
             ),
-    )
\ No newline at end of file
+    )
+
+class TranscriptChunkingStatus(Base):
+    #one row per transcript: which chunking config its stored chunks and embeddings were built with
+    __tablename__ = "transcript_chunking_status"
+    transcript_id = Column(UUID(as_uuid=True), ForeignKey("transcripts.id"), primary_key=True)
+    chunk_strategy = Column(Text, nullable=False)
+    chunk_size = Column(Integer, nullable=True) #chars for paragraph, tokens for token, None for semantic
+    chunk_overlap = Column(Integer, nullable=True) #tokens, token strategy only
+    embedding_model = Column(Text, nullable=False)
+    chunker_version = Column(Integer, nullable=False)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    completed_at = Column(DateTime(timezone=True), nullable=False)
+
+    parent_transcript = relationship("EarningCallTranscript", back_populates="chunking_status")
+
+class EmbeddingVersion(Base):
+    #an embedding model being backfilled into chunk_embeddings, or serving retrieval once active
+    __tablename__ = "embedding_versions"
+    embedding_model = Column(Text, primary_key=True)
+    dim = Column(Integer, nullable=False)
+    status = Column(Text, nullable=False, default="building") #building -> ready -> active -> retired
+    checkpoint = Column(UUID(as_uuid=True), nullable=True) #last transcript_chunks.id of the running pass, for resuming
+    processed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True))
+    activated_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index("ix_one_active_embedding_version", "status", unique=True, postgresql_where=text("status = 'active'")),
+    )
+
+class ChunkEmbedding(Base):
+    #shadow embeddings per model, so a new model is built next to the live one and switched to atomically
+    __tablename__ = "chunk_embeddings"
+    chunk_row_id = Column(UUID(as_uuid=True), ForeignKey("transcript_chunks.id"), primary_key=True)
+    embedding_model = Column(Text, ForeignKey("embedding_versions.embedding_model"), primary_key=True)
+    embedding = Column(Vector(), nullable=False) #dimension depends on the model, hnsw index is per model on a cast
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class OrgMentionTrend(Base):
+    #mentions of an org per company and fiscal period, maintained on ingest so trends never scan orgs_in_transcripts
+    __tablename__ = "org_mention_trends"
+    org_name = Column(Text, primary_key=True)
+    fiscal_year = Column(Integer, primary_key=True)
+    fiscal_quarter = Column(Integer, primary_key=True)
+    company_id = Column(UUID(as_uuid=True), ForeignKey("companies.id"), primary_key=True)
+    transcript_id = Column(UUID(as_uuid=True), ForeignKey("transcripts.id"), nullable=False)
+    mention_count = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        Index("ix_org_trend_company", "company_id", "org_name", "fiscal_year", "fiscal_quarter"), #one company's trend for an org
+        #"who mentions X": ranked and paged by a backward scan of this index alone, never the transcript rows
+        Index("ix_org_trend_mentions", "org_name", "mention_count", "fiscal_year", "fiscal_quarter", "transcript_id",
+              postgresql_include=["company_id"]),
+    )
+
+class OrgMentionPeriodTotal(Base):
+    #all-company rollup per org and fiscal period, the series behind "how often is X mentioned per quarter"
+    __tablename__ = "org_mention_period_totals"
+    org_name = Column(Text, primary_key=True)
+    fiscal_year = Column(Integer, primary_key=True)
+    fiscal_quarter = Column(Integer, primary_key=True)
+    mention_count = Column(Integer, nullable=False, default=0)
+    transcript_count = Column(Integer, nullable=False, default=0) #calls that mention the org at least once
+
+    __table_args__ = (
+        Index("ix_org_totals_period", "fiscal_year", "fiscal_quarter", "mention_count"), #top orgs of a period
+    )
+
+class OrgCanonicalName(Base):
+    #one row per real-world org, the key orgs_in_transcripts and the trend tables are stored under
+    __tablename__ = "org_canonical_names"
+    canonical_name = Column(Text, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    aliases = relationship("OrgAlias", back_populates="canonical")
+
+    __table_args__ = (
+        Index("ix_org_canonical_trgm", "canonical_name", postgresql_using="gin",
+              postgresql_ops={"canonical_name": "gin_trgm_ops"}), #fuzzy matching of unseen names, needs pg_trgm
+    )
+
+class OrgAlias(Base):
+    #normalized spelling seen in a transcript -> canonical org
+    __tablename__ = "org_aliases"
+    alias = Column(Text, primary_key=True)
+    canonical_name = Column(Text, ForeignKey("org_canonical_names.canonical_name"), nullable=False)
+    match_type = Column(Text, nullable=False, default="exact") #exact, fuzzy or manual
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    canonical = relationship("OrgCanonicalName", back_populates="aliases")
+
+    __table_args__ = (
+        Index("ix_org_alias_canonical", "canonical_name"),
+    )
+
+class SearchCacheGeneration(Base):
+    #a single row bumped after every ingest; the in-memory search caches of all api workers key their pages on it
+    __tablename__ = "search_cache_generation"
+    id = Column(Integer, primary_key=True, default=1)
+    generation = Column(BigInteger, nullable=False, default=0)
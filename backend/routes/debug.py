@@ -0,0 +1,23 @@
+#debug view of the sql profiler, only mounted with QUERY_PROFILING_ENABLED
+
+from fastapi import APIRouter, Query, status
+
+from backend.ResponseSchemas.debug import QueryProfileResponse
+from backend.services.query_profiler import clear_query_profile, query_profile
+
+
+debug_router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"],
+    responses={
+        404: {"description": "Not Found"}
+    }
+)
+
+@debug_router.get('/queries', response_model=QueryProfileResponse)
+def get_query_profile(top: int = Query(default=20, ge=1, le=500)):
+    return query_profile(top)
+
+@debug_router.post('/queries/reset', status_code=status.HTTP_204_NO_CONTENT)
+def reset_query_profile():
+    clear_query_profile()
@@ -0,0 +1,62 @@
+#routes to migrate retrieval to a new embedding model without downtime
+
+
+from fastapi import APIRouter, BackgroundTasks, Depends, status
+from sqlalchemy.orm import Session
+
+from backend.RequestSchemas.embeddings import EmbeddingVersionRequest
+from backend.ResponseSchemas.embeddings import EmbeddingVersionResponse
+from backend.config.database import SessionLocal, get_session
+from backend.models.companies_transcripts import ChunkEmbedding, TranscriptChunk
+from backend.services.reembed import activate_version, get_version, register_version, run_reembed
+
+
+embeddings_router = APIRouter(
+    prefix="/embeddings",
+    tags=["Embeddings"],
+    responses={
+        404: {"description": "Not Found"}
+    },  # default response - eg: if a route path is not defined then 404 will be thrown
+)
+
+
+def _reembed_job(embedding_model: str):
+    #own session, the request session is closed once the response is sent
+    session = SessionLocal()
+    try:
+        run_reembed(session, embedding_model)
+    finally:
+        session.close()
+
+
+def _version_response(version, session: Session) -> EmbeddingVersionResponse:
+    embedded = (session.query(ChunkEmbedding)
+                .filter(ChunkEmbedding.embedding_model == version.embedding_model)
+                .count())
+    return EmbeddingVersionResponse(
+        embedding_model=version.embedding_model,
+        dim=version.dim,
+        status=version.status,
+        processed=embedded,
+        total_chunks=session.query(TranscriptChunk).count(),
+        activated_at=version.activated_at,
+    )
+
+
+@embeddings_router.post("/versions", status_code=status.HTTP_201_CREATED, response_model=EmbeddingVersionResponse)
+def create_version(req: EmbeddingVersionRequest, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+    version = register_version(session, req.embedding_model)
+    if version.status in ("building", "ready"): #resumes from the checkpoint if a previous run stopped
+        background_tasks.add_task(_reembed_job, version.embedding_model)
+    return _version_response(version, session)
+
+@embeddings_router.get("/versions/{embedding_model:path}", status_code=status.HTTP_201_CREATED, response_model=EmbeddingVersionResponse)
+def version_status(embedding_model: str, session: Session = Depends(get_session)):
+    return _version_response(get_version(session, embedding_model), session)
+
+@embeddings_router.post("/activate", status_code=status.HTTP_201_CREATED, response_model=EmbeddingVersionResponse)
+def activate(req: EmbeddingVersionRequest, session: Session = Depends(get_session)):
+    version = activate_version(session, req.embedding_model)
+    if version is None: #back on the legacy column
+        return EmbeddingVersionResponse(embedding_model=req.embedding_model, status="active")
+    return _version_response(version, session)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, status
-from backend.RequestSchemas.ingestion import IngestRequest, ListRequest
-from backend.ResponseSchemas.ingestion import IngestionResponse, ListTranscriptResponse, ViewTranscriptResponse
+from backend.RequestSchemas.ingestion import IngestRequest, ListRequest, RechunkRequest
+from backend.ResponseSchemas.ingestion import (IngestionResponse, ListTranscriptResponse, RechunkResponse,
+                                               ViewTranscriptResponse)
 from backend.config.database import get_session
-from backend.services.ingestion import ingest_request
+from backend.services.ingestion import chunk_and_embed_pending, ingest_request
 from sqlalchemy.orm import Session
 
 from backend.services.list_transcripts import list_transcript_svc, view_transcript_svc
@@ -20,6 +21,12 @@ ingest_router = APIRouter(
 async def ingest(req: IngestRequest, session: Session = Depends(get_session)):
     return await ingest_request(req, session)
 
+#re-chunks and re-embeds a company's stored transcripts that aren't current with the chunking config,
+#e.g. after a CHUNK_STRATEGY or CHUNK_SIZE change; sync so the long run stays off the event loop
+@ingest_router.post("/rechunk", status_code=status.HTTP_200_OK, response_model=RechunkResponse)
+def rechunk(req: RechunkRequest, session: Session = Depends(get_session)):
+    return chunk_and_embed_pending(req, session)
+
 @ingest_router.get("/ingest-out/{req}", status_code=status.HTTP_201_CREATED, response_model=ListTranscriptResponse)
 def list_transcripts(req: str , session: Session = Depends(get_session)):
     return list_transcript_svc(req, session)
@@ -0,0 +1,15 @@
+#prometheus scrape endpoint for the per-stage and per-route latency histograms
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from backend.services.metrics import render_metrics
+
+
+metrics_router = APIRouter(
+    tags=["Metrics"],
+)
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,32 @@
+#routes to track how often organizations are mentioned on earnings calls over time
+
+
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.orm import Session
+
+from backend.RequestSchemas.orgs import OrgMentionsRequest, OrgTrendRequest, TopOrgsRequest
+from backend.ResponseSchemas.orgs import OrgMentionsResponse, OrgTrendResponse, TopOrgsResponse
+from backend.config.database import get_session
+from backend.services.org_trends import org_mentions_svc, org_trend_svc, top_orgs_svc
+
+
+orgs_router = APIRouter(
+    prefix="/orgs",
+    tags=["Organizations"],
+    responses={
+        404: {"description": "Not Found"}
+    },  # default response - eg: if a route path is not defined then 404 will be thrown
+)
+
+
+@orgs_router.post("/trend", status_code=status.HTTP_201_CREATED, response_model=OrgTrendResponse)
+def org_trend(req: OrgTrendRequest, session: Session = Depends(get_session)):
+    return org_trend_svc(req, session)
+
+@orgs_router.post("/top", status_code=status.HTTP_201_CREATED, response_model=TopOrgsResponse)
+def top_orgs(req: TopOrgsRequest, session: Session = Depends(get_session)):
+    return top_orgs_svc(req, session)
+
+@orgs_router.post("/mentions", status_code=status.HTTP_201_CREATED, response_model=OrgMentionsResponse)
+def org_mentions(req: OrgMentionsRequest, session: Session = Depends(get_session)):
+    return org_mentions_svc(req, session)
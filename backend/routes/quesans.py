@@ -2,11 +2,14 @@
 #entry point of RAG system
 
 from fastapi import APIRouter, Depends, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from backend.RequestSchemas.qa import RAGRequest
+from backend.RequestSchemas.qa import BatchQnARequest, CompareRequest, RAGRequest
 from backend.ResponseSchemas.qa import RAGResponse
 from backend.config.database import get_session
+from backend.services.batch_qna import batch_ques_svc
+from backend.services.comparative_qna import compare_ques_svc
 from backend.services.qna import ask_ques_svc
 
 qna_router = APIRouter(
@@ -19,4 +22,15 @@ qna_router = APIRouter(
 
 @qna_router.post('/ask', status_code=status.HTTP_201_CREATED, response_model=RAGResponse)
 def ask_question(ask: RAGRequest, session: Session = Depends(get_session)):
-    return ask_ques_svc(ask, session)
\ No newline at end of file
+    return ask_ques_svc(ask, session)
+
+@qna_router.post('/compare', status_code=status.HTTP_201_CREATED, response_model=RAGResponse)
+def compare_question(req: CompareRequest, session: Session = Depends(get_session)):
+    return compare_ques_svc(req, session)
+
+@qna_router.post('/batch', status_code=status.HTTP_201_CREATED)
+def batch_questions(req: BatchQnARequest, session: Session = Depends(get_session)):
+    #newline delimited json: one BatchQnAResult per question as it is answered, then a BatchQnASummary
+    results = batch_ques_svc(req, session)
+    return StreamingResponse((r.model_dump_json() + "\n" for r in results),
+                             media_type="application/x-ndjson", status_code=status.HTTP_201_CREATED)
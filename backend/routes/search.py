@@ -4,10 +4,10 @@
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 
-from backend.RequestSchemas.search import QueryRequest
-from backend.ResponseSchemas.search import QueryResponse
+from backend.RequestSchemas.search import ParagraphQueryRequest, QueryRequest
+from backend.ResponseSchemas.search import ParagraphQueryResponse, QueryResponse
 from backend.config.database import get_session
-from backend.services.search import search_transcripts_svc
+from backend.services.search import search_paragraphs_svc, search_transcripts_svc
 
 
 search_router = APIRouter(
@@ -23,4 +23,6 @@ search_router = APIRouter(
 def search_transcript(req: QueryRequest, session: Session = Depends(get_session)):
     return search_transcripts_svc(req, session)
 
-
+@search_router.post("/paragraphs", status_code=status.HTTP_201_CREATED, response_model=ParagraphQueryResponse)
+def search_paragraphs(req: ParagraphQueryRequest, session: Session = Depends(get_session)):
+    return search_paragraphs_svc(req, session)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 
@@ -9,4 +9,11 @@ class Chunk(BaseModel):
     chunk_id: UUID #unique chunk id with signature of chunk text, transcript id and chunk 
     chunk_hash: str
     chunk_index: int
-    chunk_data: Dict[str, Any]
\ No newline at end of file
+    chunk_data: Dict[str, Any]
+
+class ChunkInput(BaseModel):
+    #picklable stand-in for EarningCallTranscript, carries only what the chunkers read
+    id: UUID
+    company_id: UUID
+    para_structured_text: Optional[List[Dict[str, Any]]] = None
+    raw_text: Optional[str] = None
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class ActiveEmbedding(BaseModel):
+    #the embedding version retrieval currently reads from
+    embedding_model: str
+    dim: int
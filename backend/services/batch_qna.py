@@ -0,0 +1,143 @@
+#batch QnA for evaluation runs and reports: every question is embedded in one encoder batch, each
+#distinct company is resolved once, retrievals run at the same time on pooled connections and the
+#answers are generated with bounded parallelism and handed back in the order they finish
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Tuple, Union
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from backend.RequestSchemas.qa import BatchQnARequest, RAGRequest
+from backend.ResponseSchemas.qa import BatchQnAResult, BatchQnASummary
+from backend.config.config import get_settings
+from backend.models.companies_transcripts import TranscriptChunk
+from backend.services.rag import company_query, embed_texts, generate_answer, rag_response, retrieve_top_k
+from backend.services.reembed import active_embedding_version
+from backend.services.retrieval_pool import run_retrievals
+from backend.services.ticker_from_company import resolve_company_to_ticker
+
+settings = get_settings()
+
+Retrieved = List[Tuple[TranscriptChunk, float]]
+
+
+def _ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _error(e: Exception) -> str:
+    return e.detail if isinstance(e, HTTPException) else f"{type(e).__name__}: {e}"
+
+
+def _resolve_companies(questions: List[RAGRequest]) -> Dict[str, object]:
+    #one resolver call per distinct company, a failure only fails the questions that named it
+    resolved = {}
+    for ask in questions:
+        q = company_query(ask.company)
+        if q and q not in resolved:
+            try:
+                resolved[q] = resolve_company_to_ticker(ask.company)
+            except Exception as e:
+                resolved[q] = e
+    return resolved
+
+
+def _retrieve_all(questions: List[RAGRequest], session: Session, embedded: list,
+                  resolved: Dict[str, object]) -> List[Tuple[Union[Retrieved, Exception], float]]:
+    """(hits or the error, retrieve ms) per question, in request order."""
+    def retrieve(i: int, item_session: Session):
+        start = time.perf_counter()
+        company = resolved.get(company_query(questions[i].company))
+        try:
+            if isinstance(company, Exception):
+                raise company
+            hits = retrieve_top_k(questions[i], item_session, embedded=embedded[i], resolved=company)
+        except Exception as e:
+            hits = e
+        return hits, _ms(start)
+
+    #shares the process-wide retrieval pool with /qna/compare, so a large batch can't drain the connection pool
+    return run_retrievals(session, range(len(questions)), retrieve)
+
+
+def _generate(i: int, ask: RAGRequest, hits: Retrieved, retrieve_ms: float) -> BatchQnAResult:
+    start = time.perf_counter()
+    try:
+        answer = generate_answer(ask.question, hits)
+    except Exception as e:
+        return BatchQnAResult(index=i, question=ask.question, error=_error(e),
+                              timings_ms={"retrieve": retrieve_ms, "generate": _ms(start)})
+    response = rag_response(answer, hits)
+    return BatchQnAResult(index=i, question=ask.question, answer=response.answer, sources=response.sources,
+                          timings_ms={"retrieve": retrieve_ms, "generate": _ms(start)})
+
+
+def batch_ques_svc(req: BatchQnARequest, session: Session) -> Iterator[Union[BatchQnAResult, BatchQnASummary]]:
+    """Answers every question of the batch.
+
+    Embedding and retrieval are done before this returns and the caller's session is closed, so
+    its connection goes back to the pool while the answers are generated. The returned iterator
+    yields one BatchQnAResult per question as soon as its answer is ready, then a
+    BatchQnASummary with the stage timings.
+    """
+    if len(req.questions) > settings.BATCH_QNA_MAX_QUESTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.BATCH_QNA_MAX_QUESTIONS} questions can be asked in one batch.")
+    started = time.perf_counter()
+    timings = {}
+
+    start = time.perf_counter()
+    active = active_embedding_version(session)
+    vectors = embed_texts([ask.question for ask in req.questions],
+                          model_name=active.embedding_model if active else None)
+    embedded = [(active, vec) for vec in vectors]
+    timings["embed"] = _ms(start)
+
+    start = time.perf_counter()
+    resolved = _resolve_companies(req.questions)
+    timings["resolve"] = _ms(start)
+
+    start = time.perf_counter()
+    retrieved = _retrieve_all(req.questions, session, embedded, resolved)
+    timings["retrieve"] = _ms(start)
+
+    #a streaming response only runs the dependency cleanup after the last line is sent, release the
+    #connection now; the retrieved rows are fully loaded and stay readable detached
+    session.close()
+    return _answer_all(req.questions, retrieved, timings, started)
+
+
+def _answer_all(questions: List[RAGRequest], retrieved: list, timings: Dict[str, float],
+                started: float) -> Iterator[Union[BatchQnAResult, BatchQnASummary]]:
+    failed = 0
+    start = time.perf_counter()
+    workers = settings.BATCH_QNA_GENERATION_WORKERS
+    #the provider layer still caps what reaches the model server, this bounds the threads waiting on it;
+    #questions are submitted at most `workers` ahead, so a client that disconnects (the generator is
+    #closed) only waits for the answers already being generated
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        def finished():
+            nonlocal pending
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            return [future.result() for future in done]
+
+        for i, (hits, retrieve_ms) in enumerate(retrieved):
+            if isinstance(hits, Exception):
+                failed += 1
+                yield BatchQnAResult(index=i, question=questions[i].question, error=_error(hits),
+                                     timings_ms={"retrieve": retrieve_ms})
+                continue
+            if len(pending) >= workers:
+                for result in finished():
+                    failed += result.error is not None
+                    yield result
+            pending.add(pool.submit(_generate, i, questions[i], hits, retrieve_ms))
+        while pending:
+            for result in finished():
+                failed += result.error is not None
+                yield result
+    timings["generate"] = _ms(start)
+    timings["total"] = _ms(started)
+    yield BatchQnASummary(questions=len(questions), failed=failed, timings_ms=timings)
@@ -1,8 +1,11 @@
+from datetime import datetime, timezone
+from functools import lru_cache
 import hashlib
-from typing import List
+from typing import Iterator, List, Tuple
 import uuid
-from sqlalchemy.orm import Session
-from backend.config.embeddings import get_semantic_model
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, undefer
+from backend.config.embeddings import get_embedding_model, get_semantic_model
 import spacy
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
@@ -10,25 +13,46 @@ import numpy as np
 from backend.RequestSchemas.qa import RAGRequest
 from backend.RequestSchemas.qa import IngestRequest #IngestRequest from qa not ingest
 from backend.config.config import get_settings
-from backend.models.companies_transcripts import EarningCallTranscript
+from backend.models.companies_transcripts import ChunkEmbedding, EarningCallTranscript, TranscriptChunk, TranscriptChunkingStatus
 from backend.services.InternalSchemas.chunk import Chunk
 from backend.services.fetch_transcripts import create_get_company
+from backend.services.metrics import timed_iter
 from backend.services.ticker_from_company import resolve_company_to_ticker
 
 settings = get_settings()
 
-def _fetch_transcripts(ask: IngestRequest, session: Session) -> List[EarningCallTranscript]:
+CHUNKER_VERSION = 1 #bump when chunk boundaries or chunk_data change for the same settings
+
+def _transcript_body():
+    #only the body the configured strategy reads is loaded
+    return EarningCallTranscript.raw_text if settings.CHUNK_STRATEGY == "semantic" else EarningCallTranscript.para_structured_text
+
+def _fetch_transcript_ids(ask: IngestRequest, session: Session) -> List[uuid.UUID]:
     resolved = resolve_company_to_ticker(ask) #resolver takes input type IngestRequest
     company = create_get_company(resolved, session)
 
-    q = session.query(EarningCallTranscript)
+    q = session.query(EarningCallTranscript.id)
     if company:
         q = q.filter(EarningCallTranscript.company_id == company.id)
     if ask.year:
         q = q.filter(EarningCallTranscript.fiscal_year == ask.year)
     if ask.quarter:
         q = q.filter(EarningCallTranscript.fiscal_quarter == ask.quarter)
-    return q.all()
+    return [row.id for row in q.order_by(EarningCallTranscript.fiscal_year, EarningCallTranscript.fiscal_quarter).all()]
+
+def iter_transcripts(transcript_ids, session: Session) -> Iterator[EarningCallTranscript]:
+    """Loads one transcript body at a time.
+
+    A server-side cursor would not survive the per-batch commits of the embed stage,
+    so the (small) id list is read up front and bodies are fetched by primary key.
+    """
+    for transcript_id in transcript_ids:
+        transcript = (session.query(EarningCallTranscript).options(undefer(_transcript_body()))
+                      .filter(EarningCallTranscript.id == transcript_id).one_or_none())
+        if transcript is None:
+            continue
+        yield transcript
+        session.expunge(transcript) #don't keep every body in the identity map
 
 # def paragraph_chunking(transcript: EarningCallTranscript) -> List[Chunk]:
 
@@ -40,39 +64,58 @@ _CHUNK_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "trendtrackerHimanshu.transcri
 def _chunk_id_from_hash(hash_value: str) -> uuid.UUID:
     return uuid.uuid5(_CHUNK_NAMESPACE, hash_value)
 
-def _chunk_text(text: str, chunk_size: int = 200) -> list:
-    chunks = []
-    current_chunk = ''
+def _pack_words(text: str, chunk_size: int = 200) -> List[Tuple[str, int]]:
+    """Greedy word packing into chunks of at most `chunk_size` chars, returns (chunk, word_count).
+
+    Word lengths are summed instead of growing a string, and each chunk is joined once.
+    A word longer than chunk_size still becomes its own chunk.
+    """
     words = text.split()
-    for word in words:
+    packed = []
+    start = 0
+    current = 0 #chars in the current chunk, counting one trailing space per word
+    for i, word_len in enumerate(map(len, words)):
         #check if adding the word exceeds chunk size
-        if len(current_chunk) + len(word) + 1 <= chunk_size:
-            current_chunk += word + ' ' #keep on adding the words to current_chunk untill you hit the chunk_size
+        if current + word_len + 1 <= chunk_size:
+            current += word_len + 1
         else:
             #store the current chunk and start new chunk
-            chunks.append(current_chunk.strip())
-            current_chunk = word + ' '
+            packed.append((" ".join(words[start:i]), i - start))
+            start = i
+            current = word_len + 1
     #add the last chunk if not empty
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
+    if current:
+        packed.append((" ".join(words[start:]), len(words) - start))
+    return packed
 
-def chunk_paras(transcript: EarningCallTranscript, chunk_size) -> List[Chunk]:
-    all_chunks: List[Chunk] = []
+def _chunk_text(text: str, chunk_size: int = 200) -> list:
+    return [chunk for chunk, _ in _pack_words(text, chunk_size)]
+
+def _token_counts(chunks: List[str]) -> list:
+    if settings.CHUNK_TOKEN_COUNTS == "tokenizer":
+        #real counts from the embedding model's tokenizer, one batched call per paragraph
+        tokenizer = get_embedding_model().tokenizer
+        return [len(ids) for ids in tokenizer(chunks, add_special_tokens=False)["input_ids"]]
+    return [len(chunk)/4 for chunk in chunks] #rough token estimate
+
+def iter_chunk_paras(transcript: EarningCallTranscript, chunk_size) -> Iterator[Chunk]:
+    #read once up front, the embed stage may commit (and expire the transcript) between chunks
+    transcript_id, company_id = transcript.id, transcript.company_id
     para_structured_text = transcript.para_structured_text
     idx = 0
     for para in para_structured_text:
         para_number = para.get("paragraph_number")
         para_text = para.get('content')
         para_speaker = para.get('speaker')
-        chunks = _chunk_text(para_text, chunk_size=chunk_size)
-        for i, chunk in enumerate(chunks):
+        packed = _pack_words(para_text, chunk_size=chunk_size)
+        token_counts = _token_counts([chunk for chunk, _ in packed]) if packed else []
+        for i, ((chunk, word_count), token_count) in enumerate(zip(packed, token_counts)):
             idx += 1
-            ch_hash = _chunk_hash(str(transcript.id), idx, chunk)
+            ch_hash = _chunk_hash(str(transcript_id), idx, chunk)
             c_id = _chunk_id_from_hash(ch_hash)
-            all_chunks.append(Chunk(
-                transcript_id = transcript.id,
-                company_id = transcript.company_id,
+            yield Chunk(
+                transcript_id = transcript_id,
+                company_id = company_id,
                 chunk_id= c_id,
                 chunk_hash= ch_hash,
                 chunk_index= idx,
@@ -80,54 +123,58 @@ def chunk_paras(transcript: EarningCallTranscript, chunk_size) -> List[Chunk]:
                 "para_speaker": para_speaker,
                 "para_chunk_index": i,
                 "chunk_char_count": len(chunk),
-                "chunk_word_count": len(chunk.split()),
-                "chunk_token_count": len(chunk)/4, #rough token estimate
-                "chunk_text": chunk}))
-    return all_chunks
+                "chunk_word_count": word_count,
+                "chunk_token_count": token_count,
+                "chunk_text": chunk})
 
+def chunk_paras(transcript: EarningCallTranscript, chunk_size) -> List[Chunk]:
+    return list(iter_chunk_paras(transcript, chunk_size))
 
-def _semantic_chunk_text(text: str, similarity_threshold: float = 0.8, max_tokens: int = 500) -> list:
+
+def _iter_semantic_chunk_text(text: str, similarity_threshold: float = 0.8, max_tokens: int = 500) -> Iterator[str]:
     """ Splits text into semantic chunks based on sentence similarity and max token length."""
     nlp = spacy.blank("en")
     nlp.add_pipe("sentencizer")
     doc = nlp(text)
     sentences = [sent.text.strip() for sent in doc.sents]
     if not sentences:
-        return []
+        return
 
-    embeddings = get_semantic_model()
-    chunks = []
+    embeddings = get_semantic_model().encode(sentences, batch_size=32, show_progress_bar=False)
     current_chunk = [sentences[0]]
+    current_chars = len(sentences[0])
     current_embedding = embeddings[0]
 
     for i in range(1, len(sentences)):
         sim = cosine_similarity([current_embedding], [embeddings[i]])[0][0]
-        chunk_token_count = len(" ".join(current_chunk)) // 4
+        chunk_token_count = current_chars // 4
 
         #we append the sentences into the chunk untill the sim is > threshold
         if sim >= similarity_threshold and chunk_token_count < max_tokens:
             current_chunk.append(sentences[i])
+            current_chars += len(sentences[i]) + 1
             current_embedding = np.mean([current_embedding, embeddings[i]], axis=0)
         else:
-            chunks.append(" ".join(current_chunk))
+            yield " ".join(current_chunk)
             current_chunk = [sentences[i]]
+            current_chars = len(sentences[i])
             current_embedding = embeddings[i]
     if current_chunk:
-        chunks.append(" ".join(current_chunk))
+        yield " ".join(current_chunk)
 
-    return chunks
+def _semantic_chunk_text(text: str, similarity_threshold: float = 0.8, max_tokens: int = 500) -> list:
+    return list(_iter_semantic_chunk_text(text, similarity_threshold, max_tokens))
 
-def semantic_chunk(transcript: EarningCallTranscript, similarity_threshold: float = 0.6, max_tokens: int = 500) -> list[dict]:
-    """Takes PDF pages with text and splits them into semantic chunks."""
-    all_chunks: List[Chunk] = []
+def iter_semantic_chunks(transcript: EarningCallTranscript, similarity_threshold: float = 0.6, max_tokens: int = 500) -> Iterator[Chunk]:
+    transcript_id, company_id = transcript.id, transcript.company_id
     text = transcript.raw_text
-    chunks = _semantic_chunk_text(text, similarity_threshold=similarity_threshold, max_tokens=max_tokens)
+    chunks = _iter_semantic_chunk_text(text, similarity_threshold=similarity_threshold, max_tokens=max_tokens)
     for i, chunk in enumerate(chunks):
-        ch_hash = _chunk_hash(str(transcript.id), i, chunk)
+        ch_hash = _chunk_hash(str(transcript_id), i, chunk)
         c_id = _chunk_id_from_hash(ch_hash)
-        all_chunks.append(Chunk(
-            transcript_id=transcript.id,
-            company_id=transcript.company_id,
+        yield Chunk(
+            transcript_id=transcript_id,
+            company_id=company_id,
             chunk_id=c_id,
             chunk_hash=ch_hash,
             chunk_index=i,
@@ -136,18 +183,163 @@ def semantic_chunk(transcript: EarningCallTranscript, similarity_threshold: floa
                     "chunk_char_count": len(chunk),
                     "chunk_word_count": len(chunk.split()),
                     "chunk_token_count": len(chunk) / 4, #rough token estimate
-                    "chunk_text": chunk}))
-    return all_chunks
+                    "chunk_text": chunk})
 
-def build_chunks(ask: IngestRequest, session: Session) -> List[Chunk]:
-    transcripts = _fetch_transcripts(ask, session)
-    
-    all_chunks: List[Chunk] = []
-    for t in transcripts:
-        if settings.CHUNK_STRATEGY == "paragraph":
-            chunks = chunk_paras(t, chunk_size=settings.CHUNK_SIZE)
-        elif settings.CHUNK_STRATEGY == 'semantic':
-            chunks = semantic_chunk(t, similarity_threshold=settings.SEMENTIC_THRESH) 
-        all_chunks.extend(chunks)
-    return all_chunks
+def semantic_chunk(transcript: EarningCallTranscript, similarity_threshold: float = 0.6, max_tokens: int = 500) -> List[Chunk]:
+    """Splits the transcript raw text into semantic chunks."""
+    return list(iter_semantic_chunks(transcript, similarity_threshold, max_tokens))
+
+@lru_cache(maxsize=4096)
+def _token_offsets(text: str) -> Tuple[Tuple[int, int], ...]:
+    """Char span of every embedding-model token in `text` (no special tokens), cached per text."""
+    tokenizer = get_embedding_model().tokenizer
+    encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+    return tuple(tuple(span) for span in encoded["offset_mapping"])
+
+def _token_budget() -> int:
+    #room left in the encoder window after [CLS] and [SEP]
+    model_max = get_embedding_model().max_seq_length - 2
+    return min(settings.CHUNK_MAX_TOKENS, model_max) if settings.CHUNK_MAX_TOKENS else model_max
+
+def _speaker_turns(para_structured_text) -> Iterator[Tuple[str, str, List[Tuple[int, int]]]]:
+    """Merges consecutive paragraphs of one speaker into (speaker, text, [(char_start, para_number)])."""
+    speaker, parts, starts, length = None, [], [], 0
+    for para in para_structured_text:
+        if parts and para.get("speaker") != speaker:
+            yield speaker, "\n".join(parts), starts
+            parts, starts, length = [], [], 0
+        speaker = para.get("speaker")
+        starts.append((length, para.get("paragraph_number")))
+        content = para.get("content") or ""
+        parts.append(content)
+        length += len(content) + 1
+    if parts:
+        yield speaker, "\n".join(parts), starts
+
+def _token_windows(offsets, max_tokens: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Token [start, end) windows of at most max_tokens that end on word boundaries."""
+    n = len(offsets)
+    start = 0
+    while start < n:
+        end = min(start + max_tokens, n)
+        #don't cut a word in two: back off while the next token continues the current word
+        while end < n and end > start + 1 and offsets[end][0] == offsets[end - 1][1]:
+            end -= 1
+        yield start, end
+        if end == n:
+            return
+        next_start = max(end - overlap, start + 1)
+        while next_start > start + 1 and offsets[next_start][0] == offsets[next_start - 1][1]:
+            next_start -= 1 #overlap starts on a word boundary too
+        start = next_start
 
+def iter_token_chunks(transcript: EarningCallTranscript, max_tokens: int, overlap: int) -> Iterator[Chunk]:
+    """Chunks sized by the embedding tokenizer that never span two speakers.
+
+    Consecutive paragraphs of one speaker are packed up to max_tokens, so each chunk fills the
+    encoder window instead of being silently truncated or left mostly empty.
+    """
+    transcript_id, company_id = transcript.id, transcript.company_id
+    idx = 0
+    for speaker, text, para_starts in _speaker_turns(transcript.para_structured_text):
+        offsets = _token_offsets(text)
+        for i, (start, end) in enumerate(_token_windows(offsets, max_tokens, overlap)):
+            char_start, char_end = offsets[start][0], offsets[end - 1][1]
+            chunk = text[char_start:char_end]
+            para_number = next(num for pos, num in reversed(para_starts) if pos <= char_start)
+            idx += 1
+            ch_hash = _chunk_hash(str(transcript_id), idx, chunk)
+            yield Chunk(
+                transcript_id = transcript_id,
+                company_id = company_id,
+                chunk_id= _chunk_id_from_hash(ch_hash),
+                chunk_hash= ch_hash,
+                chunk_index= idx,
+                chunk_data = {"para_number": para_number,
+                "para_speaker": speaker,
+                "para_chunk_index": i,
+                "chunk_char_count": len(chunk),
+                "chunk_word_count": len(chunk.split()),
+                "chunk_token_count": end - start, #exact, embedding tokenizer
+                "chunk_text": chunk})
+
+def _chunk_size_setting():
+    if settings.CHUNK_STRATEGY == "paragraph":
+        return settings.CHUNK_SIZE
+    if settings.CHUNK_STRATEGY == "token":
+        return _token_budget()
+    return None
+
+def _chunking_config() -> dict:
+    return {
+        "chunk_strategy": settings.CHUNK_STRATEGY,
+        "chunk_size": _chunk_size_setting(),
+        "chunk_overlap": settings.CHUNK_OVERLAP_TOKENS if settings.CHUNK_STRATEGY == "token" else None,
+        "embedding_model": settings.EMBEDDING_MODEL,
+        "chunker_version": CHUNKER_VERSION,
+    }
+
+def chunked_transcript_ids(session: Session, transcript_ids) -> set:
+    """Transcripts whose stored chunks were already built with the current chunking config."""
+    config = _chunking_config()
+    q = (session.query(TranscriptChunkingStatus.transcript_id)
+         .filter(TranscriptChunkingStatus.transcript_id.in_(list(transcript_ids)))
+         .filter(TranscriptChunkingStatus.chunk_strategy == config["chunk_strategy"])
+         .filter(TranscriptChunkingStatus.embedding_model == config["embedding_model"])
+         .filter(TranscriptChunkingStatus.chunker_version == config["chunker_version"]))
+    for column in ("chunk_size", "chunk_overlap"):
+        attr = getattr(TranscriptChunkingStatus, column)
+        q = q.filter(attr.is_(None) if config[column] is None else attr == config[column])
+    return {row.transcript_id for row in q.all()}
+
+def mark_chunked(session: Session, transcript_id, chunk_count: int) -> None:
+    values = {**_chunking_config(), "chunk_count": chunk_count, "completed_at": datetime.now(timezone.utc)}
+    stmt = insert(TranscriptChunkingStatus).values(transcript_id=transcript_id, **values)
+    session.execute(stmt.on_conflict_do_update(index_elements=[TranscriptChunkingStatus.transcript_id], set_=values))
+    session.commit()
+
+def prune_stale_chunks(session: Session, transcript_id, keep_chunk_ids) -> int:
+    """Deletes chunks of a re-chunked transcript that the current config no longer produces.
+
+    After a CHUNK_STRATEGY or size change the old boundaries would otherwise stay in
+    transcript_chunks and keep being retrieved next to the new ones.
+    """
+    stale = (session.query(TranscriptChunk.id)
+             .filter(TranscriptChunk.transcript_id == transcript_id)
+             .filter(TranscriptChunk.chunk_id.notin_(list(keep_chunk_ids))))
+    stale_ids = [row.id for row in stale.all()]
+    if not stale_ids:
+        return 0
+    session.query(ChunkEmbedding).filter(ChunkEmbedding.chunk_row_id.in_(stale_ids)).delete(synchronize_session=False)
+    session.query(TranscriptChunk).filter(TranscriptChunk.id.in_(stale_ids)).delete(synchronize_session=False)
+    session.commit()
+    return len(stale_ids)
+
+def _iter_strategy_chunks(transcript: EarningCallTranscript) -> Iterator[Chunk]:
+    if settings.CHUNK_STRATEGY == "paragraph":
+        return iter_chunk_paras(transcript, chunk_size=settings.CHUNK_SIZE)
+    elif settings.CHUNK_STRATEGY == 'semantic':
+        return iter_semantic_chunks(transcript, similarity_threshold=settings.SEMENTIC_THRESH)
+    elif settings.CHUNK_STRATEGY == 'token':
+        return iter_token_chunks(transcript, max_tokens=_token_budget(), overlap=settings.CHUNK_OVERLAP_TOKENS)
+    raise ValueError(f"Unknown CHUNK_STRATEGY: {settings.CHUNK_STRATEGY}")
+
+def iter_chunk_transcript(transcript: EarningCallTranscript) -> Iterator[Chunk]:
+    #chunks are produced lazily while the caller embeds them, only the chunker's own time is counted
+    return timed_iter("chunking", _iter_strategy_chunks(transcript))
+
+def chunk_transcript(transcript: EarningCallTranscript) -> List[Chunk]:
+    return list(iter_chunk_transcript(transcript))
+
+def pending_transcript_ids(ask: IngestRequest, session: Session) -> List[uuid.UUID]:
+    """Matching transcripts that aren't chunked and embedded with the current config yet."""
+    transcript_ids = _fetch_transcript_ids(ask, session)
+    done = chunked_transcript_ids(session, transcript_ids)
+    return [t_id for t_id in transcript_ids if t_id not in done]
+
+def iter_build_chunks(ask: IngestRequest, session: Session) -> Iterator[Chunk]:
+    for t in iter_transcripts(pending_transcript_ids(ask, session), session):
+        yield from iter_chunk_transcript(t)
+
+def build_chunks(ask: IngestRequest, session: Session) -> List[Chunk]:
+    return list(iter_build_chunks(ask, session))
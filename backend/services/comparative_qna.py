@@ -0,0 +1,69 @@
+#comparative questions ("how did guidance change from Q1 to Q4 2024"): retrieval runs once per
+#company/period slice with its own top-k, so one noisy quarter can't take every slot in the prompt
+from itertools import zip_longest
+from typing import List, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from backend.RequestSchemas.qa import CompareRequest, IngestRequest, RAGRequest
+from backend.ResponseSchemas.qa import RAGResponse
+from backend.config.config import get_settings
+from backend.models.companies_transcripts import TranscriptChunk
+from backend.services.rag import company_query, embed_query, generate_answer, rag_response, retrieve_top_k
+from backend.services.retrieval_pool import run_retrievals
+from backend.services.ticker_from_company import resolve_company_to_ticker
+
+settings = get_settings()
+
+
+def _slice_label(s: IngestRequest, resolved) -> str:
+    parts = []
+    if resolved is not None:
+        parts.append(resolved.ticker)
+    if s.year:
+        parts.append(str(s.year))
+    if s.quarter:
+        parts.append(f"Q{s.quarter}")
+    return " ".join(parts) or "all"
+
+
+def _retrieve_slices(req: CompareRequest, session: Session, resolved: dict) -> List[List[Tuple[TranscriptChunk, float]]]:
+    embedded = embed_query(req.question, session) #one encode for every slice
+    top_k = req.top_k_per_slice or settings.TOP_K
+
+    def retrieve(s: IngestRequest, slice_session: Session):
+        ask = RAGRequest(question=req.question, company=s)
+        return retrieve_top_k(ask, slice_session, top_k=top_k, embedded=embedded,
+                              resolved=resolved.get(company_query(s)))
+
+    #slices run at the same time on separate pooled connections, through the process-wide retrieval pool
+    return run_retrievals(session, req.slices, retrieve)
+
+
+def compare_ques_svc(req: CompareRequest, session: Session) -> RAGResponse:
+    if len(req.slices) > settings.COMPARE_MAX_SLICES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {settings.COMPARE_MAX_SLICES} slices can be compared.")
+
+    #each distinct company is resolved once, not once per period
+    resolved = {}
+    for s in req.slices:
+        if company_query(s) and company_query(s) not in resolved:
+            resolved[company_query(s)] = resolve_company_to_ticker(s)
+    labels = [_slice_label(s, resolved.get(company_query(s))) for s in req.slices]
+
+    per_slice = _retrieve_slices(req, session, resolved)
+
+    #interleave slice by slice (best of each slice first), so the context budget cuts evenly across slices
+    merged, merged_labels = [], []
+    for rank_group in zip_longest(*per_slice):
+        for label, hit in zip(labels, rank_group):
+            if hit is not None:
+                merged.append(hit)
+                merged_labels.append(label)
+
+    question = (f"{req.question}\n"
+                f"Compare the transcripts of: {', '.join(labels)}. Each context block names its slice.")
+    answer = generate_answer(question, merged, merged_labels)
+    return rag_response(answer, merged, merged_labels)
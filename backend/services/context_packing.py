@@ -0,0 +1,165 @@
+#packs retrieved chunks into the prompt under a token budget of the answering LLM
+#adjacent pieces of one paragraph are sent as one block, near-duplicates once, and the blocks that
+#fit are chosen together (0/1 knapsack on relevance) instead of stopping at the first one that doesn't
+import re
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+from backend.config.config import get_settings
+
+settings = get_settings()
+
+_DEDUP_JACCARD = 0.9 #word-shingle overlap above which two blocks count as the same evidence
+_BUDGET_BUCKET = 8 #tokens per knapsack cell, keeps the table small for large budgets
+
+
+class _Block(BaseModel):
+    chunks: list #TranscriptChunk rows, in transcript order
+    label: Optional[str]
+    score: float
+    text: str
+    rank: int #position of the block's best chunk in the retrieval order
+    tokens: int = 0
+    header: str = ""
+    shingles: set = set()
+
+
+@lru_cache(maxsize=2)
+def _token_counter(name: str) -> Callable[[str], int]:
+    if name == "estimate":
+        return lambda text: max(1, len(text) // 4)
+    if name.startswith("tiktoken:"):
+        try:
+            import tiktoken #optional dependency, only needed for openai tokenizers
+        except ImportError as e:
+            raise RuntimeError("CONTEXT_TOKENIZER uses tiktoken but the 'tiktoken' package is not installed.") from e
+        encoding = tiktoken.get_encoding(name.split(":", 1)[1])
+        return lambda text: len(encoding.encode(text))
+    from transformers import AutoTokenizer #installed with sentence-transformers
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    return lambda text: len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+def count_tokens(text: str) -> int:
+    return _token_counter(settings.CONTEXT_TOKENIZER)(text)
+
+
+def context_token_budget() -> int:
+    #MAX_CONTEXT_CHARS stays the fallback for configs that predate the token budget
+    return settings.MAX_CONTEXT_TOKENS or settings.MAX_CONTEXT_CHARS // 4
+
+
+def _join_overlapping(left: str, right: str) -> str:
+    #only token windows overlap, by at least CHUNK_OVERLAP_TOKENS and on word boundaries; the repeated
+    #span is sent once. anything else is two separate pieces of text and is joined with a space
+    overlap = settings.CHUNK_OVERLAP_TOKENS
+    if settings.CHUNK_STRATEGY == "token" and overlap > 0:
+        from backend.services.chunking import _token_offsets #the tokenizer the windows were cut with
+        token_ends = [end for _, end in _token_offsets(right)]
+        #candidate overlaps are whole-word prefixes of right, longest first
+        word_ends = sorted({end for end in token_ends if end == len(right) or right[end].isspace()}, reverse=True)
+        for k in word_ends:
+            if bisect_right(token_ends, k) < overlap:
+                break #shorter prefixes are below the configured overlap
+            if k <= len(left) and left.endswith(right[:k]) and (k == len(left) or left[-k - 1].isspace()):
+                return left + right[k:]
+    return f"{left} {right}"
+
+
+def _follows(prev, chunk) -> bool:
+    """True if `chunk` continues `prev` in the same paragraph (or speaker turn, or semantic run)."""
+    if prev.transcript_id != chunk.transcript_id or chunk.chunk_index != prev.chunk_index + 1:
+        return False
+    prev_data, data = prev.chunk_data or {}, chunk.chunk_data or {}
+    #a merged block gets one header with one speaker, so text of two speakers is never merged
+    if ("para_speaker" in data or "para_speaker" in prev_data) and data.get("para_speaker") != prev_data.get("para_speaker"):
+        return False
+    if "para_chunk_index" not in data:
+        return True #semantic chunks: consecutive chunk_index is enough
+    return data.get("para_chunk_index") == prev_data.get("para_chunk_index", -2) + 1
+
+
+def _merge_adjacent(retrieved, labels) -> List[_Block]:
+    ranked = [(chunk, score, labels[i] if labels else None, i) for i, (chunk, score) in enumerate(retrieved)]
+    ordered = sorted(ranked, key=lambda r: (r[2] or "", str(r[0].transcript_id), r[0].chunk_index))
+    blocks: List[_Block] = []
+    for chunk, score, label, rank in ordered:
+        text = (chunk.chunk_data or {}).get("chunk_text") or ""
+        last = blocks[-1] if blocks else None
+        if last is not None and last.label == label and _follows(last.chunks[-1], chunk):
+            last.chunks.append(chunk)
+            last.text = _join_overlapping(last.text, text)
+            last.score = max(last.score, score)
+            last.rank = min(last.rank, rank)
+        else:
+            blocks.append(_Block(chunks=[chunk], label=label, score=score, text=text, rank=rank))
+    return sorted(blocks, key=lambda b: b.rank)
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _dedup(blocks: List[_Block]) -> List[_Block]:
+    #blocks come best first, so the best copy of repeated evidence is the one kept
+    kept: List[_Block] = []
+    for block in blocks:
+        block.shingles = _shingles(block.text)
+        duplicate = False
+        for other in kept:
+            union = len(block.shingles | other.shingles)
+            if union and len(block.shingles & other.shingles) / union >= _DEDUP_JACCARD:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(block)
+    return kept
+
+
+def _header(block: _Block) -> str:
+    #short header: what the model needs to cite and attribute, not ids it never uses
+    chunk = block.chunks[0]
+    data = chunk.chunk_data or {}
+    parts = [f"chunk_id={chunk.chunk_id}"]
+    if data.get("para_speaker"):
+        parts.append(f"chunk_speaker={data.get('para_speaker')}")
+    if data.get("para_number") is not None:
+        parts.append(f"para_number={data.get('para_number')}")
+    if block.label:
+        parts.append(f"slice={block.label}")
+    return f"[{', '.join(parts)}]"
+
+
+def _knapsack(blocks: List[_Block], budget: int) -> List[_Block]:
+    """Picks the blocks with the highest total relevance whose tokens fit the budget."""
+    capacity = budget // _BUDGET_BUCKET
+    weights = [-(-b.tokens // _BUDGET_BUCKET) for b in blocks] #ceil, so a pick never exceeds the budget
+    values = [max(b.score, 1e-6) for b in blocks]
+    best = [0.0] * (capacity + 1)
+    taken = [[False] * (capacity + 1) for _ in blocks]
+    for i, (w, v) in enumerate(zip(weights, values)):
+        for c in range(capacity, w - 1, -1):
+            if best[c - w] + v > best[c]:
+                best[c] = best[c - w] + v
+                taken[i][c] = True
+    chosen, c = [], capacity
+    for i in range(len(blocks) - 1, -1, -1):
+        if taken[i][c]:
+            chosen.append(blocks[i])
+            c -= weights[i]
+    return sorted(chosen, key=lambda b: b.rank)
+
+
+def pack_context(retrieved: List[Tuple[object, float]], labels: Optional[List[str]] = None,
+                 budget: Optional[int] = None) -> List[str]:
+    """Context blocks (header + text) for the prompt, best evidence first, within `budget` tokens."""
+    budget = budget or context_token_budget()
+    blocks = _dedup(_merge_adjacent(retrieved, labels))
+    for block in blocks:
+        block.header = _header(block)
+        block.tokens = count_tokens(f"{block.header}\n{block.text}\n")
+    return [f"{b.header}\n{b.text}" for b in _knapsack(blocks, budget)]
@@ -1,11 +1,14 @@
 from collections import Counter
 from datetime import UTC, datetime, timezone
 import hashlib
-import re
 import json
+from typing import List, Optional, Tuple
+import uuid
 
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, insert, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, make_transient_to_detached
 from defeatbeta_api.client import duckdb_conf, duckdb_client
 from defeatbeta_api.utils.util import validate_memory_limit
 from defeatbeta_api.data.ticker import Ticker
@@ -14,8 +17,12 @@ import spacy
 
 from backend.RequestSchemas.ingestion import IngestRequest
 from backend.config.config import get_settings
-from backend.models.companies_transcripts import Company, EarningCallTranscript, TranscriptOrgEntity
+from backend.models.companies_transcripts import Company, EarningCallTranscript, TranscriptOrgEntity, TranscriptParagraph
 from backend.services.InternalSchemas.resolver import ResolverResponse
+from backend.services.metrics import span, traced
+from backend.services.org_names import canonicalize_org_counts, normalize_org_name
+from backend.services.org_trends import record_org_mentions
+from backend.services.search_cache import bump_ingestion_generation
 
 settings = get_settings()
 
@@ -40,37 +47,29 @@ duckdb_client.DuckDBClient._validate_httpfs_cache = lambda self: None
 def _normalise_tick(tick: str) -> str:
     return tick.strip().upper()
 
-_SUFFIXES = {"inc", "inc.", "corp", "corp.", "ltd", "ltd.", "llc", "plc", "co", "co."}
-def _normalize_org_name(s: str) -> str:
-    x = s.strip().lower()
-    x = re.sub(r"^[^\w]+|[^\w]+$", "", x)      #trim punctuation ends
-    x = re.sub(r"\s+", " ", x)                #collapse spaces
-    parts = x.split(" ")
-    #removes trailing corporate suffixes
-    while parts and parts[-1] in _SUFFIXES:
-        parts.pop()
-    return " ".join(parts)
-
 def create_get_company(resolved, session):
-    company_exist = (session.query(Company).filter(Company.ticker==resolved.ticker).first())
+    """Returns the company for the resolved ticker, inserting it if needed. Does not commit,
+    the caller's transaction (e.g. the transcript insert) decides."""
+    ticker = _normalise_tick(resolved.ticker)
+    company_exist = (session.query(Company).filter(Company.ticker==ticker).first())
     if company_exist:
         # raise HTTPException(status_code=400, detail="Email already exists.")
         return company_exist
     
-    company = Company(
+    #concurrent ingests of a new company: one insert wins, the other reads the winner's row
+    session.execute(pg_insert(Company).values(
+        id=uuid.uuid4(),
         name=resolved.name,
-        ticker=_normalise_tick(resolved.ticker),
+        ticker=ticker,
         exchange_code=resolved.exchCode,
         security_type=resolved.securityType,
         market_sector=resolved.marketSector,
         created_at = datetime.now(timezone.utc) 
-    )
-    session.add(company)
-    session.commit()
-    session.refresh(company)
+    ).on_conflict_do_nothing(index_elements=[Company.ticker]))
 
-    return company
+    return session.query(Company).filter(Company.ticker==ticker).one()
     
+@traced("defeatbeta_fetch")
 def fetch_transcripts(tick: str, year: int, quarter: int):
     "Fetch, Preprocess - extract named-entities: ORG, organisations, extract meta data, and Persist the transcript and the meta data"
     try:
@@ -88,10 +87,48 @@ def fetch_transcripts(tick: str, year: int, quarter: int):
     # required_transcript = required_transcript_df.to_dict(orient="records") #convert it into a list of dicts to store in our db
     return required_transcript_df
 
-def _normalize_org(name: str) -> str:
-    return name.strip().lower()
+def _content_hash(raw_text: str) -> str:
+    return hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
+
+def transcript_parts(transcript_df) -> Tuple[str, List[dict]]:
+    """Raw text and paragraph records from one columnar pass over the fetched frame.
+
+    Each column is converted to a python list once (native scalars, as to_dict gives), the text is a
+    single join over the content column and the records are zipped from the columns, so there is no
+    per-row pandas indexing.
+    """
+    columns = {name: transcript_df[name].tolist() for name in transcript_df.columns}
+    raw_text = " ".join(columns["content"])
+    names = list(columns)
+    records = [dict(zip(names, row)) for row in zip(*columns.values())]
+    return raw_text, records
+
+def find_ingested_transcript(session, ticker: str, year: int, quarter: int, content_hash: str):
+    """Returns the stored transcript if this exact content was already ingested for the company.
+
+    Uses uq_transcripts_hash and uq_transcripts_period. A different body stored for the same
+    period is still a conflict.
+    """
+    row = (session.query(EarningCallTranscript.id, EarningCallTranscript.content_hash)
+           .join(Company, EarningCallTranscript.company_id == Company.id)
+           .filter(Company.ticker == _normalise_tick(ticker))
+           .filter(or_(EarningCallTranscript.content_hash == content_hash,
+                       and_(EarningCallTranscript.fiscal_year == year, EarningCallTranscript.fiscal_quarter == quarter)))
+           .order_by((EarningCallTranscript.content_hash == content_hash).desc())
+           .first())
+    if row is None:
+        return None
+    if row.content_hash != content_hash:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Transcript already exists.")
+    return session.get(EarningCallTranscript, row.id)
+
+def org_data_from_counts(org_counts: Counter) -> dict:
+    return {
+        "org_unique_count": len(org_counts),
+        "org_freq_count_sorted": [{"name":name, "count":count} for name, count in org_counts.most_common()]
+    }
 
-def preprocess_transcripts(transcript_df):
+def preprocess_transcripts(transcript_df, parts: Optional[Tuple[str, List[dict]]] = None):
     
     if transcript_df is None or transcript_df.empty:
         raise HTTPException(
@@ -99,53 +136,69 @@ def preprocess_transcripts(transcript_df):
             detail="Transcript data is empty.",
         )
     
-    parts = []
-    for row in transcript_df.iterrows():
-        parts.append(row[1]['content'])
+    raw_text, para_records = parts or transcript_parts(transcript_df)
 
-    raw_text = " ".join(parts)
-
-    nlp = spacy.load(settings.SPACY_MODEL) #expensive loading
-    doc = nlp(raw_text)
+    with span("spacy_load"):
+        nlp = spacy.load(settings.SPACY_MODEL) #expensive loading
+    with span("spacy_ner"):
+        doc = nlp(raw_text)
 
     orgs  = [ent.text for ent in doc.ents if ent.label_ == "ORG"]
     #people also
-    org_counts = Counter(_normalize_org(o) for o in orgs if o.strip())
+    org_counts = Counter(name for name in map(normalize_org_name, orgs) if name)
 
-    content_hash = hashlib.sha256(raw_text.encode("utf-8")).hexdigest()
+    content_hash = _content_hash(raw_text)
 
     document_meta_data = {
             "char_count": len(raw_text),
             "word_count": len([t for t in doc if not t.is_space]),
             "sentence_count": len(list(doc.sents)),
         }
-    org_data = {
-        "org_unique_count": len(org_counts),
-        "org_freq_count_sorted": [{"name":name, "count":count} for name, count in org_counts.most_common()]
-    }
+    org_data = org_data_from_counts(org_counts)
     
     return {
         "raw_text": raw_text,
-        "para_structured_text": transcript_df.to_dict(orient="records"), #convert df into a list of dicts to store in our db
+        "para_structured_text": para_records, #list of dicts to store in our db
         "content_hash": content_hash,
         "org_data" : org_data,
         "document_meta_data": document_meta_data,
         "org_counts_raw": org_counts,
     }
 
-def persist_transcripts(session, company_id, transcript_payload, org_counts):
+def persist_paragraphs(session, transcript_id, para_structured_text):
+    #one row per paragraph so search snippets and paragraph hits never touch the full raw_text
+    rows = [{
+        "id": uuid.uuid4(),
+        "transcript_id": transcript_id,
+        "paragraph_number": para.get("paragraph_number"),
+        "speaker": para.get("speaker"),
+        "content": para.get("content") or "",
+        } for para in (para_structured_text or [])]
+    if rows:
+        session.execute(insert(TranscriptParagraph), rows)
+
+def persist_orgs(session, transcript_id, org_counts):
+    #one multi-row insert, however many organizations the call mentions
+    created_at = datetime.now(timezone.utc)
+    rows = [{
+        "id": uuid.uuid4(),
+        "transcript_id": transcript_id,
+        "org_name": org_norm,
+        "mention_count": count,
+        "created_at": created_at,
+        } for org_norm, count in (org_counts or Counter()).most_common()]
+    if rows:
+        session.execute(pg_insert(TranscriptOrgEntity).values(rows)
+                        .on_conflict_do_nothing(constraint="uq_org_per_transcript"))
 
-    transcript_exist = session.query(EarningCallTranscript).filter(
-        EarningCallTranscript.company_id==company_id,
-        EarningCallTranscript.fiscal_year==transcript_payload.get('fiscal_year'),
-        EarningCallTranscript.fiscal_quarter==transcript_payload.get('fiscal_quarter')
-        ).first()
-    
-    if transcript_exist:
-        #return transcript_exist #raise  raise 409 conflict when a transcript already exists
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Transcript already exists.")
+def persist_transcripts(session, company_id, transcript_payload, org_counts):
+    """Writes the transcript, its paragraphs and org mentions with set-based inserts and commits once.
 
-    transcript = EarningCallTranscript(
+    The insert itself detects an existing transcript (same period or same content) through the
+    unique constraints, so there is no separate existence query and nothing is left half written.
+    """
+    transcript_values = dict(
+        id= uuid.uuid4(),
         company_id= company_id,
         source= transcript_payload.get('source'),
         source_url= transcript_payload.get("source_url"),
@@ -160,35 +213,67 @@ def persist_transcripts(session, company_id, transcript_payload, org_counts):
         document_meta_data = transcript_payload.get('document_meta_data'),
         content_hash = transcript_payload.get('content_hash'),
     )
-    
-    session.add(transcript)
-    # session.commit()
-    # session.refresh(transcript)
-    session.flush()
-
-    for org_norm, count in org_counts.most_common():
-        org_entity = TranscriptOrgEntity(
-            transcript_id = transcript.id,
-            org_name = org_norm,
-            mention_count = count,
-            created_at = datetime.now(timezone.utc)
-        )
 
-        session.add(org_entity)
-    
+    transcript_id = session.execute(
+        pg_insert(EarningCallTranscript).values(**transcript_values)
+        .on_conflict_do_nothing() #uq_transcripts_period or uq_transcripts_hash
+        .returning(EarningCallTranscript.id)
+    ).scalar_one_or_none()
+
+    if transcript_id is None:
+        #nothing was written for the transcript, a company inserted in this transaction is rolled back with the session
+        #return transcript_exist #raise  raise 409 conflict when a transcript already exists
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,detail="Transcript already exists.")
+
+    persist_paragraphs(session, transcript_id, transcript_values["para_structured_text"])
+    persist_orgs(session, transcript_id, org_counts)
+    record_org_mentions(session, transcript_id, company_id, transcript_values["fiscal_year"],
+                        transcript_values["fiscal_quarter"], org_counts) #trend aggregates commit with the transcript
+
     session.commit()
+    bump_ingestion_generation(session) #cached search pages don't know about this transcript
+
+    #the written values become the identity-map copy, chunking reads them without selecting the row again
+    transcript = EarningCallTranscript(**transcript_values)
+    make_transient_to_detached(transcript)
+    session.add(transcript)
     return transcript
 
 
     
 
 def store_transcripts(resolved : ResolverResponse, inputRequest: IngestRequest, session: Session):
-    company = create_get_company(resolved, session)
     transcript_df = fetch_transcripts(tick=resolved.ticker, year=inputRequest.year, quarter=inputRequest.quarter)
     fetched_at = datetime.now(timezone.utc)
-    preprocess_response = preprocess_transcripts(transcript_df)
+
+    parts = transcript_parts(transcript_df) #the frame is converted once, for the hash and for preprocessing
+
+    #idempotent retries: an already stored transcript skips NER, persistence and (if done) chunking
+    existing = find_ingested_transcript(session, resolved.ticker, inputRequest.year, inputRequest.quarter,
+                                        _content_hash(parts[0]))
+    if existing is not None:
+        company = existing.parent_company
+        return {
+            'company_id': company.id,
+            'company_ticker':company.ticker,
+            'company_name':company.name,
+            'inserted_transcript_id': existing.id,
+            'transcript': existing,
+            'year': existing.fiscal_year,
+            'quarter': existing.fiscal_quarter,
+            'already_ingested': True,
+        }
+
+    preprocess_response = preprocess_transcripts(transcript_df, parts)
     preprocessed_at = datetime.now(timezone.utc)
 
+    #the write transaction starts here, after the slow fetch and NER, so no locks are held meanwhile
+    with span("db_company"):
+        company = create_get_company(resolved, session)
+    #spelling variants of one org are stored and counted under its canonical name
+    with span("org_canonicalize"):
+        org_counts = canonicalize_org_counts(session, preprocess_response.get("org_counts_raw"))
+
     #preparing payload for persistance
     transcript_payload = {
         # "tick": resolved.ticker, 
@@ -200,21 +285,24 @@ def store_transcripts(resolved : ResolverResponse, inputRequest: IngestRequest,
         "preprocessed_at": preprocessed_at,
         "raw_text": preprocess_response["raw_text"],
         "para_structured_text": preprocess_response["para_structured_text"],
-        "org_data" : preprocess_response['org_data'],
+        "org_data" : org_data_from_counts(org_counts),
         "document_meta_data": preprocess_response['document_meta_data'],
         "content_hash": preprocess_response["content_hash"],
         
     }
     
-    transcript = persist_transcripts(session, company_id=company.id, transcript_payload=transcript_payload, org_counts=preprocess_response.get("org_counts_raw"))
+    with span("db_persist"):
+        transcript = persist_transcripts(session, company_id=company.id, transcript_payload=transcript_payload, org_counts=org_counts)
     
     return {
         'company_id': company.id,
         'company_ticker':company.ticker,
         'company_name':company.name,
         'inserted_transcript_id': transcript.id,
+        'transcript': transcript, #handed straight to chunking, no second lookup by request filters
         'year': transcript.fiscal_year,
-        'quarter': transcript.fiscal_quarter
+        'quarter': transcript.fiscal_quarter,
+        'already_ingested': False,
     }
 
 
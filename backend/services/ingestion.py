@@ -1,25 +1,59 @@
 from fastapi import HTTPException
 from backend.RequestSchemas.ingestion import IngestRequest
-from backend.ResponseSchemas.ingestion import IngestionResponse
-from backend.services.chunking import build_chunks
+from backend.ResponseSchemas.ingestion import IngestionResponse, RechunkResponse
+from backend.services.chunking import (chunked_transcript_ids, iter_chunk_transcript, iter_transcripts, mark_chunked,
+                                       pending_transcript_ids, prune_stale_chunks)
 from backend.services.fetch_transcripts import store_transcripts
-from backend.services.rag import embed_chunks
+from backend.services.metrics import span
+from backend.services.parallel_chunking import iter_chunk_parallel
+from backend.services.rag import embed_chunk_stream
 from backend.services.ticker_from_company import resolve_company_to_ticker
 
 
 
+def _collect_ids(chunks, chunk_ids: list):
+    #remembers the chunk ids as they stream by, only ids are kept
+    for ch in chunks:
+        chunk_ids.append(ch.chunk_id)
+        yield ch
+
+def chunk_and_embed_transcript(transcript, session) -> int:
+    #chunking work is proportional to the new transcript only, and a no-op if it is already done
+    if transcript.id in chunked_transcript_ids(session, [transcript.id]):
+        return 0
+    transcript_id = transcript.id
+    chunk_ids = []
+    #the span covers chunking, embedding and chunk writes together, each also has its own
+    with span("chunk_and_embed"):
+        chunk_count = embed_chunk_stream(_collect_ids(iter_chunk_transcript(transcript), chunk_ids), session)
+        prune_stale_chunks(session, transcript_id, chunk_ids)
+        mark_chunked(session, transcript_id, chunk_count)
+    return chunk_count
+
+def chunk_and_embed_pending(ask, session) -> RechunkResponse:
+    #bulk (re-)chunking: transcripts are chunked in a process pool (CHUNK_WORKERS) while the
+    #parent embeds and writes finished ones, a few bodies and one embed batch in memory at a time
+    transcript_count, chunk_count = 0, 0
+    transcripts = iter_transcripts(pending_transcript_ids(ask, session), session)
+    for transcript_id, chunks in iter_chunk_parallel(transcripts):
+        chunk_count += embed_chunk_stream(chunks, session)
+        prune_stale_chunks(session, transcript_id, [ch.chunk_id for ch in chunks])
+        mark_chunked(session, transcript_id, len(chunks))
+        transcript_count += 1
+    return RechunkResponse(transcript_count=transcript_count, chunk_count=chunk_count)
+
 async def ingest_request(req: IngestRequest, session) -> IngestionResponse:
     resolved_company_response = resolve_company_to_ticker(req)
     persistance_response = store_transcripts(resolved_company_response, req, session)
-    chunk_response = build_chunks(req, session)
-    embed_chunks(chunk_response, session)
+    chunk_and_embed_transcript(persistance_response.get('transcript'), session)
     return IngestionResponse(
         company_id = persistance_response.get('company_id'),
         company_name = persistance_response.get('company_name'),
         ticker = persistance_response.get('company_ticker'),
         transcript_id = persistance_response.get('inserted_transcript_id'),
         fiscal_year = persistance_response.get('year'),
-        fiscal_quarter = persistance_response.get('quarter')
+        fiscal_quarter = persistance_response.get('quarter'),
+        already_ingested = persistance_response.get('already_ingested', False),
     )
 
     
@@ -4,7 +4,7 @@
 #display extracted organisation entities
 from uuid import UUID
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from backend.RequestSchemas.ingestion import IngestRequest, ListRequest
 from backend.ResponseSchemas.ingestion import InsertedTranscript, ListTranscriptResponse, OrgFreq, Orgs, ViewTranscriptResponse
 from backend.models.companies_transcripts import Company, EarningCallTranscript
@@ -20,14 +20,14 @@ def list_transcript_svc(req: str, session: Session):
         quarter=1 #not used
     )
     resolved = resolve_company_to_ticker(req_query)
-    print("Resolved company tick:", resolved.ticker)
-    company_exist = session.query(Company).filter(Company.ticker==resolved.ticker).first()
+    company_exist = session.query(Company.id, Company.name).filter(Company.ticker==resolved.ticker).first()
 
     if not company_exist:
         raise HTTPException(status_code=404, detail="Company does not exist in database.")
     
     transcripts = (
-        session.query(EarningCallTranscript).filter(EarningCallTranscript.company_id == company_exist.id)
+        session.query(EarningCallTranscript.id, EarningCallTranscript.fiscal_year, EarningCallTranscript.fiscal_quarter) #no transcript bodies
+        .filter(EarningCallTranscript.company_id == company_exist.id)
         .order_by(EarningCallTranscript.fiscal_year.desc(),
                   EarningCallTranscript.fiscal_quarter.desc()).all()
     )
@@ -51,7 +51,9 @@ def view_transcript_svc(transcript_id: str, session: Session):
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid transcript_id format.")
     
-    transcript = (session.query(EarningCallTranscript).filter(EarningCallTranscript.id == transcript_uuid).first())
+    transcript = (session.query(EarningCallTranscript)
+                  .options(undefer(EarningCallTranscript.raw_text), undefer(EarningCallTranscript.org_data))
+                  .filter(EarningCallTranscript.id == transcript_uuid).first())
     if transcript is None:
         raise HTTPException(status_code=404, detail="Transcript not found.")
     
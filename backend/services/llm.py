@@ -0,0 +1,179 @@
+#answering LLM providers behind one chat() call
+#each provider has its own semaphore, so a burst queues in the api process instead of piling onto a
+#model server that generates one answer at a time; identical prompts in flight share one generation,
+#and a busy, timed out or failing provider hands the prompt to LLM_FALLBACK_PROVIDER
+import abc
+import hashlib
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict
+
+import requests
+from fastapi import HTTPException, status
+
+from backend.config.config import get_settings
+
+settings = get_settings()
+
+_MOCK_MAX_CONCURRENCY = 64
+
+
+class ProviderUnavailable(Exception):
+    """The provider could not answer (no free slot in time, timeout, connection or server error)."""
+
+    def __init__(self, provider: str, reason: str, timed_out: bool = False):
+        super().__init__(f"{provider}: {reason}")
+        self.provider = provider
+        self.timed_out = timed_out
+
+
+class _Provider(abc.ABC):
+    name = ""
+
+    def __init__(self, max_concurrency: int):
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @abc.abstractmethod
+    def _complete(self, system: str, user: str) -> str:
+        ...
+
+    def chat(self, system: str, user: str) -> str:
+        #waiting for a slot is bounded too, a queue that never drains should fail over, not hang
+        if not self._slots.acquire(timeout=settings.LLM_QUEUE_TIMEOUT_SEC):
+            raise ProviderUnavailable(self.name, "no free slot", timed_out=True)
+        try:
+            return self._complete(system, user)
+        except requests.Timeout as e:
+            raise ProviderUnavailable(self.name, "request timed out", timed_out=True) from e
+        except requests.ConnectionError as e:
+            raise ProviderUnavailable(self.name, "connection failed") from e
+        except requests.HTTPError as e:
+            code = e.response.status_code if e.response is not None else 0
+            if code == 429 or code >= 500:
+                raise ProviderUnavailable(self.name, f"http {code}") from e
+            raise
+        finally:
+            self._slots.release()
+
+
+class _OllamaProvider(_Provider):
+    name = "ollama"
+
+    def _complete(self, system: str, user: str) -> str:
+        url = f"{settings.OLLAMA_BASE_URL}/api/chat"
+        payload = {
+            "model": settings.OLLAMA_MODEL,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            "stream": False,
+        }
+        resp = requests.post(url, json=payload, timeout=settings.REQUEST_TIMEOUT_SEC)
+        resp.raise_for_status()
+        data = resp.json()
+        return data.get("message", {}).get("content", "").strip()
+
+
+class _OpenAIProvider(_Provider):
+    name = "openai"
+
+    def _complete(self, system: str, user: str) -> str:
+        url = f"{settings.OPENAI_BASE_URL}/chat/completions"
+        headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"}
+        payload = {
+            "model": settings.OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+            "temperature": 0.2,
+        }
+        resp = requests.post(url, headers=headers, json=payload, timeout=settings.REQUEST_TIMEOUT_SEC)
+        resp.raise_for_status()
+        data = resp.json()
+        return data["choices"][0]["message"]["content"].strip()
+
+
+class _MockProvider(_Provider):
+    """Deterministic local answers for benchmarks and tests, no model server involved."""
+    name = "mock"
+
+    def _complete(self, system: str, user: str) -> str:
+        if settings.LLM_MOCK_LATENCY_SEC:
+            time.sleep(settings.LLM_MOCK_LATENCY_SEC)
+        cited = re.findall(r"chunk_id=([0-9a-fA-F-]{36})", user)[:3]
+        digest = hashlib.sha256(f"{system}\n{user}".encode("utf-8")).hexdigest()[:8]
+        citations = " ".join(f"[chunk_id={c}]" for c in cited)
+        return f"Mock answer {digest}. {citations}".strip()
+
+
+_PROVIDER_CLASSES = {"ollama": _OllamaProvider, "openai": _OpenAIProvider, "mock": _MockProvider}
+
+_providers: Dict[str, _Provider] = {}
+_providers_lock = threading.Lock()
+
+_inflight: Dict[str, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _max_concurrency(name: str) -> int:
+    if name == "ollama":
+        return settings.OLLAMA_MAX_CONCURRENCY
+    if name == "openai":
+        return settings.OPENAI_MAX_CONCURRENCY
+    return _MOCK_MAX_CONCURRENCY
+
+
+def get_provider(name: str) -> _Provider:
+    if name not in _PROVIDER_CLASSES:
+        raise ValueError(f"Unknown LLM provider '{name}', expected one of {sorted(_PROVIDER_CLASSES)}.")
+    with _providers_lock:
+        if name not in _providers:
+            _providers[name] = _PROVIDER_CLASSES[name](_max_concurrency(name))
+        return _providers[name]
+
+
+def _chat_with_fallback(system: str, user: str) -> str:
+    try:
+        return get_provider(settings.LLM_PROVIDER).chat(system, user)
+    except ProviderUnavailable as e:
+        fallback = settings.LLM_FALLBACK_PROVIDER
+        if fallback and fallback != settings.LLM_PROVIDER:
+            try:
+                return get_provider(fallback).chat(system, user)
+            except ProviderUnavailable:
+                pass
+        if e.timed_out:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="LLM provider timed out.") from e
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="LLM provider is unavailable.") from e
+
+
+def chat(system: str, user: str) -> str:
+    """Answer from the configured provider. Concurrent calls with the same prompt share one generation."""
+    key = hashlib.sha256(f"{settings.LLM_PROVIDER}\n{system}\n{user}".encode("utf-8")).hexdigest()
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+    if not leader:
+        return future.result()
+
+    try:
+        future.set_result(_chat_with_fallback(system, user))
+    except BaseException as e:
+        future.set_exception(e)
+    finally:
+        #only in-flight calls are shared, a later identical question is generated again
+        with _inflight_lock:
+            _inflight.pop(key, None)
+    return future.result()
+
+
+def reset_providers() -> None:
+    with _providers_lock:
+        _providers.clear()
@@ -0,0 +1,238 @@
+#per-stage timing: spans feed process-wide histograms (served on /metrics in the prometheus text
+#format) and the timings of the current request (sent back in a Server-Timing header)
+#each API worker keeps its own histograms and counters; a scrape reaches only one worker behind the shared
+#port, so with several workers set METRICS_MULTIPROC_DIR: every worker writes snapshots there and /metrics
+#serves the sum of all of them
+import functools
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from backend.config.config import get_settings
+
+settings = get_settings()
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_lock = threading.Lock()
+#(metric, labels) -> [bucket counts..., +Inf count, count, sum]
+_histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], list] = {}
+#(metric, labels) -> running total
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_dirty = False
+_flusher: Optional[threading.Thread] = None
+
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+_HELP = {
+    "trendtracker_stage_duration_seconds": "Time spent in one pipeline stage (resolve, fetch, ner, chunking, embed, db, search, llm).",
+    "trendtracker_http_request_duration_seconds": "Time to answer an HTTP request, by route.",
+    "trendtracker_sql_duration_seconds": "Time of one sql statement, by route (QUERY_PROFILING_ENABLED).",
+    "trendtracker_rerank_calls_total": "Cross-encoder rerank calls.",
+    "trendtracker_rerank_pairs_scored_total": "(question, chunk) pairs scored by the cross-encoder.",
+    "trendtracker_rerank_cache_hits_total": "(question, chunk) scores served from the rerank cache.",
+    "trendtracker_rerank_budget_exhausted_total": "Rerank calls cut off by RERANK_TIME_BUDGET_MS.",
+    "trendtracker_rerank_seconds_total": "Time spent reranking.",
+}
+
+
+def observe(metric: str, seconds: float, **labels: str) -> None:
+    global _dirty
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        series = _histograms.get(key)
+        if series is None:
+            series = _histograms[key] = [0] * (len(_BUCKETS) + 2) + [0.0]
+        for i, bound in enumerate(_BUCKETS):
+            if seconds <= bound:
+                series[i] += 1
+        series[len(_BUCKETS)] += 1 #+Inf
+        series[len(_BUCKETS) + 1] += 1 #count
+        series[len(_BUCKETS) + 2] += seconds
+        _dirty = True
+    _start_flusher()
+
+
+def increment(metric: str, value: float = 1, **labels: str) -> None:
+    global _dirty
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        _dirty = True
+    _start_flusher()
+
+
+def _record(stage: str, seconds: float) -> None:
+    observe("trendtracker_stage_duration_seconds", seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        #a stage can run several times per request (e.g. embed per batch), the header shows the total
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(stage, time.perf_counter() - start)
+
+
+def traced(stage: str):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_iter(stage: str, items: Iterable) -> Iterator:
+    """Yields from `items`, timing only the work done to produce them (not the consumer's)."""
+    iterator = iter(items)
+    spent = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent += time.perf_counter() - start
+            yield item
+    finally:
+        _record(stage, spent)
+
+
+def start_request_timings() -> object:
+    return _request_timings.set({})
+
+
+def end_request_timings(token) -> Dict[str, float]:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _snapshot_path() -> str:
+    return os.path.join(settings.METRICS_MULTIPROC_DIR, f"metrics_{os.getpid()}.json")
+
+
+def _write_snapshot(force: bool = False) -> None:
+    global _dirty
+    with _lock:
+        if not (_dirty or force):
+            return
+        data = {"histograms": [[m, labels, series] for (m, labels), series in _histograms.items()],
+                "counters": [[m, labels, value] for (m, labels), value in _counters.items()]}
+        _dirty = False
+    path = _snapshot_path()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path) #readers never see a half written file
+
+
+def _flush_loop() -> None:
+    while True:
+        time.sleep(settings.METRICS_FLUSH_SEC)
+        if not settings.METRICS_MULTIPROC_DIR:
+            continue
+        try:
+            _write_snapshot()
+        except OSError:
+            pass #try again on the next tick
+
+
+def _start_flusher() -> None:
+    #other workers only see what this one has written, so snapshots are refreshed in the background
+    global _flusher
+    if _flusher is not None or not settings.METRICS_MULTIPROC_DIR:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+
+def _merged_snapshots() -> Tuple[dict, dict]:
+    """Histograms and counters summed over every worker's snapshot in METRICS_MULTIPROC_DIR."""
+    _write_snapshot(force=True) #the worker answering the scrape is always current
+    histograms, counters = {}, {}
+    for path in glob.glob(os.path.join(settings.METRICS_MULTIPROC_DIR, "metrics_*.json")):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, series in data.get("histograms", []):
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            total = histograms.setdefault(key, [0] * len(series))
+            for i, value in enumerate(series):
+                total[i] += value
+        for metric, labels, value in data.get("counters", []):
+            key = (metric, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+    return histograms, counters
+
+
+def render_metrics() -> str:
+    """All histograms and counters in the prometheus text exposition format."""
+    if settings.METRICS_MULTIPROC_DIR:
+        histograms, counters = _merged_snapshots()
+    else:
+        with _lock:
+            histograms = {key: list(series) for key, series in _histograms.items()}
+            counters = dict(_counters)
+    lines = []
+    for metric in sorted({m for m, _ in histograms}):
+        lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, labels), series in sorted(histograms.items()):
+            if name != metric:
+                continue
+            for i, bound in enumerate(_BUCKETS):
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', repr(bound)))} {series[i]}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, ('le', '+Inf'))} {series[len(_BUCKETS)]}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {series[len(_BUCKETS) + 1]}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {series[len(_BUCKETS) + 2]}")
+    for metric in sorted({m for m, _ in counters}):
+        lines.append(f"# HELP {metric} {_HELP.get(metric, metric)}")
+        lines.append(f"# TYPE {metric} counter")
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def clear_metrics() -> None:
+    global _dirty
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _dirty = True
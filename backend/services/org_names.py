@@ -0,0 +1,175 @@
+#org-name canonicalization: "Apple", "Apple Inc." and "apple inc" all count under one org_name
+#names are normalized in python, then mapped through org_aliases; names never seen before are matched
+#against the canonical names with pg_trgm and either become an alias or a new canonical name
+import re
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterable
+
+from sqlalchemy import bindparam, event, text
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import Session
+from sqlalchemy.types import Text
+
+from backend.config.config import get_settings
+from backend.models.companies_transcripts import OrgAlias, OrgCanonicalName, TranscriptOrgEntity
+
+settings = get_settings()
+
+_SUFFIXES = {"inc", "corp", "corporation", "ltd", "limited", "llc", "plc", "co", "company", "holdings", "group"}
+
+_alias_lock = threading.Lock()
+_alias_cache: Dict[str, str] = {} #alias -> canonical_name, only filled from committed rows read back from the db
+_alias_cache_loaded = False
+
+
+def normalize_org_name(s: str) -> str:
+    """Lowercases, trims punctuation, collapses whitespace and drops trailing corporate suffixes."""
+    x = s.strip().lower()
+    x = x.replace("&", " and ")
+    x = re.sub(r"[^\w\s]", " ", x)            #punctuation inside names, e.g. "inc." or "s&p"
+    parts = x.split()                          #collapses spaces
+    #removes trailing corporate suffixes, but never the whole name
+    while len(parts) > 1 and parts[-1] in _SUFFIXES:
+        parts.pop()
+    return " ".join(parts)
+
+
+def _load_aliases(session: Session) -> None:
+    global _alias_cache_loaded
+    with _alias_lock:
+        if _alias_cache_loaded:
+            return
+        _alias_cache.update(dict(session.query(OrgAlias.alias, OrgAlias.canonical_name).all()))
+        _alias_cache_loaded = True
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_aliases(session: Session) -> None:
+    #aliases read inside a transaction may be its own uncommitted inserts, they are cached once it commits
+    seen = session.info.pop("org_aliases_seen", None)
+    if seen:
+        with _alias_lock:
+            _alias_cache.update(seen)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_uncommitted_aliases(session: Session) -> None:
+    session.info.pop("org_aliases_seen", None)
+
+
+def clear_org_alias_cache() -> None:
+    global _alias_cache_loaded
+    with _alias_lock:
+        _alias_cache.clear()
+        _alias_cache_loaded = False
+
+
+_FUZZY_MATCH = text("""
+    SELECT n.name, c.canonical_name
+    FROM unnest(:names) AS n(name)
+    CROSS JOIN LATERAL (
+        SELECT canonical_name
+        FROM org_canonical_names
+        WHERE canonical_name % n.name
+          AND similarity(canonical_name, n.name) >= :threshold
+        ORDER BY similarity(canonical_name, n.name) DESC, canonical_name
+        LIMIT 1
+    ) c
+""").bindparams(bindparam("names", type_=ARRAY(Text)))
+
+
+def canonicalize_names(session: Session, names: Iterable[str], create: bool = True) -> Dict[str, str]:
+    """Maps raw org names to canonical names for a whole batch at once.
+
+    Known aliases are answered from the in-memory map. The misses cost one alias query and one
+    trigram query (ix_org_canonical_trgm) in total, whatever their count. With `create`, names
+    without a match are registered as new canonical names in the caller's transaction.
+    """
+    _load_aliases(session)
+    normalized = {name: normalize_org_name(name) for name in names}
+    normalized = {name: norm for name, norm in normalized.items() if norm}
+    mapping = {norm: _alias_cache[norm] for norm in set(normalized.values()) if norm in _alias_cache}
+
+    misses = sorted(set(normalized.values()) - set(mapping))
+    if misses:
+        #aliases another worker committed since this process loaded them, or this transaction inserted
+        seen = session.info.setdefault("org_aliases_seen", {})
+        for alias, canonical in session.query(OrgAlias.alias, OrgAlias.canonical_name).filter(OrgAlias.alias.in_(misses)).all():
+            mapping[alias] = canonical
+            seen[alias] = canonical
+        misses = [m for m in misses if m not in mapping]
+
+    if misses:
+        fuzzy = dict(session.execute(_FUZZY_MATCH, {"names": misses, "threshold": settings.ORG_FUZZY_THRESHOLD}).all())
+        new_canonicals = [m for m in misses if m not in fuzzy]
+        for m in misses:
+            mapping[m] = fuzzy.get(m, m)
+        if create:
+            now = datetime.now(timezone.utc)
+            if new_canonicals:
+                session.execute(insert(OrgCanonicalName).values(
+                    [{"canonical_name": m, "created_at": now} for m in new_canonicals]).on_conflict_do_nothing())
+            session.execute(insert(OrgAlias).values([{
+                "alias": m,
+                "canonical_name": mapping[m],
+                "match_type": "fuzzy" if m in fuzzy else "exact",
+                "created_at": now,
+                } for m in misses]).on_conflict_do_nothing())
+
+    return {name: mapping[norm] for name, norm in normalized.items()}
+
+
+def canonicalize_org_counts(session: Session, org_counts: Counter) -> Counter:
+    """Re-keys NER org counts by canonical name, variants of one org are summed."""
+    mapping = canonicalize_names(session, org_counts.keys())
+    canonical = Counter()
+    for name, count in org_counts.items():
+        if name in mapping:
+            canonical[mapping[name]] += count
+    return canonical
+
+
+def resolve_org_name(session: Session, name: str) -> str:
+    """Canonical name for a user supplied org name, without registering anything."""
+    return canonicalize_names(session, [name], create=False).get(name) or normalize_org_name(name)
+
+
+_FOLD_INTO_CANONICAL = text("""
+    INSERT INTO orgs_in_transcripts (id, transcript_id, org_name, mention_count, created_at)
+    SELECT gen_random_uuid(), o.transcript_id, f.canonical_name, SUM(o.mention_count), MIN(o.created_at)
+    FROM orgs_in_transcripts o
+    JOIN unnest(:names, :canonicals) AS f(org_name, canonical_name) ON f.org_name = o.org_name
+    GROUP BY o.transcript_id, f.canonical_name
+    ON CONFLICT (transcript_id, org_name) DO UPDATE
+    SET mention_count = orgs_in_transcripts.mention_count + EXCLUDED.mention_count
+""").bindparams(bindparam("names", type_=ARRAY(Text)), bindparam("canonicals", type_=ARRAY(Text)))
+
+_DROP_FOLDED = text("""
+    DELETE FROM orgs_in_transcripts o
+    USING unnest(:names) AS f(org_name)
+    WHERE o.org_name = f.org_name
+""").bindparams(bindparam("names", type_=ARRAY(Text)))
+
+
+def recanonicalize_org_entities(session: Session, batch_size: int = 1000) -> int:
+    """Folds orgs_in_transcripts rows stored before canonicalization into their canonical names.
+
+    Only the distinct org names are read into python (to normalize and match them); the rows
+    themselves are re-keyed with one insert and one delete per batch of names, variants of an
+    org within a transcript are summed. Returns the number of rows folded away. Rebuild the
+    trend aggregates afterwards.
+    """
+    names = [name for (name,) in session.query(TranscriptOrgEntity.org_name).distinct().order_by(TranscriptOrgEntity.org_name).all()]
+    folded = 0
+    for start in range(0, len(names), batch_size):
+        mapping = canonicalize_names(session, names[start:start + batch_size])
+        #a canonical name always maps to itself, so a row renamed here is never folded again later
+        renames = {name: canonical for name, canonical in mapping.items() if canonical != name}
+        if not renames:
+            continue
+        session.execute(_FOLD_INTO_CANONICAL, {"names": list(renames), "canonicals": list(renames.values())})
+        folded += session.execute(_DROP_FOLDED, {"names": list(renames)}).rowcount
+    session.commit()
+    return folded
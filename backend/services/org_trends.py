@@ -0,0 +1,177 @@
+#organization mention trends, served from aggregates that are kept current on every ingest
+import base64
+import json
+from typing import Counter as CounterType
+from uuid import UUID
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from backend.RequestSchemas.orgs import OrgMentionsRequest, OrgTrendRequest, TopOrgsRequest
+from backend.ResponseSchemas.orgs import (OrgMentionHit, OrgMentionsResponse, OrgPeriodCount, OrgTrendPoint,
+                                          OrgTrendResponse, TopOrgsResponse)
+from backend.models.companies_transcripts import Company, EarningCallTranscript, OrgMentionPeriodTotal, OrgMentionTrend, TranscriptOrgEntity
+from backend.services.org_names import resolve_org_name
+
+
+def record_org_mentions(session: Session, transcript_id, company_id, fiscal_year, fiscal_quarter,
+                        org_counts: CounterType) -> None:
+    """Adds one transcript's org counts to the trend tables, in the caller's transaction."""
+    if not org_counts or fiscal_year is None or fiscal_quarter is None:
+        return
+    #fixed key order, so concurrent ingests lock shared rollup rows in the same order and can't deadlock
+    orgs = sorted(org_counts.items())
+    session.execute(insert(OrgMentionTrend).values([{
+        "org_name": org_name,
+        "fiscal_year": fiscal_year,
+        "fiscal_quarter": fiscal_quarter,
+        "company_id": company_id,
+        "transcript_id": transcript_id,
+        "mention_count": count,
+        } for org_name, count in orgs]).on_conflict_do_nothing())
+
+    stmt = insert(OrgMentionPeriodTotal).values([{
+        "org_name": org_name,
+        "fiscal_year": fiscal_year,
+        "fiscal_quarter": fiscal_quarter,
+        "mention_count": count,
+        "transcript_count": 1,
+        } for org_name, count in orgs])
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=[OrgMentionPeriodTotal.org_name, OrgMentionPeriodTotal.fiscal_year, OrgMentionPeriodTotal.fiscal_quarter],
+        set_={
+            "mention_count": OrgMentionPeriodTotal.mention_count + stmt.excluded.mention_count,
+            "transcript_count": OrgMentionPeriodTotal.transcript_count + 1,
+        },
+    ))
+
+
+def rebuild_org_trends(session: Session) -> None:
+    """Recomputes both aggregates from orgs_in_transcripts, for repairs after manual edits."""
+    session.query(OrgMentionPeriodTotal).delete(synchronize_session=False)
+    session.query(OrgMentionTrend).delete(synchronize_session=False)
+    per_transcript = (
+        session.query(TranscriptOrgEntity.org_name, EarningCallTranscript.fiscal_year, EarningCallTranscript.fiscal_quarter,
+                      EarningCallTranscript.company_id, EarningCallTranscript.id, TranscriptOrgEntity.mention_count)
+        .join(EarningCallTranscript, TranscriptOrgEntity.transcript_id == EarningCallTranscript.id)
+        .filter(EarningCallTranscript.fiscal_year.isnot(None), EarningCallTranscript.fiscal_quarter.isnot(None))
+    )
+    session.execute(insert(OrgMentionTrend).from_select(
+        ["org_name", "fiscal_year", "fiscal_quarter", "company_id", "transcript_id", "mention_count"], per_transcript))
+    totals = (
+        session.query(OrgMentionTrend.org_name, OrgMentionTrend.fiscal_year, OrgMentionTrend.fiscal_quarter,
+                      func.sum(OrgMentionTrend.mention_count), func.count())
+        .group_by(OrgMentionTrend.org_name, OrgMentionTrend.fiscal_year, OrgMentionTrend.fiscal_quarter)
+    )
+    session.execute(insert(OrgMentionPeriodTotal).from_select(
+        ["org_name", "fiscal_year", "fiscal_quarter", "mention_count", "transcript_count"], totals))
+    session.commit()
+
+
+def org_trend_svc(req: OrgTrendRequest, session: Session) -> OrgTrendResponse:
+    """Mentions of one org per fiscal period, across all companies or for one company."""
+    org_name = resolve_org_name(session, req.org_name) #"Apple Inc." and "apple" read the same key
+    if req.company_id:
+        table = OrgMentionTrend #ix_org_trend_company
+        q = session.query(table.fiscal_year, table.fiscal_quarter, table.mention_count,
+                          literal(1).label("transcript_count")) #one call per company and period
+        q = q.filter(table.company_id == req.company_id)
+    else:
+        table = OrgMentionPeriodTotal #primary key (org_name, fiscal_year, fiscal_quarter)
+        q = session.query(table.fiscal_year, table.fiscal_quarter, table.mention_count, table.transcript_count)
+    q = q.filter(table.org_name == org_name)
+    if req.fiscal_year_from:
+        q = q.filter(table.fiscal_year >= req.fiscal_year_from)
+    if req.fiscal_year_to:
+        q = q.filter(table.fiscal_year <= req.fiscal_year_to)
+
+    points = [OrgTrendPoint(
+              fiscal_year=r.fiscal_year,
+              fiscal_quarter=r.fiscal_quarter,
+              mention_count=r.mention_count,
+              transcript_count=r.transcript_count,
+              ) for r in q.order_by(table.fiscal_year, table.fiscal_quarter).all()]
+
+    return OrgTrendResponse(
+        org_name=org_name,
+        company_id=req.company_id,
+        total_mentions=sum(p.mention_count for p in points),
+        points=points,
+    )
+
+
+def top_orgs_svc(req: TopOrgsRequest, session: Session) -> TopOrgsResponse:
+    """Most mentioned orgs of a fiscal period across all calls."""
+    rows = (session.query(OrgMentionPeriodTotal.org_name, OrgMentionPeriodTotal.mention_count, OrgMentionPeriodTotal.transcript_count)
+              .filter(OrgMentionPeriodTotal.fiscal_year == req.fiscal_year,
+                      OrgMentionPeriodTotal.fiscal_quarter == req.fiscal_quarter)
+              .order_by(OrgMentionPeriodTotal.mention_count.desc(), OrgMentionPeriodTotal.org_name) #ix_org_totals_period
+              .limit(req.limit)
+              .all()
+              )
+    return TopOrgsResponse(
+        fiscal_year=req.fiscal_year,
+        fiscal_quarter=req.fiscal_quarter,
+        orgs=[OrgPeriodCount(org_name=r.org_name, mention_count=r.mention_count, transcript_count=r.transcript_count) for r in rows],
+    )
+
+
+def _encode_mentions_cursor(org_name: str, row) -> str:
+    payload = {"o": org_name, "m": row.mention_count, "y": row.fiscal_year, "q": row.fiscal_quarter, "id": str(row.transcript_id)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def _decode_mentions_cursor(org_name: str, cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        key = (int(payload["m"]), int(payload["y"]), int(payload["q"]), UUID(payload["id"]))
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if payload.get("o") != org_name:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not belong to this query.")
+    return key
+
+
+def org_mentions_svc(req: OrgMentionsRequest, session: Session) -> OrgMentionsResponse:
+    """Transcripts and companies that mention an org, most mentions first, then most recent period."""
+    org_name = resolve_org_name(session, req.org_name)
+    key = tuple_(OrgMentionTrend.mention_count, OrgMentionTrend.fiscal_year,
+                 OrgMentionTrend.fiscal_quarter, OrgMentionTrend.transcript_id)
+
+    #index-only page from ix_org_trend_mentions, walked backwards from the last key of the previous page
+    page_q = (session.query(OrgMentionTrend.transcript_id, OrgMentionTrend.company_id, OrgMentionTrend.fiscal_year,
+                            OrgMentionTrend.fiscal_quarter, OrgMentionTrend.mention_count)
+              .filter(OrgMentionTrend.org_name == org_name))
+    if req.cursor:
+        page_q = page_q.filter(key < tuple_(*_decode_mentions_cursor(org_name, req.cursor)))
+    page = (page_q.order_by(OrgMentionTrend.mention_count.desc(), OrgMentionTrend.fiscal_year.desc(),
+                            OrgMentionTrend.fiscal_quarter.desc(), OrgMentionTrend.transcript_id.desc())
+              .limit(req.limit)
+              .subquery("page")
+              )
+
+    #company names for the page only, companies is a small table
+    rows = (session.query(*page.c, Company.name.label("company_name"), Company.ticker)
+              .join(Company, Company.id == page.c.company_id)
+              .order_by(page.c.mention_count.desc(), page.c.fiscal_year.desc(),
+                        page.c.fiscal_quarter.desc(), page.c.transcript_id.desc())
+              .all()
+              )
+
+    next_cursor = None
+    if rows and len(rows) == req.limit:
+        next_cursor = _encode_mentions_cursor(org_name, rows[-1])
+
+    hits = [OrgMentionHit(
+            transcript_id=r.transcript_id,
+            company_id=r.company_id,
+            company_name=r.company_name,
+            ticker=r.ticker,
+            fiscal_year=r.fiscal_year,
+            fiscal_quarter=r.fiscal_quarter,
+            mention_count=r.mention_count,
+            ) for r in rows]
+
+    return OrgMentionsResponse(org_name=org_name, hits=hits, next_cursor=next_cursor)
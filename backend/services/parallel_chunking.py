@@ -0,0 +1,50 @@
+#fan CPU-bound chunking (hashing, uuid5, string work, sentencization) out to worker processes
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+from uuid import UUID
+
+from backend.config.config import get_settings
+from backend.services.InternalSchemas.chunk import Chunk, ChunkInput
+from backend.services.chunking import chunk_transcript
+
+settings = get_settings()
+
+
+def to_chunk_input(transcript) -> ChunkInput:
+    #only the body the configured strategy reads crosses the process boundary
+    if settings.CHUNK_STRATEGY == "semantic":
+        return ChunkInput(id=transcript.id, company_id=transcript.company_id, raw_text=transcript.raw_text)
+    return ChunkInput(id=transcript.id, company_id=transcript.company_id,
+                      para_structured_text=transcript.para_structured_text)
+
+
+def _chunk_worker(body: ChunkInput) -> Tuple[UUID, List[Chunk]]:
+    return body.id, chunk_transcript(body)
+
+
+def iter_chunk_parallel(transcripts: Iterable, max_workers: Optional[int] = None,
+                        max_in_flight: Optional[int] = None) -> Iterator[Tuple[UUID, List[Chunk]]]:
+    """Chunks transcripts in a process pool and yields (transcript_id, chunks) in input order.
+
+    At most `max_in_flight` transcripts are submitted ahead of the consumer, so memory stays
+    bounded while the caller embeds and writes each result.
+    """
+    max_workers = max_workers or settings.CHUNK_WORKERS
+    if max_workers <= 1:
+        for t in transcripts:
+            yield _chunk_worker(to_chunk_input(t))
+        return
+
+    max_in_flight = max_in_flight or max_workers * 2
+    #spawn, not fork: the parent may hold torch/CUDA state and DB connections
+    ctx = multiprocessing.get_context("spawn")
+    in_flight = deque()
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=ctx) as pool:
+        for t in transcripts:
+            in_flight.append(pool.submit(_chunk_worker, to_chunk_input(t)))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
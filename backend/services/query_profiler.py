@@ -0,0 +1,156 @@
+#opt-in sql profiling (QUERY_PROFILING_ENABLED): every statement is timed through engine events,
+#slow ones are kept in a ring buffer, and a sample of the SELECTs of chosen endpoints is re-run under
+#EXPLAIN (ANALYZE, BUFFERS) to show which indexes (hnsw, gin, btree) the planner actually used
+import random
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from backend.config.config import get_settings
+from backend.services.metrics import observe
+
+settings = get_settings()
+
+_MAX_STATEMENT_CHARS = 4000
+_MAX_TRACKED_STATEMENTS = 500 #distinct statements with running totals, later new ones are not tracked
+
+_lock = threading.Lock()
+_slow: deque = deque(maxlen=settings.SLOW_QUERY_BUFFER)
+_plans: deque = deque(maxlen=settings.EXPLAIN_BUFFER)
+_stats: Dict[str, dict] = {} #statement -> calls, total_ms, max_ms
+
+#(raw path, asgi scope of the request)
+_current_endpoint: ContextVar[Optional[Tuple[str, Optional[dict]]]] = ContextVar("current_endpoint", default=None)
+
+
+def _explain_endpoints() -> set:
+    return {e.strip().rstrip("/") for e in settings.EXPLAIN_ENDPOINTS.split(",") if e.strip()}
+
+
+def set_current_endpoint(path: str, scope: Optional[dict] = None):
+    #the scope is only read when a statement runs, by then routing has put the matched route in it
+    return _current_endpoint.set((path.rstrip("/"), scope))
+
+
+def reset_current_endpoint(token) -> None:
+    _current_endpoint.reset(token)
+
+
+def _endpoint_label(path: str, scope: Optional[dict]) -> str:
+    #the route template, not the raw path, keeps one histogram series per endpoint
+    if scope is None:
+        return path
+    return getattr(scope.get("route"), "path", "unmatched")
+
+
+def _plan_summary(plan) -> dict:
+    """Index names and sequentially scanned tables found anywhere in a json plan."""
+    indexes, seq_scans = [], []
+    def walk(node):
+        if node.get("Index Name"):
+            indexes.append(node["Index Name"])
+        if node.get("Node Type") == "Seq Scan":
+            seq_scans.append(node.get("Relation Name"))
+        for child in node.get("Plans", []):
+            walk(child)
+    for root in plan or []:
+        walk(root.get("Plan", {}))
+    return {"indexes": sorted(set(indexes)), "seq_scans": sorted({s for s in seq_scans if s})}
+
+
+def _explain(cursor, statement: str, parameters) -> dict:
+    #a raw cursor on the same connection, so the plan sees the same transaction and the engine
+    #events don't fire again; the savepoint keeps a failing EXPLAIN from aborting the caller's transaction
+    raw = cursor.connection.cursor()
+    try:
+        raw.execute("SAVEPOINT query_profiler_explain")
+        try:
+            raw.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters)
+            plan = raw.fetchone()[0]
+            raw.execute("RELEASE SAVEPOINT query_profiler_explain")
+        except Exception as e:
+            raw.execute("ROLLBACK TO SAVEPOINT query_profiler_explain")
+            return {"plan": None, "indexes": [], "seq_scans": [], "error": f"{type(e).__name__}: {e}"}
+    finally:
+        raw.close()
+    return {"plan": plan, **_plan_summary(plan), "error": None}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_profiler_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_profiler_start")
+    if not starts:
+        return
+    duration_ms = (time.perf_counter() - starts.pop()) * 1000.0
+    endpoint, scope = _current_endpoint.get() or (None, None)
+    label = _endpoint_label(endpoint, scope) if endpoint is not None else "none"
+    observe("trendtracker_sql_duration_seconds", duration_ms / 1000.0, endpoint=label)
+
+    text = statement[:_MAX_STATEMENT_CHARS]
+    now = datetime.now(timezone.utc)
+    with _lock:
+        stats = _stats.get(text)
+        if stats is None and len(_stats) < _MAX_TRACKED_STATEMENTS:
+            stats = _stats[text] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+        if stats is not None:
+            stats["calls"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        if duration_ms >= settings.SLOW_QUERY_MS:
+            _slow.append({"statement": text, "duration_ms": round(duration_ms, 2), "endpoint": endpoint,
+                          "captured_at": now})
+
+    #ANALYZE executes the statement again, so only reads are sampled and only from the chosen endpoints
+    if (executemany or endpoint is None or endpoint not in _explain_endpoints()
+            or not statement.lstrip().upper().startswith("SELECT")
+            or random.random() >= settings.EXPLAIN_SAMPLE_RATE):
+        return
+    sample = _explain(cursor, statement, parameters)
+    with _lock:
+        _plans.append({"statement": text, "duration_ms": round(duration_ms, 2), "endpoint": endpoint,
+                       "captured_at": now, **sample})
+
+
+def _handle_error(exception_context):
+    #a failed statement never reaches after_cursor_execute, drop its start time
+    conn = exception_context.connection
+    starts = conn.info.get("query_profiler_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def install_query_profiler(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def query_profile(top: int = 20) -> dict:
+    """Slow statements, sampled plans (newest first) and the statements with the most total time."""
+    with _lock:
+        slow = list(reversed(_slow))
+        plans = list(reversed(_plans))
+        ranked = sorted(_stats.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+    return {
+        "slow": slow,
+        "plans": plans,
+        "top": [{"statement": s, "calls": v["calls"], "total_ms": round(v["total_ms"], 2),
+                 "max_ms": round(v["max_ms"], 2)} for s, v in ranked],
+    }
+
+
+def clear_query_profile() -> None:
+    with _lock:
+        _slow.clear()
+        _plans.clear()
+        _stats.clear()
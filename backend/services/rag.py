@@ -1,26 +1,34 @@
 from datetime import datetime, timezone
-import json
-from typing import List, Tuple
-import requests
+from typing import Iterable, Iterator, List, Optional, Tuple
 from sqlalchemy.orm import Session
+import sqlalchemy as sa
 from sqlalchemy import and_, or_, select
+from pgvector.sqlalchemy import Vector
 
 from backend.RequestSchemas.qa import RAGRequest
 from backend.ResponseSchemas.qa import RAGResponse, Sources
 from backend.config.config import get_settings
 from backend.config.embeddings import get_embedding_model
-from backend.models.companies_transcripts import EarningCallTranscript, TranscriptChunk
+from backend.models.companies_transcripts import ChunkEmbedding, EarningCallTranscript, TranscriptChunk
 from backend.services.InternalSchemas.chunk import Chunk
+from backend.services.InternalSchemas.embedding import ActiveEmbedding
+from backend.services.context_packing import pack_context
+from backend.services.llm import chat
+from backend.services.metrics import span
+from backend.services.reembed import active_embedding_version, encode_with, write_version_embeddings
+from backend.services.rerank import rerank
 from backend.services.ticker_from_company import resolve_company_to_ticker
 
 
 settings = get_settings()
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = get_embedding_model()
-    embeddings = model.encode(texts, batch_size=32, show_progress_bar=False)
-    
-    return [e.tolist() for e in embeddings]
+def embed_texts(texts: List[str], model_name: Optional[str] = None) -> List[List[float]]:
+    with span("embed"):
+        if model_name is not None and model_name != settings.EMBEDDING_MODEL:
+            return encode_with(model_name, texts)
+        model = get_embedding_model()
+        embeddings = model.encode(texts, batch_size=32, show_progress_bar=False)
+        return [e.tolist() for e in embeddings]
 
 def _deduplicate_chunks(chunks: List[Chunk]) -> List[Chunk]:
     seen = set()
@@ -34,7 +42,8 @@ def _deduplicate_chunks(chunks: List[Chunk]) -> List[Chunk]:
     return unique
 
 
-def _upsert_chunk(session: Session, chunk, emb: List[float]):
+def _upsert_chunk(session: Session, chunk, emb: Optional[List[float]], embedding_model: Optional[str] = None):
+    #emb is None while a version is active: the row then only records that model, its vector is in chunk_embeddings
     row = session.execute(select(TranscriptChunk).where(
             TranscriptChunk.transcript_id == chunk.transcript_id,
             TranscriptChunk.chunk_id == chunk.chunk_id,
@@ -48,13 +57,13 @@ def _upsert_chunk(session: Session, chunk, emb: List[float]):
             chunk_hash = chunk.chunk_hash,
             chunk_index= chunk.chunk_index,
             embedding = emb, #384 size in db
-            embedding_model = get_settings().EMBEDDING_MODEL if emb is not None else None,
-            updated_at = datetime.now(timezone.utc) if emb is not None else None,
+            embedding_model = get_settings().EMBEDDING_MODEL if emb is not None else embedding_model,
+            updated_at = datetime.now(timezone.utc) if emb is not None or embedding_model else None,
             chunk_data = chunk.chunk_data,
         )
         session.add(row)
-    else: #fill missing fields or update embedding if absent and refresh the previous fields
-        if row.embedding is None and emb is not None:
+    else: #fill missing fields or update embedding if absent (or from another model) and refresh the previous fields
+        if emb is not None and (row.embedding is None or row.embedding_model != get_settings().EMBEDDING_MODEL):
             row.embedding = emb
             row.embedding_model = get_settings().EMBEDDING_MODEL
             row.updated_at = datetime.now(timezone.utc)
@@ -62,29 +71,104 @@ def _upsert_chunk(session: Session, chunk, emb: List[float]):
 
     return row
 
-def embed_chunks(chunks: List[Chunk], session: Session) -> None:
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _write_active_version_batch(chunks: List[Chunk], session: Session, active: ActiveEmbedding) -> list:
+    #the legacy Vector(384) column is left empty while a version serves retrieval, so the active
+    #model (and its dimension) is not tied to EMBEDDING_MODEL; write_version_embeddings fills the version
+    existing = {(t, c) for t, c in (session.query(TranscriptChunk.transcript_id, TranscriptChunk.chunk_id)
+                                   .join(ChunkEmbedding, and_(ChunkEmbedding.chunk_row_id == TranscriptChunk.id,
+                                                              ChunkEmbedding.embedding_model == active.embedding_model))
+                                   .filter(TranscriptChunk.chunk_id.in_([ch.chunk_id for ch in chunks]))
+                                   .all())}
+    to_write = [ch for ch in chunks if (ch.transcript_id, ch.chunk_id) not in existing]
+    if not to_write:
+        return []
+    with span("db_chunk_write"):
+        rows = [_upsert_chunk(session, ch, None, active.embedding_model) for ch in to_write]
+        write_version_embeddings(session, rows)
+    return rows
+
+def _embed_batch(chunks: List[Chunk], session: Session) -> list:
     #if there are existing chinks with embeddings
     chunks = _deduplicate_chunks(chunks)
+    active = active_embedding_version(session)
+    if active is not None:
+        return _write_active_version_batch(chunks, session, active)
     existing = {(transcr_id,chunk_id) for (transcr_id, chunk_id) in (session.query(TranscriptChunk.transcript_id, TranscriptChunk.chunk_id)
                                             .filter(TranscriptChunk.chunk_id.in_([ch.chunk_id for ch in chunks]))
                                             .filter(TranscriptChunk.embedding.isnot(None))
+                                            .filter(TranscriptChunk.embedding_model == settings.EMBEDDING_MODEL) #other models get re-embedded
                                             .all() )}
     
     to_embed = [ch for ch in chunks if (ch.transcript_id,ch.chunk_id) not in existing]
     if not to_embed:
-        return
+        return []
 
     embeddings = embed_texts([ch.chunk_data.get('chunk_text') for ch in to_embed])
 
-    for ch, emb in zip(to_embed, embeddings): #emb is  List[float]
-        _upsert_chunk(session, ch, emb)
-       
-    session.commit()
+    with span("db_chunk_write"):
+        rows = [_upsert_chunk(session, ch, emb) for ch, emb in zip(to_embed, embeddings)] #emb is  List[float]
+        write_version_embeddings(session, rows) #keeps ready/active shadow versions complete
+    return rows
 
-def retrieve_top_k(ask: RAGRequest, session: Session) -> List[Tuple[TranscriptChunk, float]]:
-    query_vec = embed_texts([ask.question])[0]
+def embed_chunk_stream(chunks: Iterable[Chunk], session: Session, batch_size: Optional[int] = None) -> int:
+    """Encodes and writes chunks in fixed-size batches as the chunker produces them.
+
+    Peak memory is one batch of chunks, embeddings and ORM rows, whatever the corpus size.
+    Returns the number of chunks consumed from the stream.
+    """
+    consumed = 0
+    for batch in _batched(chunks, batch_size or settings.EMBED_BATCH_SIZE):
+        rows = _embed_batch(batch, session)
+        session.commit()
+        for row in rows:
+            session.expunge(row) #written, no need to keep it in the identity map
+        consumed += len(batch)
+    return consumed
+
+def embed_chunks(chunks: List[Chunk], session: Session) -> None:
+    embed_chunk_stream(chunks, session)
 
-    query = session.query(TranscriptChunk)
+def embed_query(question: str, session: Session) -> Tuple[Optional[ActiveEmbedding], List[float]]:
+    """Embeds a question with the model retrieval currently reads (active version or legacy column)."""
+    active = active_embedding_version(session)
+    if active is None:
+        return None, embed_texts([question])[0]
+    return active, embed_texts([question], model_name=active.embedding_model)[0]
+
+def _similarity_query(session: Session, active: Optional[ActiveEmbedding], query_vec: List[float]):
+    if active is None:
+        query = session.query(TranscriptChunk).filter(TranscriptChunk.embedding.isnot(None))
+        distance = TranscriptChunk.embedding.cosine_distance(query_vec)
+    else:
+        query = session.query(TranscriptChunk).join(ChunkEmbedding, and_(
+            ChunkEmbedding.chunk_row_id == TranscriptChunk.id,
+            ChunkEmbedding.embedding_model == active.embedding_model,
+        ))
+        #same cast and predicate as the per-version partial hnsw index
+        distance = sa.cast(ChunkEmbedding.embedding, Vector(active.dim)).cosine_distance(query_vec)
+    return query, (1.0 - distance).label("score")
+
+def company_query(company) -> Optional[str]:
+    #company_name_query defaults to a non-string placeholder when it is left out of the request
+    q = getattr(company, "company_name_query", None)
+    return q if isinstance(q, str) and q.strip() else None
+
+def retrieve_top_k(ask: RAGRequest, session: Session, top_k: Optional[int] = None, embedded=None,
+                   resolved=None) -> List[Tuple[TranscriptChunk, float]]:
+    """Top chunks for the question. `embedded` (from embed_query) and `resolved` (the company)
+    let callers that retrieve several slices for one question do that work once."""
+    active, query_vec = embedded or embed_query(ask.question, session)
+    query, score = _similarity_query(session, active, query_vec)
 
     if settings.USE_HYBRID_FTS: 
         sub_query = (session.query(EarningCallTranscript.id)
@@ -92,45 +176,42 @@ def retrieve_top_k(ask: RAGRequest, session: Session) -> List[Tuple[TranscriptCh
             .limit(settings.FTS_CANDIDATE_LIMIT) 
             .subquery())
         query = query.filter(TranscriptChunk.transcript_id.in_(sub_query))
-    
-    query = query.filter(TranscriptChunk.embedding.isnot(None))
-
-    if ask.company.year:
-        query = query.filter(EarningCallTranscript.fiscal_year == ask.company.year)
-    if ask.company.quarter:
-        query = query.filter(EarningCallTranscript.fiscal_quarter == ask.company.quarter)
-    if ask.company.company_name_query:
-        resolved = resolve_company_to_ticker(ask.company) 
+
+    company = ask.company
+    if company and (company.year or company.quarter or company_query(company)):
+        #period filters need the join too, without it they cross join every transcript
         query = query.join(EarningCallTranscript, TranscriptChunk.transcript_id == EarningCallTranscript.id)
+    if company and company.year:
+        query = query.filter(EarningCallTranscript.fiscal_year == company.year)
+    if company and company.quarter:
+        query = query.filter(EarningCallTranscript.fiscal_quarter == company.quarter)
+    if company_query(company):
+        resolved = resolved or resolve_company_to_ticker(company) 
         query = query.filter(or_(EarningCallTranscript.parent_company.has(name=resolved.name),
             EarningCallTranscript.parent_company.has(ticker=resolved.ticker)
             ))
     
-    score = (1.0 - TranscriptChunk.embedding.cosine_distance(query_vec)).label("score")
-    query = query.add_columns(score).order_by(score.desc()).limit(settings.TOP_K) 
+    #with reranking on, pull a wider cosine pool and let the cross-encoder pick the best TOP_K
+    top_k = top_k or settings.TOP_K
+    limit = max(settings.RERANK_CANDIDATES, top_k) if settings.USE_RERANKER else top_k
+    query = query.add_columns(score).order_by(score.desc()).limit(limit) 
 
-    rows = query.all()
+    with span("vector_search"):
+        rows = query.all()
 
-    return [(row[0], float(row[1])) for row in rows if float(row[1]) >= settings.MIN_SCORE]  
+    retrieved = [(row[0], float(row[1])) for row in rows if float(row[1]) >= settings.MIN_SCORE]
+    if settings.USE_RERANKER:
+        with span("rerank"):
+            retrieved = rerank(ask.question, retrieved, top_k)
+    return retrieved
 
 
 
 
-def augment(question: str, retrieved: List[Tuple[TranscriptChunk, float]]) -> Tuple[str, str]:
-    context_blocks = []
-    total_chars = 0
-    for chunk, score in retrieved:
-        if settings.CHUNK_STRATEGY == 'paragraph':
-            header = (f"[chunk_id={chunk.chunk_id}, transcript_id={chunk.transcript_id} "
-                      f" chunk_speaker={chunk.chunk_data.get('para_speaker')}, para_number={chunk.chunk_data.get('para_number')}, score={score:.3f}]")
-        elif settings.CHUNK_STRATEGY == 'semantic':
-            header = (f"[chunk_id={chunk.chunk_id}, transcript_id={chunk.transcript_id}, score={score:.3f}]")
-            
-        block = f"{header}\n{chunk.chunk_data.get('chunk_text')}"
-        if total_chars + len(block) > settings.MAX_CONTEXT_CHARS: 
-            break
-        context_blocks.append(block)
-        total_chars += len(block)
+def augment(question: str, retrieved: List[Tuple[TranscriptChunk, float]],
+            labels: Optional[List[str]] = None) -> Tuple[str, str]:
+    #labels: slice of each retrieved chunk (e.g. "MSFT 2024 Q1") for comparative questions
+    context_blocks = pack_context(retrieved, labels) #token budget of the answering LLM
 
     system = (
         "You are an expert financial transcript assistant. "
@@ -148,56 +229,21 @@ def augment(question: str, retrieved: List[Tuple[TranscriptChunk, float]]) -> Tu
     )
     return system, user
 
-def ollama_chat(system: str, user: str) -> str:
-    url = f"{settings.OLLAMA_BASE_URL}/api/chat" 
-    payload = {
-        "model": settings.OLLAMA_MODEL,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        "stream": False,
-    }
-    resp = requests.post(url, json=payload, timeout=settings.REQUEST_TIMEOUT_SEC) 
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("message", {}).get("content", "").strip()
-
-def openai_chat(system: str, user: str) -> str:
-    url = f"{settings.OPENAI_BASE_URL}/chat/completions"  
-    headers = {"Authorization": f"Bearer {settings.OPENAI_API_KEY}"} 
-    payload = {
-        "model": settings.OPENAI_MODEL,
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-        "temperature": 0.2,
-    }
-    resp = requests.post(url, headers=headers, json=payload, timeout=settings.REQUEST_TIMEOUT_SEC) 
-    try:
-        err = resp.json()
-        print("Error body:", json.dumps(err, indent=2))
-    except Exception:
-        print("Response body (text):", resp.text)
-    resp.raise_for_status()
-    data = resp.json()
-    return data["choices"][0]["message"]["content"].strip()
-
-def generate_answer(question: str, retrieved: List[Tuple[TranscriptChunk, float]]) -> str:
+def generate_answer(question: str, retrieved: List[Tuple[TranscriptChunk, float]],
+                    labels: Optional[List[str]] = None) -> str:
     if not retrieved:
         return "Not enough evidence in the transcripts to answer."
-    system, user = augment(question, retrieved)
-
-    if settings.LLM_PROVIDER == "openai":
-        return openai_chat(system, user)
-    return ollama_chat(system, user)
+    with span("context_packing"):
+        system, user = augment(question, retrieved, labels)
+    with span("llm"):
+        return chat(system, user)
 
 
-def rag_response(answer: str, retrieved: List[Tuple[TranscriptChunk, float]]) -> RAGResponse:
+def rag_response(answer: str, retrieved: List[Tuple[TranscriptChunk, float]],
+                 labels: Optional[List[str]] = None) -> RAGResponse:
     sources = []
-    if settings.CHUNK_STRATEGY == "paragraph":
-        for ch, score in retrieved:
+    if settings.CHUNK_STRATEGY in ("paragraph", "token"):
+        for i, (ch, score) in enumerate(retrieved):
                 sources.append(
                     Sources(
                         company_id=ch.company_id,
@@ -207,10 +253,11 @@ def rag_response(answer: str, retrieved: List[Tuple[TranscriptChunk, float]]) ->
                         paragraph_num=ch.chunk_data.get('para_number'),
                         score=score,
                         snippet=ch.chunk_data.get('chunk_text')[:20],
+                        slice_label=labels[i] if labels else None,
                     )
                 )
     elif  settings.CHUNK_STRATEGY == "semantic":
-        for ch, score in retrieved:
+        for i, (ch, score) in enumerate(retrieved):
             sources.append(
                 Sources(
                     company_id=ch.company_id,
@@ -220,6 +267,7 @@ def rag_response(answer: str, retrieved: List[Tuple[TranscriptChunk, float]]) ->
                     paragraph_num=0,
                     score=score,
                     snippet=ch.chunk_data.get('chunk_text')[:20],
+                    slice_label=labels[i] if labels else None,
                 )
             )
     return RAGResponse(answer=answer, sources=sources)
\ No newline at end of file
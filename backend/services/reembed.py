@@ -0,0 +1,224 @@
+#re-embedding into versioned shadow embeddings, so the embedding model can change without downtime
+#a version is backfilled and indexed in the background (building), kept complete by ingest (ready) and
+#switched to for retrieval in one transaction (active); the legacy transcript_chunks.embedding column
+#keeps serving until then, and is no longer written while a version is active
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import exists, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from backend.config.config import get_settings
+from backend.config.embeddings import get_embedding_model_by_name
+from backend.models.companies_transcripts import ChunkEmbedding, EmbeddingVersion, TranscriptChunk
+from backend.services.InternalSchemas.embedding import ActiveEmbedding
+
+settings = get_settings()
+
+_active_lock = threading.Lock()
+_active_cache = (0.0, None) #(expires_at, ActiveEmbedding or None)
+
+
+def encode_with(model_name: str, texts: List[str]) -> List[List[float]]:
+    model = get_embedding_model_by_name(model_name)
+    embeddings = model.encode(texts, batch_size=32, show_progress_bar=False)
+    return [e.tolist() for e in embeddings]
+
+
+def get_version(session: Session, embedding_model: str) -> EmbeddingVersion:
+    version = session.get(EmbeddingVersion, embedding_model)
+    if version is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Embedding version not found.")
+    return version
+
+
+def register_version(session: Session, embedding_model: str) -> EmbeddingVersion:
+    """Registers a model for backfilling, or returns it if it is already registered."""
+    version = session.get(EmbeddingVersion, embedding_model)
+    if version is not None:
+        if version.status == "retired": #re-activating an old model, its rows may be stale, build it again
+            version.status = "building"
+            version.checkpoint = None
+            session.commit()
+        return version
+    dim = get_embedding_model_by_name(embedding_model).get_sentence_embedding_dimension()
+    version = EmbeddingVersion(embedding_model=embedding_model, dim=dim, status="building", processed=0,
+                               updated_at=datetime.now(timezone.utc))
+    session.add(version)
+    session.commit()
+    return version
+
+
+def _missing_chunks(session: Session, embedding_model: str):
+    return (session.query(TranscriptChunk.id, TranscriptChunk.chunk_data["chunk_text"].astext.label("chunk_text"))
+            .filter(~exists().where(ChunkEmbedding.chunk_row_id == TranscriptChunk.id,
+                                    ChunkEmbedding.embedding_model == embedding_model)))
+
+
+def run_reembed(session: Session, embedding_model: str, batch_size: Optional[int] = None,
+                max_batches: Optional[int] = None, throttle_sec: Optional[float] = None) -> EmbeddingVersion:
+    """Backfills chunk_embeddings for one model, resuming from the stored checkpoint.
+
+    Walks transcript_chunks in id order, one committed batch at a time, sleeping between batches
+    so the encoder and the writes don't starve live queries. A pass that ends with chunks still
+    missing (ingested behind the cursor) starts another one. Once a pass finds nothing left, the
+    version's hnsw index is built concurrently and the version turns 'ready'; one more pass then
+    picks up chunks ingested while it was still 'building'. With `max_batches` it stops early and
+    the next run picks up where it left.
+    """
+    batch_size = batch_size or settings.REEMBED_BATCH_SIZE
+    throttle_sec = settings.REEMBED_THROTTLE_SEC if throttle_sec is None else throttle_sec
+    version = get_version(session, embedding_model)
+    if version.status == "retired":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Embedding version is retired, register it again.")
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        q = _missing_chunks(session, embedding_model)
+        if version.checkpoint is not None:
+            q = q.filter(TranscriptChunk.id > version.checkpoint)
+        rows = q.order_by(TranscriptChunk.id).limit(batch_size).all()
+
+        if not rows:
+            if version.checkpoint is None: #a full pass found nothing missing
+                if version.status == "building":
+                    build_version_index(session, version)
+                    version.status = "ready" #from now on ingest writes this version too
+                    version.updated_at = datetime.now(timezone.utc)
+                    session.commit()
+                    continue #catch up with chunks whose ingest still saw 'building'
+                version.updated_at = datetime.now(timezone.utc)
+                session.commit()
+                break
+            version.checkpoint = None #next pass picks up chunks written behind the cursor
+            session.commit()
+            continue
+
+        embeddings = encode_with(embedding_model, [r.chunk_text or "" for r in rows])
+        stmt = insert(ChunkEmbedding).values([
+            {"chunk_row_id": r.id, "embedding_model": embedding_model, "embedding": emb}
+            for r, emb in zip(rows, embeddings)
+        ])
+        session.execute(stmt.on_conflict_do_nothing())
+        version.checkpoint = rows[-1].id
+        version.processed = (version.processed or 0) + len(rows)
+        version.updated_at = datetime.now(timezone.utc)
+        session.commit() #checkpoint and rows land together, a crash resumes after the last full batch
+        batches += 1
+        if throttle_sec:
+            time.sleep(throttle_sec)
+    return version
+
+
+def _index_name(version: EmbeddingVersion) -> str:
+    #model names hold '/' and '-', the index name is derived from a stable digest instead
+    digest = hashlib.md5(version.embedding_model.encode("utf-8")).hexdigest()[:12]
+    return f"ix_chunk_embeddings_hnsw_{digest}"
+
+
+def build_version_index(session: Session, version: EmbeddingVersion) -> None:
+    """Builds the version's hnsw index without blocking chunk writes.
+
+    The column has no fixed dimension, so the index is per model, on a cast with a matching
+    predicate. CREATE INDEX CONCURRENTLY needs its own autocommit connection; a session pinned to
+    one connection (e.g. inside an outer transaction) builds it in that transaction instead.
+    """
+    name = _index_name(version)
+    model_literal = version.embedding_model.replace("'", "''")
+    columns = (f"ON chunk_embeddings USING hnsw ((embedding::vector({int(version.dim)})) vector_cosine_ops) "
+               f"WHERE embedding_model = '{model_literal}'")
+    bind = session.get_bind()
+    if not isinstance(bind, Engine):
+        session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} {columns}"))
+        return
+    session.commit() #no transaction of ours may stay open while the concurrent build waits for old ones
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        #an interrupted concurrent build leaves an invalid index behind, IF NOT EXISTS would keep it
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {columns}"))
+
+
+def activate_version(session: Session, embedding_model: str) -> Optional[EmbeddingVersion]:
+    """Switches retrieval to `embedding_model`, a status flip only: the backfill and the index
+    were done by run_reembed, and ingest has kept the version complete since it turned ready.
+
+    Activating the unregistered EMBEDDING_MODEL retires every version and returns None,
+    retrieval then reads the legacy transcript_chunks.embedding column again.
+    """
+    if embedding_model == settings.EMBEDDING_MODEL and session.get(EmbeddingVersion, embedding_model) is None:
+        #chunks ingested while a version was active have no legacy embedding
+        if session.query(exists().where(TranscriptChunk.embedding.is_(None))).scalar():
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="Some chunks have no legacy embedding, register EMBEDDING_MODEL as a version instead.")
+        session.query(EmbeddingVersion).filter(EmbeddingVersion.status == "active").update({"status": "retired"})
+        session.commit()
+        clear_embedding_version_cache()
+        return None
+
+    version = get_version(session, embedding_model)
+    if version.status == "active":
+        return version
+    if version.status != "ready":
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Embedding version is not fully backfilled yet.")
+
+    #one transaction: readers see either the old or the new active version, never both or none
+    now = datetime.now(timezone.utc)
+    session.query(EmbeddingVersion).filter(EmbeddingVersion.status == "active").update(
+        {"status": "retired", "updated_at": now})
+    session.flush() #free the single-active unique index before taking it
+    version.status = "active"
+    version.activated_at = now
+    version.updated_at = now
+    session.commit()
+    clear_embedding_version_cache()
+    return version
+
+
+def active_embedding_version(session: Session) -> Optional[ActiveEmbedding]:
+    """The version retrieval reads from, None while the legacy column is live. Cached per process."""
+    global _active_cache
+    expires_at, active = _active_cache
+    if expires_at > time.monotonic():
+        return active
+    with _active_lock:
+        row = (session.query(EmbeddingVersion.embedding_model, EmbeddingVersion.dim)
+               .filter(EmbeddingVersion.status == "active")
+               .one_or_none())
+        active = ActiveEmbedding(embedding_model=row.embedding_model, dim=row.dim) if row else None
+        _active_cache = (time.monotonic() + settings.EMBEDDING_VERSION_TTL_SEC, active)
+    return active
+
+
+def clear_embedding_version_cache() -> None:
+    global _active_cache
+    with _active_lock:
+        _active_cache = (0.0, None)
+
+
+def write_version_embeddings(session: Session, rows: List[TranscriptChunk]) -> None:
+    """Embeds freshly written chunks for the active and ready versions too, so they stay complete."""
+    if not rows:
+        return
+    models = [m for (m,) in session.query(EmbeddingVersion.embedding_model)
+              .filter(EmbeddingVersion.status.in_(("ready", "active"))).all()]
+    if not models:
+        return
+    session.flush() #chunk row ids are needed for the foreign key
+    texts = [row.chunk_data.get("chunk_text") or "" for row in rows]
+    for model_name in models:
+        embeddings = encode_with(model_name, texts)
+        stmt = insert(ChunkEmbedding).values([
+            {"chunk_row_id": row.id, "embedding_model": model_name, "embedding": emb}
+            for row, emb in zip(rows, embeddings)
+        ])
+        session.execute(stmt.on_conflict_do_nothing())
@@ -0,0 +1,94 @@
+#optional second retrieval stage: cosine top-N -> cross-encoder -> best k
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from backend.config.config import get_settings
+from backend.config.embeddings import get_rerank_model
+from backend.services.metrics import increment
+from backend.models.companies_transcripts import TranscriptChunk
+
+settings = get_settings()
+
+#(question, chunk_id) -> cross-encoder score, bounded LRU shared across requests
+_score_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(key: Tuple[str, str]):
+    with _cache_lock:
+        score = _score_cache.get(key)
+        if score is not None:
+            _score_cache.move_to_end(key)
+        return score
+
+
+def _cache_put(key: Tuple[str, str], score: float) -> None:
+    with _cache_lock:
+        _score_cache[key] = score
+        _score_cache.move_to_end(key)
+        while len(_score_cache) > settings.RERANK_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+
+
+def _record(elapsed_ms: float, scored: int, hits: int, exhausted: bool) -> None:
+    #totals on /metrics, summed over workers there
+    increment("trendtracker_rerank_calls_total")
+    increment("trendtracker_rerank_pairs_scored_total", scored)
+    increment("trendtracker_rerank_cache_hits_total", hits)
+    increment("trendtracker_rerank_budget_exhausted_total", int(exhausted))
+    increment("trendtracker_rerank_seconds_total", elapsed_ms / 1000.0)
+
+
+def clear_rerank_cache() -> None:
+    with _cache_lock:
+        _score_cache.clear()
+
+
+def rerank(question: str, candidates: List[Tuple[TranscriptChunk, float]], top_k: int) -> List[Tuple[TranscriptChunk, float]]:
+    """Reorder cosine candidates by cross-encoder relevance and keep the best `top_k`.
+
+    Pairs are scored in batches until RERANK_TIME_BUDGET_MS is spent; candidates left unscored
+    keep their cosine order behind the scored ones. The returned score is still the cosine score,
+    so MIN_SCORE and the response payload mean the same thing with or without reranking.
+    """
+    if len(candidates) <= 1:
+        return candidates[:top_k]
+
+    start = time.perf_counter()
+    budget_s = settings.RERANK_TIME_BUDGET_MS / 1000.0
+
+    scores: Dict[int, float] = {}
+    pending: List[int] = []
+    for i, (chunk, _) in enumerate(candidates):
+        cached = _cache_get((question, str(chunk.chunk_id)))
+        if cached is None:
+            pending.append(i)
+        else:
+            scores[i] = cached
+    cache_hits = len(scores)
+
+    model = None
+    scored = 0
+    exhausted = False
+    batch_size = max(1, settings.RERANK_BATCH_SIZE)
+    for b in range(0, len(pending), batch_size):
+        if time.perf_counter() - start > budget_s:
+            exhausted = True
+            break
+        if model is None:
+            model = get_rerank_model()
+        batch = pending[b:b + batch_size]
+        pairs = [(question, candidates[i][0].chunk_data.get("chunk_text") or "") for i in batch]
+        batch_scores = model.predict(pairs, batch_size=batch_size, show_progress_bar=False)
+        for i, s in zip(batch, batch_scores):
+            scores[i] = float(s)
+            _cache_put((question, str(candidates[i][0].chunk_id)), float(s))
+        scored += len(batch)
+
+    ranked = sorted(scores, key=lambda i: scores[i], reverse=True)
+    ranked += [i for i in range(len(candidates)) if i not in scores] #already in cosine order
+
+    _record((time.perf_counter() - start) * 1000.0, scored, cache_hits, exhausted)
+    return [candidates[i] for i in ranked[:top_k]]
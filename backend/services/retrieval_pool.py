@@ -0,0 +1,54 @@
+#one process-wide pool for the concurrent retrievals of comparative and batch QnA: each retrieval holds
+#a pooled db connection while it runs, so however many compare and batch requests arrive at once,
+#together they never hold more than RETRIEVAL_WORKERS connections (the engine pool is 20, no overflow)
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from backend.config.config import get_settings
+
+settings = get_settings()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.RETRIEVAL_WORKERS, thread_name_prefix="retrieval")
+        return _executor
+
+
+def run_retrievals(session: Session, items: Iterable, retrieve: Callable[[object, Session], object]) -> List:
+    """retrieve(item, item_session) for every item, results in input order.
+
+    With an Engine-bound session each item gets a short-lived session on the shared pool and runs
+    in the process-wide executor; requests beyond RETRIEVAL_WORKERS queue there instead of waiting
+    on (or exhausting) the connection pool.
+    """
+    items = list(items)
+    bind = session.get_bind()
+    if not isinstance(bind, Engine):
+        #session pinned to one connection (e.g. inside an outer transaction), a connection can't run queries concurrently
+        return [retrieve(item, session) for item in items]
+
+    factory = sessionmaker(bind=bind, autocommit=False, autoflush=False)
+    def run(item):
+        with factory() as item_session:
+            return retrieve(item, item_session) #rows stay readable after close, nothing was expired
+
+    return list(_get_executor().map(run, items))
+
+
+def reset_retrieval_pool() -> None:
+    #the next retrieval starts a new pool sized from the current settings
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
@@ -1,14 +1,91 @@
 #after performing of search we want to return ranked transcript hits with snippets
+import base64
+import hashlib
+import json
+from uuid import UUID
+
+from fastapi import HTTPException, status
 import sqlalchemy as sa
-from sqlalchemy import func
+from sqlalchemy import and_, func, or_, select
 from sqlalchemy.orm import Session
-from backend.RequestSchemas.search import QueryRequest
-from backend.ResponseSchemas.search import QueryResponse, TranscriptHit
-from backend.models.companies_transcripts import EarningCallTranscript
+from backend.RequestSchemas.search import ParagraphQueryRequest, QueryRequest
+from backend.ResponseSchemas.search import ParagraphHit, ParagraphQueryResponse, QueryResponse, TranscriptHit
+from backend.models.companies_transcripts import EarningCallTranscript, TranscriptParagraph
+from backend.services.metrics import span, traced
+from backend.services.search_cache import cache_key, get_cached, set_cached
+from backend.config.config import get_settings
+
+settings = get_settings()
+
+_HEADLINE_OPTS = ("StartSel=<mark>, StopSel=</mark>, MaxFragments=2, "
+                  "MinWords=10, MaxWords=35, FragmentDelimiter=' … '")
+
+
+def _query_fingerprint(req) -> str:
+    #ties a cursor to the query and filters that produced it
+    data = req.model_dump(mode="json", exclude={"limit", "offset", "cursor"})
+    data["query"] = " ".join(req.query.split()).lower() #same normalization as the search cache key
+    key = json.dumps(data, sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_cursor(req, rank: float, row_id, total: int) -> str:
+    #the total rides along, so later pages don't count every match again
+    payload = {"r": rank, "id": str(row_id), "t": total, "q": _query_fingerprint(req)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(req):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(req.cursor.encode("ascii")))
+        rank, row_id, total = float(payload["r"]), UUID(payload["id"]), int(payload["t"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor.")
+    if payload.get("q") != _query_fingerprint(req):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor does not belong to this query.")
+    return rank, row_id, total
+
+
+def _snippet_column(page, ts_query):
+    #best matching paragraph of each hit; ts_headline then only parses a short paragraph
+    para_snippet = (
+        select(func.ts_headline("english", TranscriptParagraph.content, ts_query, _HEADLINE_OPTS))
+        .where(TranscriptParagraph.transcript_id == page.c.transcript_id,
+               TranscriptParagraph.content_fts.op("@@")(ts_query))
+        .order_by(func.ts_rank_cd(TranscriptParagraph.content_fts, ts_query).desc(),
+                  TranscriptParagraph.paragraph_number)
+        .limit(1)
+        .scalar_subquery()
+    )
+    #terms can match across paragraphs (or paragraphs are missing), fall back to the full text for that hit only
+    full_snippet = (
+        select(func.ts_headline("english", EarningCallTranscript.raw_text, ts_query, _HEADLINE_OPTS))
+        .where(EarningCallTranscript.id == page.c.transcript_id)
+        .scalar_subquery()
+    )
+    return func.coalesce(para_snippet, full_snippet).label("snippet")
+
+
+def _cached(search_fn, response_model):
+    def wrapper(req, session: Session):
+        if not settings.SEARCH_CACHE_ENABLED:
+            return search_fn(req, session)
+        with span("search_cache"):
+            key = cache_key(req, session)
+            cached = get_cached(key, response_model)
+        if cached is not None:
+            return cached
+        response = search_fn(req, session)
+        set_cached(key, response)
+        return response
+    return wrapper
 
 
-def search_transcripts_svc(req: QueryRequest, session: Session):
+@traced("fts_search")
+def _search_transcripts(req: QueryRequest, session: Session):
     ts_query = func.websearch_to_tsquery("english", req.query)
+    #ts_rank_cd returns real; as float8 the value read back (and put in the cursor) is exactly the one compared
+    rank = sa.cast(func.ts_rank_cd(EarningCallTranscript.raw_text_fts, ts_query), sa.Float(precision=53)).label("rank")
 
     base_q = (
         session.query(
@@ -16,13 +93,7 @@ def search_transcripts_svc(req: QueryRequest, session: Session):
             EarningCallTranscript.company_id,
             EarningCallTranscript.fiscal_year,
             EarningCallTranscript.fiscal_quarter,
-            func.ts_rank_cd(EarningCallTranscript.raw_text_fts, ts_query).label("rank"), 
-            func.ts_headline("english",
-                            EarningCallTranscript.raw_text,
-                            ts_query,
-                            "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, "
-                            "MinWords=10, MaxWords=35, FragmentDelimiter=' … '"
-                        ).label("snippet"),
+            rank,
         ).filter(EarningCallTranscript.raw_text_fts.op("@@")(ts_query))
     )
 
@@ -33,14 +104,44 @@ def search_transcripts_svc(req: QueryRequest, session: Session):
     if req.fiscal_quarter:
         base_q = base_q.filter(EarningCallTranscript.fiscal_quarter == req.fiscal_quarter)
 
-    total = base_q.count()
+    total = None
+    if req.cursor:
+        #keyset on (rank desc, transcript_id asc) in the scan itself: nothing is skipped with OFFSET or
+        #counted again, and hits ingested after the first page can't shift the following pages; the
+        #rank is still computed for every match (ts_rank_cd has no index), the sort keeps only `limit` rows
+        last_rank, last_id, total = _decode_cursor(req)
+        page_q = base_q.filter(or_(rank < last_rank,
+                                   and_(rank == last_rank, EarningCallTranscript.id > last_id)))
+    else:
+        #first (or offset) page: total matches from the same scan, no second count() query
+        page_q = base_q.add_columns(func.count().over().label("total"))
+        if req.offset:
+            page_q = page_q.offset(req.offset)
 
-    rows = (base_q.order_by(sa.desc("rank"))
-              .offset(req.offset)
+    page = (page_q.order_by(rank.desc(), EarningCallTranscript.id)
               .limit(req.limit)
+              .subquery("page")
+              )
+
+    #headlines are generated for the final page only
+    rows = (session.query(*page.c, _snippet_column(page, ts_query))
+              .order_by(page.c.rank.desc(), page.c.transcript_id)
               .all()
               )
 
+    if total is None:
+        if rows:
+            total = rows[0].total
+        elif req.offset:
+            #paged past the end: the window count is unavailable, count once
+            total = base_q.with_entities(func.count()).scalar()
+        else:
+            total = 0
+
+    next_cursor = None
+    if rows and len(rows) == req.limit:
+        next_cursor = _encode_cursor(req, rows[-1].rank, rows[-1].transcript_id, total)
+
     hits = [TranscriptHit(
             transcript_id=r.transcript_id,
             company_id=r.company_id,
@@ -50,4 +151,90 @@ def search_transcripts_svc(req: QueryRequest, session: Session):
             snippet=r.snippet,
             ) for r in rows]
 
-    return QueryResponse(total=total, hits=hits)
+    return QueryResponse(total=total, hits=hits, next_cursor=next_cursor)
+
+
+@traced("fts_paragraph_search")
+def _search_paragraphs(req: ParagraphQueryRequest, session: Session):
+    """Ranks single paragraphs instead of whole calls, optionally for one speaker only."""
+    ts_query = func.websearch_to_tsquery("english", req.query)
+    rank = sa.cast(func.ts_rank_cd(TranscriptParagraph.content_fts, ts_query), sa.Float(precision=53)).label("rank")
+
+    base_q = (
+        session.query(
+            TranscriptParagraph.id.label("paragraph_id"),
+            TranscriptParagraph.transcript_id,
+            EarningCallTranscript.company_id,
+            EarningCallTranscript.fiscal_year,
+            EarningCallTranscript.fiscal_quarter,
+            TranscriptParagraph.paragraph_number,
+            TranscriptParagraph.speaker,
+            rank,
+        )
+        .join(EarningCallTranscript, TranscriptParagraph.transcript_id == EarningCallTranscript.id)
+        .filter(TranscriptParagraph.content_fts.op("@@")(ts_query))
+    )
+
+    if req.speaker:
+        base_q = base_q.filter(func.lower(TranscriptParagraph.speaker) == req.speaker.strip().lower()) #ix_paragraphs_speaker
+    if req.company_id:
+        base_q = base_q.filter(EarningCallTranscript.company_id == req.company_id)
+    if req.fiscal_year:
+        base_q = base_q.filter(EarningCallTranscript.fiscal_year == req.fiscal_year)
+    if req.fiscal_quarter:
+        base_q = base_q.filter(EarningCallTranscript.fiscal_quarter == req.fiscal_quarter)
+
+    total = None
+    if req.cursor:
+        last_rank, last_id, total = _decode_cursor(req)
+        page_q = base_q.filter(or_(rank < last_rank,
+                                   and_(rank == last_rank, TranscriptParagraph.id > last_id)))
+    else:
+        page_q = base_q.add_columns(func.count().over().label("total"))
+        if req.offset:
+            page_q = page_q.offset(req.offset)
+
+    page = (page_q.order_by(rank.desc(), TranscriptParagraph.id)
+              .limit(req.limit)
+              .subquery("page")
+              )
+
+    snippet = (
+        select(func.ts_headline("english", TranscriptParagraph.content, ts_query, _HEADLINE_OPTS))
+        .where(TranscriptParagraph.id == page.c.paragraph_id)
+        .scalar_subquery()
+        .label("snippet")
+    )
+    rows = (session.query(*page.c, snippet)
+              .order_by(page.c.rank.desc(), page.c.paragraph_id)
+              .all()
+              )
+
+    if total is None:
+        if rows:
+            total = rows[0].total
+        elif req.offset:
+            total = base_q.with_entities(func.count()).scalar()
+        else:
+            total = 0
+
+    next_cursor = None
+    if rows and len(rows) == req.limit:
+        next_cursor = _encode_cursor(req, rows[-1].rank, rows[-1].paragraph_id, total)
+
+    hits = [ParagraphHit(
+            transcript_id=r.transcript_id,
+            company_id=r.company_id,
+            fiscal_year=r.fiscal_year,
+            fiscal_quarter=r.fiscal_quarter,
+            paragraph_number=r.paragraph_number,
+            speaker=r.speaker,
+            rank=r.rank,
+            snippet=r.snippet,
+            ) for r in rows]
+
+    return ParagraphQueryResponse(total=total, hits=hits, next_cursor=next_cursor)
+
+
+search_transcripts_svc = _cached(_search_transcripts, QueryResponse)
+search_paragraphs_svc = _cached(_search_paragraphs, ParagraphQueryResponse)
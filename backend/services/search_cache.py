@@ -0,0 +1,158 @@
+#cache for /search pages, invalidated by an ingestion generation counter
+#every persisted transcript bumps the generation, and the generation is part of the key,
+#so cached pages stay valid exactly until new transcripts land and then age out on their own
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from backend.config.config import get_settings
+from backend.models.companies_transcripts import SearchCacheGeneration
+
+settings = get_settings()
+
+_GENERATION_KEY = "trendtracker:search:generation"
+
+
+class _MemoryBackend:
+    """Process-local LRU with TTL. Each API worker keeps its own pages, the generation is shared.
+
+    The generation is a one-row counter in the database, re-read at most every
+    SEARCH_CACHE_GENERATION_TTL_SEC, so an ingest handled by one worker reaches the caches of
+    the others within that time.
+    """
+
+    def __init__(self, max_items: int, ttl_sec: int):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation = (0.0, 0) #(expires_at, generation)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_sec, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _remember(self, generation: int) -> int:
+        with self._lock:
+            self._generation = (time.monotonic() + settings.SEARCH_CACHE_GENERATION_TTL_SEC, generation)
+        return generation
+
+    def generation(self, session: Session) -> int:
+        with self._lock:
+            expires_at, generation = self._generation
+        if expires_at > time.monotonic():
+            return generation
+        generation = (session.query(SearchCacheGeneration.generation)
+                      .filter(SearchCacheGeneration.id == 1).scalar())
+        return self._remember(generation or 0)
+
+    def bump_generation(self, session: Session) -> int:
+        stmt = (insert(SearchCacheGeneration).values(id=1, generation=1)
+                .on_conflict_do_update(index_elements=[SearchCacheGeneration.id],
+                                       set_={"generation": SearchCacheGeneration.generation + 1})
+                .returning(SearchCacheGeneration.generation))
+        generation = session.execute(stmt).scalar_one()
+        session.commit()
+        return self._remember(generation) #this worker sees it at once, the others within the ttl
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._generation = (0.0, 0)
+
+
+class _RedisBackend:
+    """Shared across workers, the generation lives in redis so every worker sees new ingests."""
+
+    def __init__(self, url: str, ttl_sec: int):
+        try:
+            import redis #optional dependency, only needed when SEARCH_CACHE_URL is set
+        except ImportError as e:
+            raise RuntimeError("SEARCH_CACHE_URL is set but the 'redis' package is not installed.") from e
+        self.client = redis.Redis.from_url(url)
+        self.ttl_sec = ttl_sec
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def set(self, key: str, value: str) -> None:
+        self.client.set(key, value, ex=self.ttl_sec)
+
+    def generation(self, session: Session) -> int:
+        return int(self.client.get(_GENERATION_KEY) or 0)
+
+    def bump_generation(self, session: Session) -> int:
+        return int(self.client.incr(_GENERATION_KEY))
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter("trendtracker:search:page:*"):
+            self.client.delete(key)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if settings.SEARCH_CACHE_URL:
+                    _backend = _RedisBackend(settings.SEARCH_CACHE_URL, settings.SEARCH_CACHE_TTL_SEC)
+                else:
+                    _backend = _MemoryBackend(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_SEC)
+    return _backend
+
+
+def _normalize(req) -> str:
+    #websearch_to_tsquery ignores case and extra whitespace, so the cache key does too
+    data = req.model_dump(mode="json")
+    data["query"] = " ".join(req.query.split()).lower()
+    return f"{type(req).__name__}:{sorted(data.items())}"
+
+
+def cache_key(req, session: Session) -> str:
+    digest = hashlib.sha256(_normalize(req).encode("utf-8")).hexdigest()
+    return f"trendtracker:search:page:{_get_backend().generation(session)}:{digest}"
+
+
+def get_cached(key: str, response_model):
+    value = _get_backend().get(key)
+    return response_model.model_validate_json(value) if value is not None else None
+
+
+def set_cached(key: str, response) -> None:
+    #the key is taken before the query runs, so a page computed while an ingest commits
+    #is stored under the old generation and never served afterwards
+    _get_backend().set(key, response.model_dump_json())
+
+
+def bump_ingestion_generation(session: Session) -> int:
+    """Called after new transcripts are committed, every cached page becomes unreachable."""
+    return _get_backend().bump_generation(session)
+
+
+def clear_search_cache() -> None:
+    _get_backend().clear()
@@ -5,6 +5,7 @@ import json
 from backend.RequestSchemas.ingestion import IngestRequest
 from backend.config.config import get_settings
 from backend.services.InternalSchemas.resolver import ResolverResponse
+from backend.services.metrics import traced
 from urllib.error import HTTPError
 
 settings = get_settings()
@@ -50,8 +51,8 @@ def _api_call(path: str, data: dict | None = None, method: str = "POST",) -> Jso
         if e.code in (401, 403):
             raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY,detail="Resolver API key is invalid.") from e
     
+@traced("openfigi_resolve")
 def resolve_company_to_ticker(search_payload: IngestRequest):
-    print("company search request:", search_payload.company_name_query)
     search_request = {
         "query": search_payload.company_name_query,
         "securityType": search_payload.security_type,
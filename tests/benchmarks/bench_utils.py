@@ -0,0 +1,140 @@
+#synthetic earnings-call corpus and timing helpers shared by the benchmarks
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_TRANSCRIPTS = int(os.environ.get("BENCH_TRANSCRIPTS", "10000")) #run at 1000, 10000 and 100000
+BENCH_PARAGRAPHS = int(os.environ.get("BENCH_PARAGRAPHS", "40"))
+BENCH_CHUNKS_PER_TRANSCRIPT = int(os.environ.get("BENCH_CHUNKS_PER_TRANSCRIPT", "4")) #embedded chunks seeded per transcript
+BENCH_SEED = 7
+
+#stored results per benchmark and corpus size, a run slower (or less accurate) than this fails
+BENCH_BASELINE = Path(os.environ.get("BENCH_BASELINE", str(Path(__file__).with_name("baseline.json"))))
+BENCH_TOLERANCE = float(os.environ.get("BENCH_TOLERANCE", "0.25")) #relative slack for latency and throughput
+BENCH_RECALL_TOLERANCE = 0.02 #absolute slack for recall@k
+
+_SPEAKERS = ["Operator", "Chief Executive Officer", "Chief Financial Officer", "Analyst", "Investor Relations"]
+_VOCAB = (
+    "revenue margin guidance growth cloud demand supply chain inventory pricing capex "
+    "free cash flow buyback dividend segment operating expense headcount backlog bookings "
+    "subscription churn retention advertising data center gpu semiconductor consumer "
+    "enterprise europe china tariff currency headwind tailwind quarter year outlook "
+    "the we our and to of in for with on as that this is are was were strong weak record"
+).split()
+
+
+def _paragraph(rng: random.Random, words: int = 60) -> str:
+    return " ".join(rng.choice(_VOCAB) for _ in range(words)).capitalize() + "."
+
+
+def synthetic_corpus(n_transcripts: int, n_paragraphs: int, seed: int = BENCH_SEED, prefix: str = "SYN"):
+    """Yields (companies, transcripts, paragraphs) row batches that look like earnings calls."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    n_companies = max(1, n_transcripts // 40) #40 quarters per company
+    companies = [{
+        "id": uuid.uuid4(),
+        "name": f"Synthetic Co {prefix} {i}",
+        "ticker": f"{prefix}{i}",
+        "exchange_code": "US",
+        "security_type": "Common Stock",
+        "market_sector": "Equity",
+    } for i in range(n_companies)]
+    yield companies, [], []
+
+    batch_t, batch_p = [], []
+    for i in range(n_transcripts):
+        company = companies[i % n_companies]
+        period = i // n_companies
+        t_id = uuid.uuid4()
+        paras = [{"paragraph_number": j + 1, "speaker": rng.choice(_SPEAKERS), "content": _paragraph(rng)}
+                 for j in range(n_paragraphs)]
+        raw_text = " ".join(p["content"] for p in paras)
+        batch_t.append({
+            "id": t_id,
+            "company_id": company["id"],
+            "source": "synthetic",
+            "source_url": None,
+            "fiscal_year": 2000 + period // 4,
+            "fiscal_quarter": period % 4 + 1,
+            "fetched_at": now,
+            "preprocessed_at": now,
+            "updated_at": now,
+            "raw_text": raw_text,
+            "para_structured_text": paras,
+            "org_data": {"org_unique_count": 0, "org_freq_count_sorted": []},
+            "document_meta_data": {"char_count": len(raw_text), "word_count": 0, "sentence_count": 0},
+            "content_hash": uuid.uuid4().hex,
+        })
+        batch_p.extend({"id": uuid.uuid4(), "transcript_id": t_id, **p} for p in paras)
+        if len(batch_t) == 500:
+            yield [], batch_t, batch_p
+            batch_t, batch_p = [], []
+    if batch_t:
+        yield [], batch_t, batch_p
+
+
+def timed(fn, repeat: int = 20):
+    """Runs fn `repeat` times and returns (p50_ms, p95_ms)."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+
+def clustered_vectors(n: int, dim: int = 384, n_topics: int = 64, noise: float = 0.35, seed: int = BENCH_SEED):
+    """Unit vectors around `n_topics` random centers, so nearest neighbours are meaningful for recall."""
+    import numpy as np #installed with sentence-transformers
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_topics, dim))
+    vectors = centers[rng.integers(0, n_topics, size=n)] + noise * rng.normal(size=(n, dim))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def rows_per_sec(fn, rows: int) -> float:
+    start = time.perf_counter()
+    fn()
+    return rows / max(time.perf_counter() - start, 1e-9)
+
+
+def check_baseline(name: str, metrics: dict) -> list:
+    """Compares a run with the stored baseline of the same benchmark and corpus size.
+
+    Metrics ending in `_ms` are better when lower, recall and rows/sec when higher. Returns the
+    regressions as readable strings. BENCH_UPDATE_BASELINE=1 stores this run as the new baseline.
+    """
+    key = f"{name}@{BENCH_TRANSCRIPTS}"
+    baseline = json.loads(BENCH_BASELINE.read_text()) if BENCH_BASELINE.exists() else {}
+    metrics = {k: round(float(v), 4) for k, v in metrics.items()}
+    if os.environ.get("BENCH_UPDATE_BASELINE"):
+        baseline[key] = metrics
+        BENCH_BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        return []
+    stored = baseline.get(key)
+    if stored is None:
+        print(f"  no baseline for {key}, store one with BENCH_UPDATE_BASELINE=1")
+        return []
+
+    regressions = []
+    for metric, value in metrics.items():
+        old = stored.get(metric)
+        if old is None:
+            continue
+        if metric.endswith("_ms"):
+            worse = value > old * (1 + BENCH_TOLERANCE)
+        elif metric.startswith("recall"):
+            worse = value < old - BENCH_RECALL_TOLERANCE
+        else:
+            worse = value < old * (1 - BENCH_TOLERANCE)
+        if worse:
+            regressions.append(f"{key} {metric}: baseline {old}, now {value}")
+    return regressions
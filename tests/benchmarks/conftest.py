@@ -0,0 +1,91 @@
+#benchmarks are opt-in: RUN_BENCHMARKS=1 pytest tests/benchmarks -s
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import insert, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.companies_transcripts import Company, EarningCallTranscript, TranscriptChunk, TranscriptParagraph
+from bench_utils import (BENCH_CHUNKS_PER_TRANSCRIPT, BENCH_PARAGRAPHS, BENCH_TRANSCRIPTS, clustered_vectors,
+                         synthetic_corpus)
+
+
+@pytest.fixture(scope="module")
+def bench_session(request):
+    if not os.environ.get("RUN_BENCHMARKS"):
+        pytest.skip("set RUN_BENCHMARKS=1 to run benchmarks")
+    engine = request.getfixturevalue("engine")
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = sessionmaker(bind=connection, autocommit=False, autoflush=False)()
+
+    for companies, transcripts, paragraphs in synthetic_corpus(BENCH_TRANSCRIPTS, BENCH_PARAGRAPHS):
+        if companies:
+            session.execute(insert(Company), companies)
+        if transcripts:
+            session.execute(insert(EarningCallTranscript), transcripts)
+            session.execute(insert(TranscriptParagraph), paragraphs)
+    session.flush()
+    session.execute(text("ANALYZE"))
+
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+@pytest.fixture(scope="module")
+def bench_chunks(bench_session):
+    """Seeds embedded chunks (the first BENCH_CHUNKS_PER_TRANSCRIPT paragraphs of every transcript).
+
+    Vectors are synthetic and clustered, the encoder is benchmarked on its own. Returns the
+    vectors in chunk order plus the write and hnsw build timings.
+    """
+    rows = (bench_session.query(TranscriptParagraph.transcript_id, EarningCallTranscript.company_id,
+                                TranscriptParagraph.paragraph_number, TranscriptParagraph.speaker,
+                                TranscriptParagraph.content)
+            .join(EarningCallTranscript, EarningCallTranscript.id == TranscriptParagraph.transcript_id)
+            .filter(TranscriptParagraph.paragraph_number <= BENCH_CHUNKS_PER_TRANSCRIPT)
+            .order_by(TranscriptParagraph.transcript_id, TranscriptParagraph.paragraph_number)
+            .all())
+    vectors = clustered_vectors(len(rows))
+    hnsw = next(ix for ix in TranscriptChunk.__table__.indexes if ix.name == "ix_chunks_embedding_hnsw")
+    connection = bench_session.connection()
+    now = datetime.now(timezone.utc)
+
+    #bulk load without the index, then build it once, the way a backfill would
+    hnsw.drop(bind=connection)
+    start = time.perf_counter()
+    for offset in range(0, len(rows), 2000):
+        bench_session.execute(insert(TranscriptChunk), [{
+            "id": uuid.uuid4(),
+            "transcript_id": r.transcript_id,
+            "company_id": r.company_id,
+            "chunk_id": uuid.uuid4(),
+            "chunk_hash": uuid.uuid4().hex,
+            "chunk_index": r.paragraph_number - 1,
+            "embedding": vec.tolist(),
+            "embedding_model": "synthetic",
+            "updated_at": now,
+            "chunk_data": {"chunk_text": r.content, "para_speaker": r.speaker, "para_number": r.paragraph_number,
+                           "para_chunk_index": 0},
+        } for r, vec in zip(rows[offset:offset + 2000], vectors[offset:offset + 2000])])
+    insert_sec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    hnsw.create(bind=connection)
+    index_sec = time.perf_counter() - start
+    bench_session.execute(text("ANALYZE transcript_chunks"))
+
+    return {
+        "vectors": vectors,
+        "rows": len(rows),
+        "insert_rows_per_sec": len(rows) / max(insert_sec, 1e-9),
+        "hnsw_build_ms": index_sec * 1000.0,
+    }
@@ -0,0 +1,25 @@
+import os
+import random
+
+import pytest
+
+from backend.services.chunking import _chunk_text
+from bench_utils import _VOCAB, timed
+from tests.chunking_reference import legacy_chunk_text
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run benchmarks")
+
+
+@pytest.mark.parametrize("chunk_size", [200, 500, 2000])
+def test_bench_chunk_text(chunk_size):
+    rng = random.Random(11)
+    #roughly one large earnings call worth of paragraphs, a backfill runs this per transcript
+    paragraphs = [" ".join(rng.choice(_VOCAB) for _ in range(rng.randint(20, 400))) for _ in range(300)]
+
+    assert [_chunk_text(p, chunk_size) for p in paragraphs] == [legacy_chunk_text(p, chunk_size) for p in paragraphs]
+
+    legacy = timed(lambda: [legacy_chunk_text(p, chunk_size) for p in paragraphs], repeat=10)
+    current = timed(lambda: [_chunk_text(p, chunk_size) for p in paragraphs], repeat=10)
+    words = sum(len(p.split()) for p in paragraphs)
+    print(f"\n_chunk_text chunk_size={chunk_size} over {words} words (p50 / p95 ms): "
+          f"legacy {legacy[0]:.2f} / {legacy[1]:.2f}  current {current[0]:.2f} / {current[1]:.2f}")
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+from sqlalchemy import insert
+
+from backend.models.companies_transcripts import Company, EarningCallTranscript, TranscriptParagraph
+from backend.services.chunking import chunk_transcript
+from backend.services.rag import embed_texts
+from bench_utils import BENCH_PARAGRAPHS, check_baseline, rows_per_sec, synthetic_corpus
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run benchmarks")
+
+BENCH_INGEST_TRANSCRIPTS = int(os.environ.get("BENCH_INGEST_TRANSCRIPTS", "500"))
+BENCH_EMBED_SAMPLE = int(os.environ.get("BENCH_EMBED_SAMPLE", "2000"))
+
+
+def _transcripts(n: int, prefix: str):
+    return [EarningCallTranscript(**t) for _, batch, _ in synthetic_corpus(n, BENCH_PARAGRAPHS, prefix=prefix)
+            for t in batch]
+
+
+def test_bench_ingest_writes(bench_session):
+    #a fresh batch on top of the seeded corpus, so index maintenance costs what it costs at this size
+    batches = list(synthetic_corpus(BENCH_INGEST_TRANSCRIPTS, BENCH_PARAGRAPHS, prefix="ING"))
+    n_rows = sum(len(c) + len(t) + len(p) for c, t, p in batches)
+
+    def write():
+        for companies, transcripts, paragraphs in batches:
+            if companies:
+                bench_session.execute(insert(Company), companies)
+            if transcripts:
+                bench_session.execute(insert(EarningCallTranscript), transcripts)
+                bench_session.execute(insert(TranscriptParagraph), paragraphs)
+        bench_session.flush()
+
+    savepoint = bench_session.begin_nested()
+    try:
+        rate = rows_per_sec(write, n_rows)
+    finally:
+        savepoint.rollback()
+    print(f"\ningest writes: {n_rows} rows at {rate:.0f} rows/s")
+    regressions = check_baseline("ingest_writes", {"rows_per_sec": rate})
+    assert not regressions, regressions
+
+
+def test_bench_chunking_throughput():
+    transcripts = _transcripts(200, prefix="CHK")
+    chunks = []
+    rate = rows_per_sec(lambda: chunks.extend(c for t in transcripts for c in chunk_transcript(t)), len(transcripts))
+    print(f"\nchunking: {len(transcripts)} transcripts into {len(chunks)} chunks at {rate:.1f} transcripts/s")
+    regressions = check_baseline("chunking", {"transcripts_per_sec": rate})
+    assert not regressions, regressions
+
+
+def test_bench_embedding_throughput():
+    texts = [p["content"] for _, _, batch in synthetic_corpus(BENCH_EMBED_SAMPLE // BENCH_PARAGRAPHS + 1,
+                                                              BENCH_PARAGRAPHS, prefix="EMB")
+             for p in batch][:BENCH_EMBED_SAMPLE]
+    embed_texts(texts[:32]) #model load is not part of the throughput
+    rate = rows_per_sec(lambda: embed_texts(texts), len(texts))
+    print(f"\nembedding: {len(texts)} chunk texts at {rate:.0f} rows/s")
+    regressions = check_baseline("embedding", {"rows_per_sec": rate})
+    assert not regressions, regressions
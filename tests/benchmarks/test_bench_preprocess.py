@@ -0,0 +1,35 @@
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from backend.services.fetch_transcripts import transcript_parts
+from bench_utils import _SPEAKERS, _VOCAB, timed
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run benchmarks")
+
+
+def _legacy_parts(transcript_df):
+    #pre-rework path: iterrows() for the text, a second pass through to_dict for the records
+    parts = []
+    for row in transcript_df.iterrows():
+        parts.append(row[1]['content'])
+    return " ".join(parts), transcript_df.to_dict(orient="records")
+
+
+@pytest.mark.parametrize("n_paragraphs", [200, 2000, 20000])
+def test_bench_transcript_parts(n_paragraphs):
+    rng = random.Random(5)
+    df = pd.DataFrame([{
+        "paragraph_number": i + 1,
+        "speaker": rng.choice(_SPEAKERS),
+        "content": " ".join(rng.choice(_VOCAB) for _ in range(rng.randint(20, 200))),
+    } for i in range(n_paragraphs)])
+
+    assert transcript_parts(df) == _legacy_parts(df)
+
+    legacy = timed(lambda: _legacy_parts(df), repeat=5)
+    current = timed(lambda: transcript_parts(df), repeat=5)
+    print(f"\ntranscript_parts over {n_paragraphs} paragraphs (p50 / p95 ms): "
+          f"legacy {legacy[0]:.2f} / {legacy[1]:.2f}  current {current[0]:.2f} / {current[1]:.2f}")
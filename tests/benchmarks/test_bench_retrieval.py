@@ -0,0 +1,56 @@
+import numpy as np
+from sqlalchemy import text
+
+from backend.RequestSchemas.qa import RAGRequest
+from backend.models.companies_transcripts import TranscriptChunk
+from backend.services.rag import retrieve_top_k
+from bench_utils import BENCH_SEED, BENCH_TRANSCRIPTS, check_baseline, timed
+
+_N_QUERIES = 50
+_K = 10
+
+
+def _queries(vectors):
+    #perturbed copies of seeded chunks, so every query has real neighbours
+    rng = np.random.default_rng(BENCH_SEED + 1)
+    picked = vectors[rng.choice(len(vectors), size=_N_QUERIES, replace=False)]
+    queries = picked + 0.1 * rng.normal(size=picked.shape)
+    return [q.tolist() for q in queries / np.linalg.norm(queries, axis=1, keepdims=True)]
+
+
+def _exact_ids(session, query_vec, k):
+    #sequential scan over every embedding, the ground truth the hnsw index approximates
+    session.execute(text("SET LOCAL enable_indexscan = off"))
+    try:
+        rows = (session.query(TranscriptChunk.chunk_id)
+                .filter(TranscriptChunk.embedding.isnot(None))
+                .order_by(TranscriptChunk.embedding.cosine_distance(query_vec))
+                .limit(k).all())
+    finally:
+        session.execute(text("SET LOCAL enable_indexscan = on"))
+    return {r.chunk_id for r in rows}
+
+
+def test_bench_retrieve_top_k(bench_session, bench_chunks):
+    ask = RAGRequest(question="synthetic benchmark question")
+    queries = _queries(bench_chunks["vectors"])
+
+    def retrieve(q):
+        return retrieve_top_k(ask, bench_session, top_k=_K, embedded=(None, q))
+
+    recall = np.mean([len({c.chunk_id for c, _ in retrieve(q)} & _exact_ids(bench_session, q, _K)) / _K
+                      for q in queries])
+    latencies = [timed(lambda: retrieve(q), repeat=3)[0] for q in queries]
+    p50, p95 = float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+    print(f"\nretrieve_top_k over {bench_chunks['rows']} chunks of {BENCH_TRANSCRIPTS} transcripts: "
+          f"p50 {p50:.2f} ms  p95 {p95:.2f} ms  recall@{_K} {recall:.3f}")
+    print(f"  chunk writes {bench_chunks['insert_rows_per_sec']:.0f} rows/s  hnsw build {bench_chunks['hnsw_build_ms']:.0f} ms")
+    regressions = check_baseline("retrieve_top_k", {
+        "p50_ms": p50,
+        "p95_ms": p95,
+        f"recall_at_{_K}": recall,
+        "chunk_write_rows_per_sec": bench_chunks["insert_rows_per_sec"],
+        "hnsw_build_ms": bench_chunks["hnsw_build_ms"],
+    })
+    assert not regressions, regressions
@@ -0,0 +1,42 @@
+import sqlalchemy as sa
+from sqlalchemy import func
+
+from backend.RequestSchemas.search import QueryRequest
+from backend.models.companies_transcripts import EarningCallTranscript
+from backend.services.search import search_transcripts_svc
+from bench_utils import BENCH_TRANSCRIPTS, check_baseline, timed
+
+_QUERIES = ["gross margin guidance", "data center demand", "tariff headwind china"]
+
+
+def _legacy_search(req: QueryRequest, session):
+    #pre-rework path: count() re-runs the match, ts_headline over every full raw_text
+    ts_query = func.websearch_to_tsquery("english", req.query)
+    base_q = (
+        session.query(
+            EarningCallTranscript.id.label("transcript_id"),
+            func.ts_rank_cd(EarningCallTranscript.raw_text_fts, ts_query).label("rank"),
+            func.ts_headline("english", EarningCallTranscript.raw_text, ts_query,
+                             "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, "
+                             "MinWords=10, MaxWords=35, FragmentDelimiter=' … '").label("snippet"),
+        ).filter(EarningCallTranscript.raw_text_fts.op("@@")(ts_query))
+    )
+    total = base_q.count()
+    rows = base_q.order_by(sa.desc("rank")).offset(req.offset).limit(req.limit).all()
+    return total, rows
+
+
+def test_bench_search(bench_session):
+    print(f"\n/search over {BENCH_TRANSCRIPTS} transcripts (p50 / p95 ms)")
+    regressions = []
+    for q in _QUERIES:
+        req = QueryRequest(query=q, limit=20)
+        new = search_transcripts_svc(req, bench_session)
+        legacy_total, _ = _legacy_search(req, bench_session)
+        assert new.total == legacy_total
+
+        legacy = timed(lambda: _legacy_search(req, bench_session), repeat=5)
+        current = timed(lambda: search_transcripts_svc(req, bench_session), repeat=5)
+        print(f"  {q!r:28} legacy {legacy[0]:9.1f} / {legacy[1]:9.1f}   current {current[0]:9.1f} / {current[1]:9.1f}")
+        regressions.extend(check_baseline(f"search:{q}", {"p50_ms": current[0], "p95_ms": current[1]}))
+    assert not regressions, regressions
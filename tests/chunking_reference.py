@@ -0,0 +1,16 @@
+#reference copy of the original string-concatenation chunker, _chunk_text must match it
+#shared by test_chunking and the chunking benchmark, both import it as tests.chunking_reference
+
+
+def legacy_chunk_text(text, chunk_size=200):
+    chunks = []
+    current_chunk = ''
+    for word in text.split():
+        if len(current_chunk) + len(word) + 1 <= chunk_size:
+            current_chunk += word + ' '
+        else:
+            chunks.append(current_chunk.strip())
+            current_chunk = word + ' '
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
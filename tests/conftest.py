@@ -26,6 +26,7 @@ _DEFAULT_ENV = {
     "EMBEDDING_MODEL": "all-MiniLM-L6-v2",
     "USE_HYBRID_FTS": "false",
     "FTS_CANDIDATE_LIMIT": "10",
+    "SEARCH_CACHE_ENABLED": "false", #rolled back fixtures would otherwise be served from the cache
     "TOP_K": "3",
     "MIN_SCORE": "0.5",
     "MAX_CONTEXT_CHARS": "3000",
@@ -88,6 +89,7 @@ def engine():
     engine = create_engine(TEST_DATABASE_URL, pool_pre_ping=True)
     with engine.begin() as conn:
         conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     Base.metadata.create_all(bind=engine)
     yield engine
     engine.dispose()
@@ -31,3 +31,63 @@ def test_qna_validation(client):
     response = client.post("/qna/ask", json={})
 
     assert response.status_code == 422
+
+
+def test_top_orgs_limit_is_bounded(client):
+    response = client.post("/orgs/top", json={"fiscal_year": 2024, "fiscal_quarter": 1, "limit": 100000})
+
+    assert response.status_code == 422
+
+
+def test_org_mentions_limit_is_bounded(client):
+    response = client.post("/orgs/mentions", json={"org_name": "nvidia", "limit": 0})
+
+    assert response.status_code == 422
+
+
+def test_metrics_and_timing_headers(client):
+    response = client.post("/search/query", json={})
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert 'trendtracker_http_request_duration_seconds_count{method="POST",route="/search/query",status="422"}' in metrics.text
+
+
+def test_sql_metrics_are_labelled_by_route(engine, client, mock_transcript):
+    from sqlalchemy import event
+    from backend.services import query_profiler
+    from backend.services.metrics import render_metrics
+
+    query_profiler.install_query_profiler(engine)
+    try:
+        response = client.get(f"/ingest/view/{mock_transcript.id}")
+    finally:
+        event.remove(engine, "before_cursor_execute", query_profiler._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", query_profiler._after_cursor_execute)
+        event.remove(engine, "handle_error", query_profiler._handle_error)
+    assert response.status_code == 201
+
+    text = render_metrics()
+    assert 'trendtracker_sql_duration_seconds_count{endpoint="/ingest/view/{transcript_id}"}' in text
+    assert str(mock_transcript.id) not in text
+    query_profiler.clear_query_profile()
+
+
+def test_metrics_sum_every_worker_and_export_rerank_counters(monkeypatch, tmp_path):
+    import json
+    from backend.services import metrics, rerank
+
+    monkeypatch.setattr(metrics.settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    metrics.clear_metrics()
+    rerank._record(12.0, scored=5, hits=3, exhausted=True)
+    #snapshot of another api worker
+    other = {"histograms": [], "counters": [["trendtracker_rerank_cache_hits_total", [], 4]]}
+    (tmp_path / "metrics_999999.json").write_text(json.dumps(other))
+
+    text = metrics.render_metrics()
+    assert "# TYPE trendtracker_rerank_cache_hits_total counter" in text
+    assert "trendtracker_rerank_cache_hits_total 7" in text
+    assert "trendtracker_rerank_budget_exhausted_total 1" in text
+    assert "trendtracker_rerank_pairs_scored_total 5" in text
+    metrics.clear_metrics()
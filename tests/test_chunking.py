@@ -44,3 +44,63 @@ def test_chunk_hash_uniqueness(mock_company):
     assert len(hashes) == 2
     assert len(set(hashes)) == 2  # unique because chunk_index changes
 
+
+def test_word_packing_matches_legacy_chunker():
+    import random
+    from backend.services.chunking import _chunk_text, _pack_words
+    from tests.chunking_reference import legacy_chunk_text
+
+    rng = random.Random(3)
+    words = ["a", "revenue", "guidance", "x" * 30, "semiconductor", "ok", "y" * 250]
+    for _ in range(200):
+        text = "  ".join(rng.choice(words) for _ in range(rng.randint(0, 120)))
+        for size in (1, 20, 200, 500):
+            assert _chunk_text(text, chunk_size=size) == legacy_chunk_text(text, chunk_size=size)
+            assert [n for _, n in _pack_words(text, size)] == [len(c.split()) for c in legacy_chunk_text(text, size)]
+
+
+def test_token_chunks_respect_speaker_turns_and_overlap(monkeypatch, mock_company):
+    import re
+    import backend.services.chunking as chunking
+
+    #one token per word keeps the expected windows easy to read
+    monkeypatch.setattr(chunking, "_token_offsets", lambda text: tuple(m.span() for m in re.finditer(r"\S+", text)))
+
+    paras = [
+        {"paragraph_number": 1, "content": "one two three four", "speaker": "CEO"},
+        {"paragraph_number": 2, "content": "five six seven", "speaker": "CEO"},
+        {"paragraph_number": 3, "content": "margin was strong", "speaker": "CFO"},
+    ]
+    transcript = _build_transcript(mock_company.id, para_structured_text=paras, raw_text="")
+
+    chunks = list(chunking.iter_token_chunks(transcript, max_tokens=4, overlap=1))
+    texts = [(c.chunk_data["para_speaker"], c.chunk_data["chunk_text"]) for c in chunks]
+
+    assert texts == [
+        ("CEO", "one two three four"),
+        ("CEO", "four\nfive six seven"),  #same speaker packs across paragraphs, one token overlap
+        ("CFO", "margin was strong"),  #never spans two speakers
+    ]
+    assert [c.chunk_data["para_number"] for c in chunks] == [1, 1, 3]
+    assert [c.chunk_data["chunk_token_count"] for c in chunks] == [4, 4, 3]
+    assert len({c.chunk_id for c in chunks}) == 3
+
+
+def test_parallel_chunking_keeps_input_order(mock_company):
+    from backend.services.InternalSchemas.chunk import ChunkInput
+    from backend.services.parallel_chunking import iter_chunk_parallel
+
+    bodies = [
+        ChunkInput(
+            id=uuid.uuid4(),
+            company_id=mock_company.id,
+            para_structured_text=[{"paragraph_number": 1, "content": f"Paragraph of transcript {i}. " * 20, "speaker": "CEO"}],
+        )
+        for i in range(6)
+    ]
+
+    serial = list(iter_chunk_parallel(bodies, max_workers=1))
+    parallel = list(iter_chunk_parallel(bodies, max_workers=2, max_in_flight=3))
+
+    assert [t_id for t_id, _ in parallel] == [b.id for b in bodies]
+    assert [[c.chunk_id for c in chunks] for _, chunks in parallel] == [[c.chunk_id for c in chunks] for _, chunks in serial]
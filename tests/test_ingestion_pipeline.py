@@ -98,4 +98,143 @@ def test_duplicate_transcript_conflict(test_session, mock_transcript):
         persist_transcripts(test_session, company_id=mock_transcript.company_id, transcript_payload=payload, org_counts=Counter())
 
     assert exc.value.status_code == status.HTTP_409_CONFLICT
-    assert "Transcript already exists" in exc.value.detail
\ No newline at end of file
+    assert "Transcript already exists" in exc.value.detail
+
+
+def test_transcript_bodies_are_deferred(test_session, mock_transcript):
+    from sqlalchemy import inspect
+
+    test_session.expire_all()
+    loaded = (
+        test_session.query(EarningCallTranscript)
+        .filter(EarningCallTranscript.id == mock_transcript.id)
+        .one()
+    )
+    unloaded = inspect(loaded).unloaded
+    assert {"raw_text", "para_structured_text", "org_data", "raw_text_fts"} <= unloaded
+    assert loaded.raw_text.startswith("Microsoft")  #still available on access
+
+
+def test_list_transcripts_projection(monkeypatch, test_session, mock_transcript):
+    import backend.services.list_transcripts as lt
+
+    resolved = ResolverResponse(name="Microsoft", ticker="MSFT", exchCode="US", securityType="Common Stock", marketSector="Equity")
+    monkeypatch.setattr(lt, "resolve_company_to_ticker", lambda req: resolved)
+
+    response = lt.list_transcript_svc("microsoft", test_session)
+    assert response.company_id == mock_transcript.company_id
+    assert [t.transcript_id for t in response.company_transcripts] == [mock_transcript.id]
+
+
+def test_chunk_and_embed_is_idempotent(monkeypatch, test_session, mock_transcript):
+    from backend.models.companies_transcripts import TranscriptChunk, TranscriptChunkingStatus
+    from backend.services.ingestion import chunk_and_embed_transcript
+
+    encoded = []
+    def fake_embed(texts):
+        encoded.extend(texts)
+        return [[1.0] + [0.0] * 383 for _ in texts]
+    monkeypatch.setattr("backend.services.rag.embed_texts", fake_embed)
+
+    first = chunk_and_embed_transcript(mock_transcript, test_session)
+    assert first == 1
+    assert len(encoded) == 1
+    status_row = test_session.get(TranscriptChunkingStatus, mock_transcript.id)
+    assert status_row.chunk_strategy == "paragraph"
+    assert status_row.chunk_count == 1
+
+    #re-run with the same config does no chunking or encoding work
+    assert chunk_and_embed_transcript(mock_transcript, test_session) == 0
+    assert len(encoded) == 1
+    assert test_session.query(TranscriptChunk).filter(TranscriptChunk.transcript_id == mock_transcript.id).count() == 1
+
+
+def test_persist_transcripts_bulk_writes_orgs(test_session, mock_company):
+    from backend.models.companies_transcripts import TranscriptOrgEntity, TranscriptParagraph
+
+    org_counts = Counter({f"org {i}": i + 1 for i in range(300)})
+    transcript = persist_transcripts(test_session, company_id=mock_company.id,
+                                     transcript_payload=_build_transcript_payload(), org_counts=org_counts)
+
+    assert transcript.fiscal_year == 2024
+    assert test_session.query(TranscriptOrgEntity).filter(TranscriptOrgEntity.transcript_id == transcript.id).count() == 300
+    assert test_session.query(TranscriptParagraph).filter(TranscriptParagraph.transcript_id == transcript.id).count() == 1
+
+    #same content under another period is caught by the insert itself
+    duplicate = _build_transcript_payload(fiscal_year=2023, fiscal_quarter=1)
+    with pytest.raises(HTTPException) as exc:
+        persist_transcripts(test_session, company_id=mock_company.id, transcript_payload=duplicate, org_counts=Counter())
+    assert exc.value.status_code == status.HTTP_409_CONFLICT
+
+
+def test_reingest_is_detected_before_preprocessing(test_session, mock_transcript):
+    from backend.services.fetch_transcripts import find_ingested_transcript
+
+    found = find_ingested_transcript(test_session, "msft", 2025, 3, mock_transcript.content_hash)
+    assert found.id == mock_transcript.id
+    assert find_ingested_transcript(test_session, "MSFT", 2026, 1, "new-content") is None
+
+    with pytest.raises(HTTPException) as exc:
+        find_ingested_transcript(test_session, "MSFT", 2025, 3, "changed-content")
+    assert exc.value.status_code == status.HTTP_409_CONFLICT
+
+
+def test_transcript_parts_matches_dataframe_records():
+    from backend.services.fetch_transcripts import transcript_parts
+
+    df = pd.DataFrame([{"paragraph_number": 1, "speaker": "CEO", "content": "Hello"},
+                       {"paragraph_number": 2, "speaker": "CFO", "content": "world."}])
+    raw_text, records = transcript_parts(df)
+    assert raw_text == "Hello world."
+    assert records == df.to_dict(orient="records")
+    assert type(records[0]["paragraph_number"]) is int  #native scalars, JSONB-serializable
+
+
+def _resolved_msft(ask):
+    return ResolverResponse(name="Microsoft Corporation", ticker="MSFT", exchCode="US",
+                            securityType="Common Stock", marketSector="Equity")
+
+
+def test_rechunk_route_chunks_pending_transcripts(monkeypatch, client, test_session, mock_transcript):
+    from backend.models.companies_transcripts import TranscriptChunkingStatus
+
+    monkeypatch.setattr("backend.services.chunking.resolve_company_to_ticker", _resolved_msft)
+    monkeypatch.setattr("backend.services.rag.embed_texts", lambda texts: [[1.0] + [0.0] * 383 for _ in texts])
+
+    response = client.post("/ingest/rechunk", json={"company_name_query": "microsoft"})
+    assert response.status_code == 200
+    assert response.json() == {"transcript_count": 1, "chunk_count": 1}
+    assert test_session.get(TranscriptChunkingStatus, mock_transcript.id).chunk_count == 1
+
+    #already current transcripts are skipped
+    response = client.post("/ingest/rechunk", json={"company_name_query": "microsoft", "year": 2025})
+    assert response.json() == {"transcript_count": 0, "chunk_count": 0}
+
+
+def test_chunk_and_embed_pending_in_process_pool(monkeypatch, test_session, mock_transcript):
+    from backend.RequestSchemas.ingestion import RechunkRequest
+    from backend.models.companies_transcripts import TranscriptChunk, TranscriptChunkingStatus
+    from backend.services import parallel_chunking
+    from backend.services.ingestion import chunk_and_embed_pending
+
+    second = persist_transcripts(test_session, company_id=mock_transcript.company_id,
+                                 transcript_payload=_build_transcript_payload(), org_counts=Counter())
+    transcript_ids = [mock_transcript.id, second.id]
+
+    #the spawned workers read the same env as this process, only the parent embeds and writes
+    monkeypatch.setattr(parallel_chunking.settings, "CHUNK_WORKERS", 2)
+    monkeypatch.setattr("backend.services.chunking.resolve_company_to_ticker", _resolved_msft)
+    monkeypatch.setattr("backend.services.rag.embed_texts", lambda texts: [[1.0] + [0.0] * 383 for _ in texts])
+
+    result = chunk_and_embed_pending(RechunkRequest(company_name_query="microsoft"), test_session)
+    assert result.transcript_count == 2
+    assert result.chunk_count == 2
+
+    rows = (test_session.query(TranscriptChunkingStatus)
+            .filter(TranscriptChunkingStatus.transcript_id.in_(transcript_ids)).all())
+    assert {row.transcript_id: row.chunk_count for row in rows} == {mock_transcript.id: 1, second.id: 1}
+    assert {row.chunk_strategy for row in rows} == {"paragraph"}
+    assert test_session.query(TranscriptChunk).filter(TranscriptChunk.transcript_id.in_(transcript_ids)).count() == 2
+
+    #a second run finds nothing pending
+    assert chunk_and_embed_pending(RechunkRequest(company_name_query="microsoft"), test_session).transcript_count == 0
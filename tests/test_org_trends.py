@@ -0,0 +1,113 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+from backend.RequestSchemas.orgs import OrgTrendRequest, TopOrgsRequest
+from backend.models.companies_transcripts import Company
+from backend.services.fetch_transcripts import persist_transcripts
+from backend.services.org_trends import org_trend_svc, top_orgs_svc
+
+
+def _payload(year, quarter, content_hash):
+    now = datetime.now(timezone.utc)
+    raw_text = f"Call {year} Q{quarter}."
+    return {
+        "source": "test",
+        "source_url": None,
+        "fiscal_year": year,
+        "fiscal_quarter": quarter,
+        "fetched_at": now,
+        "preprocessed_at": now,
+        "raw_text": raw_text,
+        "para_structured_text": [{"paragraph_number": 1, "content": raw_text, "speaker": "CEO"}],
+        "org_data": {"org_unique_count": 0, "org_freq_count_sorted": []},
+        "document_meta_data": {"char_count": len(raw_text), "word_count": 0, "sentence_count": 0},
+        "content_hash": content_hash,
+    }
+
+
+def test_org_trends_are_maintained_on_ingest(test_session, mock_company):
+    other = Company(name="Dell", ticker="DELL", exchange_code="US", security_type="Common Stock", market_sector="Equity")
+    test_session.add(other)
+    test_session.flush()
+
+    persist_transcripts(test_session, mock_company.id, _payload(2024, 1, "a"), Counter({"nvidia": 3, "openai": 1}))
+    persist_transcripts(test_session, other.id, _payload(2024, 1, "b"), Counter({"nvidia": 2}))
+    persist_transcripts(test_session, mock_company.id, _payload(2024, 2, "c"), Counter({"nvidia": 5}))
+
+    trend = org_trend_svc(OrgTrendRequest(org_name=" NVIDIA "), test_session)
+    assert [(p.fiscal_year, p.fiscal_quarter, p.mention_count, p.transcript_count) for p in trend.points] == [
+        (2024, 1, 5, 2), (2024, 2, 5, 1)]
+    assert trend.total_mentions == 10
+
+    company_trend = org_trend_svc(OrgTrendRequest(org_name="nvidia", company_id=other.id), test_session)
+    assert [(p.fiscal_quarter, p.mention_count) for p in company_trend.points] == [(1, 2)]
+
+    top = top_orgs_svc(TopOrgsRequest(fiscal_year=2024, fiscal_quarter=1), test_session)
+    assert [(o.org_name, o.mention_count) for o in top.orgs] == [("nvidia", 5), ("openai", 1)]
+
+
+def test_org_names_are_canonicalized(test_session):
+    from backend.models.companies_transcripts import OrgAlias
+    from backend.services import org_names
+
+    assert org_names.normalize_org_name(" Apple Inc. ") == "apple"
+    assert org_names.normalize_org_name("apple inc") == "apple"
+    assert org_names.normalize_org_name("Inc.") == "inc"  #never strips the whole name
+
+    org_names.clear_org_alias_cache()
+    try:
+        counts = org_names.canonicalize_org_counts(test_session, Counter({"Apple": 2, "Apple Inc.": 1, "apple inc": 1, "Alphabet": 1}))
+        assert counts == Counter({"apple": 4, "alphabet": 1})
+
+        #an unseen spelling close to a known org is folded into it and remembered as a fuzzy alias
+        counts = org_names.canonicalize_org_counts(test_session, Counter({"Alphabett": 2}))
+        assert counts == Counter({"alphabet": 2})
+        assert test_session.get(OrgAlias, "alphabett").match_type == "fuzzy"
+
+        assert org_names.resolve_org_name(test_session, "APPLE INC") == "apple"
+    finally:
+        org_names.clear_org_alias_cache()
+
+
+def test_orgs_stored_before_canonicalization_are_folded(test_session, mock_company):
+    from backend.models.companies_transcripts import TranscriptOrgEntity
+    from backend.services import org_names
+    from backend.services.org_trends import rebuild_org_trends
+
+    #rows written with their raw spellings, as before canonicalization
+    first = persist_transcripts(test_session, mock_company.id, _payload(2024, 1, "fold-a"), Counter({"Apple Inc.": 2, "apple": 1}))
+    second = persist_transcripts(test_session, mock_company.id, _payload(2024, 2, "fold-b"), Counter({"Apple Inc": 4}))
+
+    org_names.clear_org_alias_cache()
+    try:
+        assert org_names.recanonicalize_org_entities(test_session, batch_size=2) == 2
+        rebuild_org_trends(test_session)
+    finally:
+        org_names.clear_org_alias_cache()
+
+    rows = (test_session.query(TranscriptOrgEntity.transcript_id, TranscriptOrgEntity.org_name, TranscriptOrgEntity.mention_count)
+            .filter(TranscriptOrgEntity.transcript_id.in_([first.id, second.id])).all())
+    assert sorted((r.org_name, r.mention_count) for r in rows) == [("apple", 3), ("apple", 4)]
+    trend = org_trend_svc(OrgTrendRequest(org_name="Apple"), test_session)
+    assert [(p.fiscal_quarter, p.mention_count) for p in trend.points] == [(1, 3), (2, 4)]
+
+
+def test_who_mentions_org_pages_by_keyset(test_session, mock_company):
+    from backend.RequestSchemas.orgs import OrgMentionsRequest
+    from backend.services.org_trends import org_mentions_svc
+
+    other = Company(name="Dell", ticker="DELL", exchange_code="US", security_type="Common Stock", market_sector="Equity")
+    test_session.add(other)
+    test_session.flush()
+
+    persist_transcripts(test_session, mock_company.id, _payload(2024, 1, "a"), Counter({"nvidia": 3}))
+    persist_transcripts(test_session, mock_company.id, _payload(2024, 2, "b"), Counter({"nvidia": 3}))
+    persist_transcripts(test_session, other.id, _payload(2024, 1, "c"), Counter({"nvidia": 7}))
+
+    first = org_mentions_svc(OrgMentionsRequest(org_name="NVIDIA", limit=2), test_session)
+    assert [(h.ticker, h.fiscal_quarter, h.mention_count) for h in first.hits] == [("DELL", 1, 7), ("MSFT", 2, 3)]
+    assert first.next_cursor
+
+    second = org_mentions_svc(OrgMentionsRequest(org_name="nvidia", limit=2, cursor=first.next_cursor), test_session)
+    assert [(h.ticker, h.fiscal_quarter) for h in second.hits] == [("MSFT", 1)]
+    assert second.next_cursor is None
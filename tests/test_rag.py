@@ -1,10 +1,13 @@
 
 from datetime import datetime, timezone
+import time
 import uuid
 
+from sqlalchemy import text
+
 from backend.RequestSchemas.qa import IngestRequest
 from backend.RequestSchemas.qa import RAGRequest
-from backend.models.companies_transcripts import EarningCallTranscript, TranscriptChunk
+from backend.models.companies_transcripts import ChunkEmbedding, EarningCallTranscript, TranscriptChunk
 from backend.services.InternalSchemas.chunk import Chunk
 from backend.services.rag import embed_chunks, generate_answer, retrieve_top_k
 
@@ -134,4 +137,390 @@ def test_generate_answer_not_enough_evidence():
     #No retrieved chunks
     #Can happen due to high similarity threshold
     answer = generate_answer("What happened?", [])
-    assert answer == "Not enough evidence in the transcripts to answer."
\ No newline at end of file
+    assert answer == "Not enough evidence in the transcripts to answer."
+
+
+def test_rerank_reorders_and_caches(monkeypatch):
+    from backend.services import rerank as rerank_module
+
+    calls = []
+    class DummyCrossEncoder:
+        def predict(self, pairs, batch_size=16, show_progress_bar=False):
+            calls.append(len(pairs))
+            #score by how often "revenue" appears in the chunk text
+            return [text.lower().count("revenue") for _, text in pairs]
+
+    monkeypatch.setattr(rerank_module, "get_rerank_model", lambda: DummyCrossEncoder())
+    rerank_module.clear_rerank_cache()
+
+    texts = ["Unrelated topic.", "Revenue grew.", "Revenue, revenue and more revenue."]
+    candidates = [
+        (TranscriptChunk(chunk_id=uuid.uuid4(), chunk_data={"chunk_text": t}), 0.9 - i * 0.1)
+        for i, t in enumerate(texts)
+    ]
+
+    top = rerank_module.rerank("How did revenue grow?", candidates, top_k=2)
+    assert [c.chunk_data["chunk_text"] for c, _ in top] == [texts[2], texts[1]]
+    assert top[0][1] == candidates[2][1]  #cosine score is preserved
+
+    rerank_module.rerank("How did revenue grow?", candidates, top_k=2)
+    assert sum(calls) == 3  #second call served from the score cache
+
+
+def test_embed_chunk_stream_writes_fixed_size_batches(monkeypatch, test_session, mock_company):
+    from backend.services.rag import embed_chunk_stream
+
+    transcript = _build_transcript(mock_company.id, "Streamed transcript text.")
+    test_session.add(transcript)
+    test_session.flush()
+
+    batches = []
+    def fake_embed(texts):
+        batches.append(len(texts))
+        return [_unit_vec(0) for _ in texts]
+    monkeypatch.setattr("backend.services.rag.embed_texts", fake_embed)
+
+    def chunk_stream():
+        for i in range(5):
+            yield Chunk(
+                transcript_id=transcript.id,
+                company_id=mock_company.id,
+                chunk_id=uuid.uuid4(),
+                chunk_hash=f"stream-{i}",
+                chunk_index=i,
+                chunk_data={"chunk_text": f"chunk {i}"},
+            )
+
+    consumed = embed_chunk_stream(chunk_stream(), test_session, batch_size=2)
+
+    assert consumed == 5
+    assert batches == [2, 2, 1]
+    assert test_session.query(TranscriptChunk).filter(TranscriptChunk.transcript_id == transcript.id).count() == 5
+
+
+def test_reembed_backfills_resumes_and_switches_retrieval(monkeypatch, test_session, mock_company):
+    from backend.services import reembed
+
+    transcript = _build_transcript(mock_company.id, "Revenue grew in Q4.")
+    test_session.add(transcript)
+    test_session.flush()
+    texts = ["Revenue grew strongly.", "Unrelated topic.", "Margins held up."]
+    chunks = [
+        TranscriptChunk(transcript_id=transcript.id, company_id=mock_company.id, chunk_id=uuid.uuid4(),
+                        chunk_hash=f"hash-{i}", chunk_index=i, embedding=_unit_vec(i), embedding_model="test",
+                        updated_at=datetime.now(timezone.utc), chunk_data={"chunk_text": t})
+        for i, t in enumerate(texts)
+    ]
+    test_session.add_all(chunks)
+    test_session.flush()
+
+    class DummyEncoder:
+        #8-dim model, puts "revenue" texts on axis 0 and everything else on axis 1
+        def get_sentence_embedding_dimension(self):
+            return 8
+        def encode(self, texts, batch_size=32, show_progress_bar=False):
+            import numpy as np
+            return [np.array([1.0, 0, 0, 0, 0, 0, 0, 0]) if "revenue" in t.lower() else np.array([0, 1.0, 0, 0, 0, 0, 0, 0])
+                    for t in texts]
+    monkeypatch.setattr(reembed, "get_embedding_model_by_name", lambda name: DummyEncoder())
+    reembed.clear_embedding_version_cache()
+
+    version = reembed.register_version(test_session, "dummy-8d")
+    assert version.dim == 8 and version.status == "building"
+
+    reembed.run_reembed(test_session, "dummy-8d", batch_size=2, max_batches=1, throttle_sec=0)
+    assert version.status == "building" and version.processed == 2 and version.checkpoint is not None
+
+    reembed.run_reembed(test_session, "dummy-8d", batch_size=2, throttle_sec=0) #resumes from the checkpoint
+    assert version.status == "ready"
+    #the hnsw index is built by the backfill, activation is only a status flip
+    assert test_session.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = :name"),
+                                {"name": reembed._index_name(version)}).first()
+
+    #the legacy column still serves until the switch
+    monkeypatch.setattr("backend.services.rag.embed_texts", lambda texts, model_name=None: [_unit_vec(1)])
+    ask = RAGRequest(question="How did revenue grow?", company=IngestRequest(company_name_query="", year=2024, quarter=4))
+    assert retrieve_top_k(ask, test_session)[0][0].chunk_id == chunks[1].chunk_id
+
+    reembed.activate_version(test_session, "dummy-8d")
+    monkeypatch.setattr("backend.services.rag.embed_texts",
+                        lambda texts, model_name=None: [[1.0, 0, 0, 0, 0, 0, 0, 0]] if model_name == "dummy-8d" else [_unit_vec(1)])
+    rows = retrieve_top_k(ask, test_session)
+    assert [r[0].chunk_id for r in rows] == [chunks[0].chunk_id]
+
+    #while the version is active, ingest writes only the version, the legacy 384-d column stays empty
+    new_chunk = Chunk(transcript_id=transcript.id, company_id=mock_company.id, chunk_id=uuid.uuid4(),
+                      chunk_hash="hash-new", chunk_index=3, chunk_data={"chunk_text": "Revenue again."})
+    embed_chunks([new_chunk], test_session)
+    row = test_session.query(TranscriptChunk).filter(TranscriptChunk.chunk_id == new_chunk.chunk_id).one()
+    assert row.embedding is None and row.embedding_model == "dummy-8d"
+    assert test_session.query(ChunkEmbedding).filter(ChunkEmbedding.chunk_row_id == row.id,
+                                                     ChunkEmbedding.embedding_model == "dummy-8d").count() == 1
+    reembed.clear_embedding_version_cache()
+
+
+def test_compare_retrieves_each_period_separately(monkeypatch, test_session, mock_company):
+    from backend.RequestSchemas.qa import CompareRequest
+    from backend.services import comparative_qna
+
+    chunks = []
+    for quarter, strength in ((1, 1.0), (4, 0.8)):
+        transcript = _build_transcript(mock_company.id, f"Guidance for Q{quarter}.")
+        transcript.fiscal_quarter = quarter
+        test_session.add(transcript)
+        test_session.flush()
+        for i in range(3):
+            vec = _unit_vec(0)
+            vec[1] = (1.0 - strength) + i * 0.01 #Q1 chunks all score above every Q4 chunk
+            chunks.append(TranscriptChunk(
+                transcript_id=transcript.id, company_id=mock_company.id, chunk_id=uuid.uuid4(),
+                chunk_hash=f"q{quarter}-{i}", chunk_index=i, embedding=vec, embedding_model="test",
+                updated_at=datetime.now(timezone.utc), chunk_data={"chunk_text": f"Q{quarter} guidance {i}"}))
+    test_session.add_all(chunks)
+    test_session.flush()
+
+    monkeypatch.setattr("backend.services.rag.embed_texts", lambda texts: [_unit_vec(0)])
+    captured = {}
+    def fake_generate(question, retrieved, labels=None):
+        captured["labels"] = labels
+        return "answer"
+    monkeypatch.setattr(comparative_qna, "generate_answer", fake_generate)
+
+    req = CompareRequest(question="How did guidance change?", top_k_per_slice=2, slices=[
+        IngestRequest(company_name_query="", year=2024, quarter=1),
+        IngestRequest(company_name_query="", year=2024, quarter=4),
+    ])
+    response = comparative_qna.compare_ques_svc(req, test_session)
+
+    assert captured["labels"] == ["2024 Q1", "2024 Q4", "2024 Q1", "2024 Q4"]
+    assert [s.slice_label for s in response.sources] == captured["labels"]
+    assert [s.snippet[:2] for s in response.sources] == ["Q1", "Q4", "Q1", "Q4"]
+
+
+def test_compare_slices_share_the_bounded_retrieval_pool(monkeypatch, engine):
+    import threading
+    from sqlalchemy.orm import sessionmaker
+    from backend.RequestSchemas.qa import CompareRequest
+    from backend.models.companies_transcripts import Company
+    from backend.services import comparative_qna, retrieval_pool
+
+    #an Engine-bound session takes the concurrent branch, so the rows have to be committed
+    session = sessionmaker(bind=engine, autocommit=False, autoflush=False)()
+    company = Company(name="Pool Test Co", ticker="POOLT", exchange_code="US",
+                      security_type="Common Stock", market_sector="Equity")
+    session.add(company)
+    session.flush()
+    for quarter in range(1, 5):
+        transcript = _build_transcript(company.id, f"Guidance for Q{quarter}.")
+        transcript.fiscal_year = 2019
+        transcript.fiscal_quarter = quarter
+        session.add(transcript)
+        session.flush()
+        session.add(TranscriptChunk(
+            transcript_id=transcript.id, company_id=company.id, chunk_id=uuid.uuid4(), chunk_hash=f"pool-q{quarter}",
+            chunk_index=0, embedding=_unit_vec(0), embedding_model="test", updated_at=datetime.now(timezone.utc),
+            chunk_data={"chunk_text": f"Q{quarter} guidance"}))
+    session.commit()
+
+    monkeypatch.setattr(retrieval_pool.settings, "RETRIEVAL_WORKERS", 2)
+    retrieval_pool.reset_retrieval_pool()
+    running, peak, threads = [0], [0], set()
+    lock = threading.Lock()
+    real_retrieve = comparative_qna.retrieve_top_k
+    def tracked_retrieve(ask, slice_session, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            threads.add(threading.current_thread().name)
+        try:
+            assert slice_session is not session #each slice gets its own short-lived session
+            time.sleep(0.05)
+            return real_retrieve(ask, slice_session, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+    monkeypatch.setattr(comparative_qna, "retrieve_top_k", tracked_retrieve)
+    monkeypatch.setattr("backend.services.rag.embed_texts", lambda texts: [_unit_vec(0)])
+    monkeypatch.setattr(comparative_qna, "generate_answer", lambda question, retrieved, labels=None: "answer")
+
+    try:
+        req = CompareRequest(question="How did guidance change?", top_k_per_slice=1, slices=[
+            IngestRequest(company_name_query="", year=2019, quarter=q) for q in range(1, 5)])
+        response = comparative_qna.compare_ques_svc(req, session)
+        assert [s.slice_label for s in response.sources] == ["2019 Q1", "2019 Q2", "2019 Q3", "2019 Q4"]
+        assert peak[0] == 2 #four slices, never more than RETRIEVAL_WORKERS connections at once
+        assert all(name.startswith("retrieval") for name in threads)
+    finally:
+        retrieval_pool.reset_retrieval_pool()
+        session.rollback()
+        session.query(TranscriptChunk).filter(TranscriptChunk.company_id == company.id).delete(synchronize_session=False)
+        session.query(EarningCallTranscript).filter(EarningCallTranscript.company_id == company.id).delete(synchronize_session=False)
+        session.query(Company).filter(Company.id == company.id).delete(synchronize_session=False)
+        session.commit()
+        session.close()
+
+
+def test_pack_context_merges_dedups_and_fills_budget():
+    from backend.services.context_packing import count_tokens, pack_context
+
+    transcript_id = uuid.uuid4()
+    def chunk(index, text, para_chunk_index, speaker="CEO"):
+        return TranscriptChunk(transcript_id=transcript_id, chunk_id=uuid.uuid4(), chunk_index=index,
+                               chunk_data={"chunk_text": text, "para_number": 1, "para_speaker": speaker,
+                                           "para_chunk_index": para_chunk_index})
+
+    long_text = "revenue grew strongly in every region this quarter " * 12
+    head = chunk(0, "Margins expanded on lower input costs", 0)
+    tail = chunk(1, "and pricing held across segments", 1)
+    repeat = chunk(5, "Margins expanded on lower input costs and pricing held across segments", 0, speaker="CFO")
+    big = chunk(9, long_text, 0, speaker="COO")
+    small = chunk(12, "Buybacks continue next year", 0, speaker="CFO")
+
+    retrieved = [(tail, 0.9), (head, 0.8), (repeat, 0.85), (big, 0.6), (small, 0.5)]
+    blocks = pack_context(retrieved, budget=count_tokens(long_text) // 2)
+
+    #head and tail are one paragraph sent once, the CFO repeat is dropped, and the block too big
+    #for the budget is skipped in favour of the smaller one after it
+    assert len(blocks) == 2
+    assert "Margins expanded on lower input costs and pricing held across segments" in blocks[0]
+    assert "chunk_speaker=CEO" in blocks[0]
+    assert "Buybacks continue next year" in blocks[1]
+
+
+def test_llm_chat_coalesces_identical_prompts_and_falls_back(monkeypatch):
+    import threading
+    import time
+    import requests
+    from backend.services import llm
+
+    calls = []
+    release = threading.Event()
+    def slow_complete(self, system, user):
+        calls.append(user)
+        release.wait(5)
+        return "ollama answer"
+    monkeypatch.setattr(llm._OllamaProvider, "_complete", slow_complete)
+    llm.reset_providers()
+
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(llm.chat("sys", "same prompt"))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while not calls:
+        time.sleep(0.01)
+    time.sleep(0.2) #the other threads join the generation in flight
+    release.set()
+    for t in threads:
+        t.join()
+    assert answers == ["ollama answer"] * 4
+    assert len(calls) == 1 #one generation shared by the identical in-flight prompts
+
+    def down(self, system, user):
+        raise requests.ConnectionError("refused")
+    monkeypatch.setattr(llm._OllamaProvider, "_complete", down)
+    monkeypatch.setattr(llm.settings, "LLM_FALLBACK_PROVIDER", "mock")
+    answer = llm.chat("sys", "[chunk_id=00000000-0000-0000-0000-000000000001]\nsome context")
+    assert answer.startswith("Mock answer")
+    assert "[chunk_id=00000000-0000-0000-0000-000000000001]" in answer
+    llm.reset_providers()
+
+
+def test_batch_qna_embeds_once_and_reports_every_question(monkeypatch, test_session, mock_company):
+    from backend.RequestSchemas.qa import BatchQnARequest
+    from backend.ResponseSchemas.qa import BatchQnASummary
+    from backend.services import batch_qna
+
+    transcript = _build_transcript(mock_company.id, "Margins expanded.")
+    test_session.add(transcript)
+    test_session.flush()
+    test_session.add(TranscriptChunk(
+        transcript_id=transcript.id, company_id=mock_company.id, chunk_id=uuid.uuid4(), chunk_hash="batch-0",
+        chunk_index=0, embedding=_unit_vec(0), embedding_model="test", updated_at=datetime.now(timezone.utc),
+        chunk_data={"chunk_text": "Margins expanded.", "para_speaker": "CEO", "para_number": 1}))
+    test_session.flush()
+
+    encoded = []
+    def fake_embed(texts, model_name=None):
+        encoded.append(list(texts))
+        return [_unit_vec(0) for _ in texts]
+    monkeypatch.setattr(batch_qna, "embed_texts", fake_embed)
+    monkeypatch.setattr(batch_qna, "generate_answer", lambda question, retrieved: f"answer to {question}")
+
+    req = BatchQnARequest(questions=[RAGRequest(question=f"Question {i}?") for i in range(3)])
+    results = list(batch_qna.batch_ques_svc(req, test_session))
+
+    assert encoded == [["Question 0?", "Question 1?", "Question 2?"]] #one encoder batch
+    summary = results[-1]
+    assert isinstance(summary, BatchQnASummary)
+    assert summary.questions == 3 and summary.failed == 0
+    assert set(summary.timings_ms) == {"embed", "resolve", "retrieve", "generate", "total"}
+    answered = sorted(results[:-1], key=lambda r: r.index)
+    assert [r.answer for r in answered] == [f"answer to Question {i}?" for i in range(3)]
+    assert all(r.sources and "generate" in r.timings_ms for r in answered)
+
+
+def test_batch_qna_releases_session_and_stops_on_disconnect(monkeypatch, test_session, mock_company):
+    from backend.RequestSchemas.qa import BatchQnARequest
+    from backend.services import batch_qna
+
+    monkeypatch.setattr(batch_qna, "embed_texts", lambda texts, model_name=None: [_unit_vec(0) for _ in texts])
+    generated = []
+    def fake_generate(question, retrieved):
+        generated.append(question)
+        return f"answer to {question}"
+    monkeypatch.setattr(batch_qna, "generate_answer", fake_generate)
+    monkeypatch.setattr(batch_qna.settings, "BATCH_QNA_GENERATION_WORKERS", 1)
+    closed = []
+    real_close = test_session.close
+    monkeypatch.setattr(test_session, "close", lambda: (closed.append(True), real_close())[1])
+
+    req = BatchQnARequest(questions=[RAGRequest(question=f"Question {i}?") for i in range(6)])
+    results = batch_qna.batch_ques_svc(req, test_session)
+    assert closed == [True] #connection released before the answers stream
+
+    next(results)
+    results.close() #client went away
+    assert len(generated) <= 2 #questions are submitted one worker ahead, the rest never start
+
+
+def test_pack_context_joins_chunks_without_gluing_words(monkeypatch):
+    import re
+    from backend.services import chunking, context_packing
+
+    transcript_id = uuid.uuid4()
+    def chunk(index, text, para_chunk_index, speaker="CEO"):
+        return TranscriptChunk(transcript_id=transcript_id, chunk_id=uuid.uuid4(), chunk_index=index,
+                               chunk_data={"chunk_text": text, "para_number": 1, "para_speaker": speaker,
+                                           "para_chunk_index": para_chunk_index})
+
+    #paragraph chunks never overlap, the last letter of one matching the first of the next is no overlap
+    blocks = context_packing.pack_context([(chunk(0, "Sales rose on higher volume", 0), 0.9),
+                                           (chunk(1, "expanded margins", 1), 0.8)], budget=1000)
+    assert len(blocks) == 1
+    assert blocks[0].endswith("Sales rose on higher volume expanded margins")
+
+    #token windows overlap by CHUNK_OVERLAP_TOKENS whole words, shorter coincidences are kept
+    monkeypatch.setattr(context_packing.settings, "CHUNK_STRATEGY", "token")
+    monkeypatch.setattr(context_packing.settings, "CHUNK_OVERLAP_TOKENS", 2)
+    monkeypatch.setattr(chunking, "_token_offsets",
+                        lambda text: tuple(m.span() for m in re.finditer(r"\S+", text)))
+    assert context_packing._join_overlapping("demand was strong in cloud", "strong in cloud and ads") == \
+        "demand was strong in cloud and ads"
+    assert context_packing._join_overlapping("capex grew in cloud", "cloud spending slowed") == \
+        "capex grew in cloud cloud spending slowed"
+    assert context_packing._join_overlapping("higher volume", "expanded margins") == "higher volume expanded margins"
+
+
+def test_pack_context_never_merges_two_speakers():
+    from backend.services.context_packing import pack_context
+
+    transcript_id = uuid.uuid4()
+    ceo = TranscriptChunk(transcript_id=transcript_id, chunk_id=uuid.uuid4(), chunk_index=0,
+                          chunk_data={"chunk_text": "We expect growth.", "para_speaker": "CEO", "para_number": 1,
+                                      "para_chunk_index": 0})
+    analyst = TranscriptChunk(transcript_id=transcript_id, chunk_id=uuid.uuid4(), chunk_index=1,
+                              chunk_data={"chunk_text": "What about margins?", "para_speaker": "Analyst",
+                                          "para_number": 2, "para_chunk_index": 1})
+    blocks = pack_context([(ceo, 0.9), (analyst, 0.8)], budget=1000)
+    assert len(blocks) == 2
+    assert "chunk_speaker=Analyst" in blocks[1] and "What about margins?" in blocks[1]
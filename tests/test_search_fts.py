@@ -84,4 +84,179 @@ def test_search_no_hits_returns_empty(test_session, mock_company):
     response = search_transcripts_svc(req, test_session)
     #should return 0
     assert response.total == 0
-    assert response.hits == []
\ No newline at end of file
+    assert response.hits == []
+
+
+def test_search_snippet_from_matching_paragraph(test_session, mock_company):
+    from backend.services.fetch_transcripts import persist_paragraphs
+
+    paragraphs = [
+        {"paragraph_number": 1, "content": "Good morning and welcome to the call.", "speaker": "Operator"},
+        {"paragraph_number": 2, "content": "Gross margin expanded on data center demand.", "speaker": "CFO"},
+    ]
+    transcript = _insert_transcript(
+        test_session,
+        mock_company.id,
+        raw_text=" ".join(p["content"] for p in paragraphs),
+        year=2024,
+        quarter=2,
+        content_hash="para-snippet",
+    )
+    persist_paragraphs(test_session, transcript.id, paragraphs)
+    test_session.flush()
+
+    response = search_transcripts_svc(QueryRequest(query="margin", company_id=mock_company.id), test_session)
+    assert response.total == 1
+    assert "<mark>margin</mark>" in response.hits[0].snippet
+    assert "welcome" not in response.hits[0].snippet
+
+
+def test_search_total_past_last_page(test_session, mock_transcript):
+    req = QueryRequest(query="cloud revenue", company_id=mock_transcript.company_id, offset=5)
+    response = search_transcripts_svc(req, test_session)
+    assert response.total == 1
+    assert response.hits == []
+
+
+def test_search_cursor_pagination(test_session, mock_company):
+    texts = [
+        "Cloud revenue cloud revenue cloud revenue drove results.",
+        "Cloud revenue and cloud revenue again.",
+        "Cloud revenue grew this quarter.",
+    ]
+    for i, text in enumerate(texts):
+        _insert_transcript(test_session, mock_company.id, raw_text=text, year=2023, quarter=i + 1, content_hash=f"cursor-{i}")
+
+    first = search_transcripts_svc(QueryRequest(query="cloud revenue", company_id=mock_company.id, limit=2), test_session)
+    assert first.total == 3
+    assert len(first.hits) == 2
+    assert first.next_cursor is not None
+
+    second = search_transcripts_svc(
+        QueryRequest(query="cloud revenue", company_id=mock_company.id, limit=2, cursor=first.next_cursor), test_session)
+    assert second.total == 3
+    assert len(second.hits) == 1
+    assert second.next_cursor is None
+    assert second.hits[0].rank <= first.hits[-1].rank
+    seen = {h.transcript_id for h in first.hits + second.hits}
+    assert len(seen) == 3
+
+
+
+def test_search_cursor_keeps_tied_hits_across_pages(test_session, mock_company):
+    #identical calls tie on a rank that real can't represent exactly (not a dyadic fraction)
+    ids = sorted(
+        _insert_transcript(test_session, mock_company.id, raw_text="Cloud revenue grew in the quarter.",
+                           year=2015 + i, quarter=1, content_hash=f"tie-{i}").id
+        for i in range(5))
+
+    seen, cursor = [], None
+    for _ in range(5):
+        page = search_transcripts_svc(
+            QueryRequest(query="cloud revenue", company_id=mock_company.id, limit=2, cursor=cursor), test_session)
+        seen.extend(h.transcript_id for h in page.hits)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert seen == ids #every tied hit once, in transcript_id order
+
+def test_search_invalid_cursor(test_session, mock_transcript):
+    import pytest
+    from fastapi import HTTPException
+
+    with pytest.raises(HTTPException) as exc:
+        search_transcripts_svc(QueryRequest(query="cloud revenue", cursor="not-a-cursor"), test_session)
+    assert exc.value.status_code == 400
+
+
+def test_paragraph_search_speaker_filter(test_session, mock_company):
+    from backend.RequestSchemas.search import ParagraphQueryRequest
+    from backend.services.fetch_transcripts import persist_paragraphs
+    from backend.services.search import search_paragraphs_svc
+
+    paragraphs = [
+        {"paragraph_number": 1, "content": "Operating margin was a focus for the whole team.", "speaker": "CEO"},
+        {"paragraph_number": 2, "content": "Gross margin expanded by two points.", "speaker": "CFO"},
+        {"paragraph_number": 3, "content": "Can you talk about margin in Europe?", "speaker": "Analyst"},
+    ]
+    transcript = _insert_transcript(
+        test_session,
+        mock_company.id,
+        raw_text=" ".join(p["content"] for p in paragraphs),
+        year=2024,
+        quarter=1,
+        content_hash="para-speaker",
+    )
+    persist_paragraphs(test_session, transcript.id, paragraphs)
+    test_session.flush()
+
+    everyone = search_paragraphs_svc(ParagraphQueryRequest(query="margin", company_id=mock_company.id), test_session)
+    assert everyone.total == 3
+
+    cfo = search_paragraphs_svc(ParagraphQueryRequest(query="margin", speaker="cfo", company_id=mock_company.id), test_session)
+    assert cfo.total == 1
+    assert cfo.hits[0].speaker == "CFO"
+    assert cfo.hits[0].paragraph_number == 2
+    assert "<mark>margin</mark>" in cfo.hits[0].snippet
+
+
+def test_search_cache_invalidated_by_ingestion(monkeypatch, test_session, mock_transcript):
+    import backend.services.search as search_module
+    from backend.services.search_cache import bump_ingestion_generation, clear_search_cache
+
+    monkeypatch.setattr(search_module.settings, "SEARCH_CACHE_ENABLED", True)
+    clear_search_cache()
+
+    calls = []
+    original = search_module._search_transcripts
+    def counting(req, session):
+        calls.append(req.query)
+        return original(req, session)
+    monkeypatch.setattr(search_module, "search_transcripts_svc", search_module._cached(counting, search_module.QueryResponse))
+
+    req = QueryRequest(query="Cloud   Revenue", company_id=mock_transcript.company_id)
+    first = search_module.search_transcripts_svc(req, test_session)
+    again = search_module.search_transcripts_svc(QueryRequest(query="cloud revenue", company_id=mock_transcript.company_id), test_session)
+    assert again == first
+    assert len(calls) == 1  #normalized query served from the cache
+
+    bump_ingestion_generation(test_session)
+    search_module.search_transcripts_svc(req, test_session)
+    assert len(calls) == 2  #new transcripts landed, page recomputed
+
+
+def test_memory_cache_generation_is_shared_across_workers(monkeypatch, test_session):
+    from backend.services import search_cache
+
+    monkeypatch.setattr(search_cache.settings, "SEARCH_CACHE_GENERATION_TTL_SEC", 0)
+    this_worker = search_cache._MemoryBackend(16, 60)
+    other_worker = search_cache._MemoryBackend(16, 60)
+
+    before = this_worker.generation(test_session)
+    assert other_worker.bump_generation(test_session) == before + 1 #ingest handled by another worker
+    assert this_worker.generation(test_session) == before + 1
+
+
+def test_query_profiler_samples_search_plans(monkeypatch, engine, test_session, mock_transcript):
+    from sqlalchemy import event
+    from backend.services import query_profiler
+
+    monkeypatch.setattr(query_profiler.settings, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(query_profiler.settings, "EXPLAIN_SAMPLE_RATE", 1.0)
+    query_profiler.clear_query_profile()
+    query_profiler.install_query_profiler(engine)
+    token = query_profiler.set_current_endpoint("/search/query")
+    try:
+        search_transcripts_svc(QueryRequest(query="revenue"), test_session)
+    finally:
+        query_profiler.reset_current_endpoint(token)
+        event.remove(engine, "before_cursor_execute", query_profiler._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", query_profiler._after_cursor_execute)
+        event.remove(engine, "handle_error", query_profiler._handle_error)
+
+    profile = query_profiler.query_profile()
+    assert profile["slow"] and profile["top"]
+    plan = profile["plans"][0]
+    assert plan["endpoint"] == "/search/query" and plan["error"] is None
+    assert plan["plan"][0]["Plan"]["Node Type"]
+    query_profiler.clear_query_profile()